@@ -1,5 +1,28 @@
-from . import parser
-from .parser import parse, SyntaxError
+import importlib
+import sys
+import types
 
+from .aio import aevaluate, aload
+from .ast import TypeError
+from .compiler import compile
+from .encoding import from_python
+from .lazy import load, load_lazy
+from .mapped import load_mmap
+from .session import Session
 
-__all__ = ('parse', 'parser', 'SyntaxError')
+
+__all__ = ('aevaluate', 'aload', 'compile', 'from_python', 'load', 'load_lazy', 'load_mmap', 'parse', 'parser', 'Session', 'SyntaxError', 'TypeError')
+
+
+class _Package(types.ModuleType):
+    """The parser is imported when it's first used - building it takes a
+    while, which code that never parses (like the command line client of
+    a server) shouldn't pay for."""
+    def __getattr__(self, name):
+        if name not in ('parser', 'parse', 'SyntaxError'):
+            raise AttributeError('module {} has no attribute {}'.format(__name__, name))
+        parser = importlib.import_module('.parser', __name__)
+        return parser if name == 'parser' else getattr(parser, name)
+
+
+sys.modules[__name__].__class__ = _Package
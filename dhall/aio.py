@@ -0,0 +1,53 @@
+"""asyncio API.
+
+`aload` and `aevaluate` do what `dhall.load` does, without blocking the
+event loop: files are read in the loop's default executor and imports are
+fetched concurrently by a `dhall.imports.Resolver`, while parsing,
+typechecking and evaluation run in a given executor (a thread pool, for
+example). A `resolver` can be given to use its cache, snapshot and executor.
+
+Both can be cancelled, and both take a `timeout` in seconds, after which
+they're cancelled and `asyncio.TimeoutError` is raised. Cancelling stops
+fetches and loads of imports in flight, unless other calls using the same
+resolver wait for them too; the resolver can be used again afterwards. Work
+already handed to an executor finishes there, but its result is dropped."""
+import asyncio
+import os
+
+from . import ast
+from .cache import Cache
+from .imports import Resolver, closed_value, read_file
+
+
+async def aload(filename, executor=None, timeout=None, resolver=None):
+    """Read a file, parse it, resolve its imports, then typecheck and
+    evaluate the expression in it"""
+    return await with_timeout(_aload(filename, executor, resolver), timeout)
+
+
+async def _aload(filename, executor, resolver):
+    if resolver is None:
+        resolver = Resolver(cache=Cache(), executor=executor)
+    text = await resolver.in_executor(read_file, filename)
+    expression = await resolver.compute(resolver.parse, text)
+    return await _aevaluate(expression, filename, resolver)
+
+
+async def aevaluate(expression, filename=None, executor=None, timeout=None, resolver=None):
+    """Resolve imports of an expression coming from a file (or from the
+    current directory), then typecheck and evaluate it"""
+    if resolver is None:
+        resolver = Resolver(cache=Cache(), executor=executor)
+    return await with_timeout(_aevaluate(expression, filename, resolver), timeout)
+
+
+async def _aevaluate(expression, filename, resolver):
+    importer = None if filename is None else ast.LocalImport(os.path.abspath(filename))
+    expression = await resolver.resolve(expression, importer)
+    return await resolver.compute(closed_value, expression)
+
+
+async def with_timeout(coroutine, timeout):
+    if timeout is None:
+        return await coroutine
+    return await asyncio.wait_for(coroutine, timeout)
@@ -1,13 +1,83 @@
 from typing import Any, Optional
+import builtins
+import hashlib
 import attr
 
-from .data_structures import ShadowDict
+from .data_structures import ShadowDict, SortedDict
+from .tools import Progress
 
 
 CTX_EMPTY = ShadowDict()
 DEFAULT_VARIABLE_NAME = '_'
 
 
+class TypeError(builtins.TypeError):
+    """Dhall type error. Its message is a template followed by values to fill
+    it with, and it's formatted only when displayed, so raising and discarding
+    type errors is cheap. While the error propagates, expressions that were
+    being type-inferred are recorded in `frames`, innermost first."""
+    max_frames = 10
+
+    def __init__(self, message, *arguments):
+        super().__init__(message, *arguments)
+        self.frames = []
+
+    @property
+    def expression(self):
+        """The innermost expression that failed to typecheck"""
+        return self.frames[0] if self.frames else None
+
+    @property
+    def message(self):
+        message, *arguments = self.args
+        return message.format(*[
+            a.to_dhall() if isinstance(a, Expression) else a
+            for a in arguments
+        ])
+
+    def __str__(self):
+        lines = [self.message]
+        for i, expression in enumerate(self.frames[:self.max_frames]):
+            if expression.span is not None:
+                where = '{}: `{}`'.format(expression.span, expression.span.excerpt())
+            elif i == 0:
+                where = '`{}`'.format(expression.to_dhall())
+            else:
+                where = 'a {}'.format(expression.__class__.__name__)
+            lines.append('when type-infering {}'.format(where))
+        if len(self.frames) > self.max_frames:
+            lines.append('... and {} more'.format(len(self.frames) - self.max_frames))
+        if self.expression is not None:
+            lines.append('types:\n{}'.format(increase_indent(str(self.expression.types))))
+            lines.append('values:\n{}'.format(increase_indent(str(self.expression.context))))
+        return '\n'.join(lines)
+
+
+@attr.s(frozen=True, slots=True)
+class Span:
+    """Position of an expression in the source text"""
+    text = attr.ib(repr=False)
+    start = attr.ib()
+    end = attr.ib()
+
+    @property
+    def line(self):
+        return self.text.count('\n', 0, self.start) + 1
+
+    @property
+    def column(self):
+        return self.start - self.text.rfind('\n', 0, self.start)
+
+    def excerpt(self, length=60):
+        text = self.text[self.start:min(self.end, self.start + length + 1)].split('\n')[0]
+        if len(text) > length or self.start + len(text) < self.end:
+            text = text[:length] + '…'
+        return text
+
+    def __str__(self):
+        return 'line {}, column {}'.format(self.line, self.column)
+
+
 def unique(elements):
     return len(elements) == len(set(elements))
 
@@ -17,6 +87,38 @@ def exact(a, b):
     return a.evaluated().normalized() == b.evaluated().normalized()
 
 
+def context_free(expression):
+    """True if no node of the expression carries bound values or types, so it
+    means the same thing wherever it appears and can be compared by `==`"""
+    pending = [expression]
+    while pending:
+        expression = pending.pop()
+        if expression.memo.get('closed'):
+            continue
+        if not expression.context.empty or not expression.types.empty:
+            return False
+        pending.extend(expression.children())
+    return True
+
+
+def structural_hash(expression):
+    """Hash of an expression by its structure, computed once per node - or
+    None if the expression can't be compared by `==` (it's not
+    `context_free`) or can't be hashed (there are lists inside)"""
+    try:
+        return expression.memo['structural_hash']
+    except KeyError:
+        pass
+    h = None
+    if context_free(expression):
+        try:
+            h = hash(expression)
+        except builtins.TypeError:
+            pass
+    expression.memo['structural_hash'] = h
+    return h
+
+
 def function_check(arg, result):
     """arg ↝ result : return"""
     if result == TypeBuiltin():
@@ -25,10 +127,11 @@ def function_check(arg, result):
         return KindBuiltin()
     if arg == SortBuiltin() and result in (KindBuiltin(), SortBuiltin()):
         return SortBuiltin()
-    raise TypeError('Function check failed for `{} ↝ {}`'.format(
-        arg.to_dhall(),
-        result.to_dhall(),
-    ))
+    raise TypeError(
+        'Function check failed for `{} ↝ {}`',
+        arg,
+        result,
+    )
 
 
 def increase_indent(s):
@@ -72,11 +175,24 @@ class Expression:
     context = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
     types: ShadowDict = CTX_EMPTY
     types = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
+    span: Optional[Span] = None  # where in the source this expression comes from
+    span = attr.ib(default=None, repr=False, cmp=False, kw_only=True)
+    # results computed for this very node (normal forms, types, hashes)
+    memo: dict = None
+    memo = attr.ib(factory=dict, init=False, repr=False, cmp=False)
 
     def normalized(self, ctx=CTX_EMPTY):
         """self ↦ return
         Perform alpha-normalization."""
-        return self._normalized(ctx)
+        if ctx is not CTX_EMPTY:
+            return self._normalized(ctx)
+        try:
+            return self.memo['normalized']
+        except KeyError:
+            pass
+        result = self.memo['normalized'] = self._normalized(ctx)
+        result.memo['normalized'] = result
+        return result
 
     def _normalized(self, ctx):
         return attr.evolve(
@@ -88,7 +204,13 @@ class Expression:
     def evaluated(self):
         """self ⇥ return
         Parform beta-normalization."""
-        return self._evaluated()
+        try:
+            return self.memo['evaluated']
+        except KeyError:
+            pass
+        result = self.memo['evaluated'] = self._evaluated()
+        result.memo['evaluated'] = result
+        return result
 
     def _evaluated(self):
         return attr.evolve(
@@ -99,21 +221,15 @@ class Expression:
 
     def type(self):
         """Type of this expression."""
+        try:
+            return self.memo['type']
+        except KeyError:
+            pass
         try:
             return self._type()
-        except TypeError:
-            raise TypeError(
-                (
-                    "when type-infering\n"
-                    "\t`{}`\n"
-                    "types:\n{}\n"
-                    "values:\n{}"
-                ).format(
-                    self.to_dhall(),
-                    increase_indent(str(self.types)),
-                    increase_indent(str(self.context)),
-                ),
-            )
+        except TypeError as e:
+            e.frames.append(self)
+            raise
 
     def _type(self):
         raise NotImplementedError('{}._type() is not implemented'.format(self.__class__))
@@ -140,13 +256,36 @@ class Expression:
             if isinstance(v, Expression)
         })
 
+    def children(self):
+        """Direct subexpressions, as visited by `map`"""
+        children = []
+
+        def collect(expression):
+            children.append(expression)
+            return expression
+
+        self.map(collect)
+        return children
+
     def pass_context(self, other):
+        if other.context.empty and other.types.empty or self.memo.get('closed'):
+            # nothing to pass, and keeping the same node keeps its memo
+            return self
         return attr.evolve(
             self,
             context=other.context.join(self.context),
             types=other.types.join(self.types),
         )
 
+    def mark_closed(self, type):
+        """Remember that this (evaluated) expression has no free variables
+        and has given type. Contexts aren't passed into closed expressions
+        and they aren't typechecked again, so they keep their memo wherever
+        they're substituted."""
+        self.memo['closed'] = True
+        self.memo['type'] = type
+        return self
+
     def bind_value(self, name, value):
         return attr.evolve(
             self,
@@ -174,9 +313,23 @@ class Expression:
     def to_dhall(self):
         return str(self)  # TODO change to not implemented someday
 
-    def to_python(self):
-        """Representation in python's native data types."""
-        raise NotImplementedError('{}.to_python() is not implemented yet'.format(self.__class__))
+    def semantic_hash(self):
+        """Standard semantic integrity hash: `sha256:` followed by hex digest
+        of the binary encoding of alpha-beta-normal form."""
+        try:
+            return self.memo['semantic_hash']
+        except KeyError:
+            pass
+        from .binary import encoded
+        digest = hashlib.sha256(encoded(self.evaluated().normalized())).hexdigest()
+        h = self.memo['semantic_hash'] = 'sha256:' + digest
+        return h
+
+    def to_python(self, record=dict):
+        """Representation in python's native data types.
+        See `dhall.decoding` for details."""
+        from .decoding import decoder
+        return decoder(self.normalized_type(), record)(self.evaluated())
 
 
 @attr.s(frozen=True, auto_attribs=True)
@@ -193,7 +346,10 @@ class Lambda(Expression):
         return Lambda(
             DEFAULT_VARIABLE_NAME,
             self.parameter_type.pass_context(self).normalized(ctx),
-            self.expression.pass_context(self).normalized(ctx.shadow({
+            self.expression.pass_context(self.bind_value(
+                self.parameter_name,
+                None,
+            )).normalized(ctx.shadow({
                 self.parameter_name: DEFAULT_VARIABLE_NAME,
             })),
         )
@@ -252,6 +408,46 @@ class Conditional(Expression):
     types: ShadowDict = CTX_EMPTY
     types = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
 
+    def _evaluated(self):
+        condition = self.condition.pass_context(self).evaluated()
+        if isinstance(condition, BooleanLiteral):
+            # only the chosen branch gets evaluated
+            branch = self.if_true if condition.value else self.if_false
+            return branch.pass_context(self).evaluated()
+        if_true = self.if_true.pass_context(self).evaluated()
+        if_false = self.if_false.pass_context(self).evaluated()
+        if if_true == BooleanLiteral(True) and if_false == BooleanLiteral(False):
+            return condition
+        if if_true.normalized() == if_false.normalized():
+            return if_true
+        return Conditional(condition, if_true, if_false)
+
+    def _type(self):
+        condition = self.condition.pass_context(self)
+        condition_type = condition.normalized_type()
+        if condition_type != BoolBuiltin():
+            raise TypeError('condition `{}` is not a `Bool`, but `{}`', condition, condition_type)
+        if_true = self.if_true.pass_context(self)
+        if_false = self.if_false.pass_context(self)
+        if_true_type = if_true.type()
+        if_false_type = if_false.type()
+        if if_true_type.normalized_type() != TypeBuiltin():
+            raise TypeError('branches of `if` must be terms, but `{}` is a type', if_true)
+        if not exact(if_true_type, if_false_type):
+            raise TypeError(
+                'branches of `if` have different types: `{}` and `{}`',
+                if_true_type,
+                if_false_type,
+            )
+        return if_true_type
+
+    def to_dhall(self):
+        return 'if {} then {} else {}'.format(
+            self.condition.to_dhall(),
+            self.if_true.to_dhall(),
+            self.if_false.to_dhall(),
+        )
+
 
 @attr.s(frozen=True, auto_attribs=True)
 class LetIn(Expression):
@@ -282,6 +478,16 @@ class LetIn(Expression):
             self.expression.pass_context(self).normalized(ctx),
         )
 
+    def map(self, f):
+        return attr.evolve(
+            self,
+            parameters=[
+                (name, f(value), None if typ is None else f(typ))
+                for name, value, typ in self.parameters
+            ],
+            expression=f(self.expression),
+        )
+
     def _evaluated(self):
         context = CTX_EMPTY
         for name, value, typ in self.parameters:
@@ -303,10 +509,11 @@ class LetIn(Expression):
                 typ = typ.pass_context(self).bind_values(values).bind_types(types)
                 typ.type()  # type annotation typechecks itself
                 if not exact(typ, value_type):
-                    raise TypeError('annotation\n\t{} doesn\'t match expression type\n\t{}'.format(
-                        typ.to_dhall(),
-                        value_type.to_dhall(),
-                    ))
+                    raise TypeError(
+                        'annotation\n\t{} doesn\'t match expression type\n\t{}',
+                        typ,
+                        value_type,
+                    )
 
             values = values.shadow_single(name, value)
             types = types.shadow_single(name, None)
@@ -337,7 +544,10 @@ class ForAll(Expression):
         return ForAll(
             DEFAULT_VARIABLE_NAME,
             self.parameter_type.pass_context(self).normalized(ctx),
-            self.expression.pass_context(self).normalized(ctx.shadow({
+            self.expression.pass_context(self.bind_value(
+                self.parameter_name,
+                None,
+            )).normalized(ctx.shadow({
                 self.parameter_name: DEFAULT_VARIABLE_NAME,
             })),
         )
@@ -428,7 +638,7 @@ class Variable(Expression):
             if typ is not None:
                 return typ
 
-        raise TypeError('unbound variable {}'.format(self))
+        raise TypeError('unbound variable {}', self)
 
     def __str__(self):
         if self.scope == 0:
@@ -447,17 +657,47 @@ class TypeAnnotation(Expression):
     types = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
 
     def _evaluated(self):
-        return self.expression.pass_context(self).evaluated()
+        expression = self.expression.pass_context(self)
+        if isinstance(expression, ListLiteral) and not expression.items and expression.element_type is None:
+            # `[] : List T` keeps its type
+            list_type = self.expression_type.pass_context(self).evaluated()
+            if isinstance(list_type, ListType):
+                return ListLiteral([], list_type.items_type)
+        if isinstance(expression, OptionalLiteral) and expression.wrapped is None and expression.wrapped_type is None:
+            # `[] : Optional T` keeps its type too
+            optional_type = self.expression_type.pass_context(self).evaluated()
+            if isinstance(optional_type, OptionalType):
+                return OptionalLiteral(None, optional_type.wrapped)
+        return expression.evaluated()
 
     def _type(self):
         annotated_type = self.expression_type.pass_context(self)
         annotated_type.type()  # the type itself typechecks
-        typ = self.expression.pass_context(self).type()
+        expression = self.expression.pass_context(self)
+        if isinstance(expression, ListLiteral) and not expression.items and expression.element_type is None:
+            # `[] : List T`
+            list_type = annotated_type.evaluated()
+            if not isinstance(list_type, ListType):
+                raise TypeError(
+                    'empty list must be annotated with a list type, not `{}`',
+                    annotated_type,
+                )
+            expression = attr.evolve(expression, element_type=list_type.items_type)
+        if isinstance(expression, OptionalLiteral) and expression.wrapped is None:
+            # `None T`
+            if not isinstance(annotated_type.evaluated(), OptionalType):
+                raise TypeError(
+                    'empty optional must be annotated with an optional type, not `{}`',
+                    annotated_type,
+                )
+            return annotated_type
+        typ = expression.type()
         if not exact(typ, annotated_type):
-            raise TypeError('annotation\n\t`{}` doesn\'t match expression type\n\t`{}`'.format(
-                annotated_type.to_dhall(),
-                typ.to_dhall(),
-            ))
+            raise TypeError(
+                'annotation\n\t`{}` doesn\'t match expression type\n\t`{}`',
+                annotated_type,
+                typ,
+            )
         return annotated_type
 
     def to_dhall(self):
@@ -489,6 +729,16 @@ class ListAppendExpression(BinaryOperatorExpression):
         else:
             return new
 
+    def _type(self):
+        a = self.arg1.pass_context(self)
+        a_type = a.normalized_type()
+        b_type = self.arg2.pass_context(self).normalized_type()
+        if not isinstance(a_type, ListType):
+            raise TypeError('operator `#` expects lists, but `{}` has type `{}`', a, a_type)
+        if a_type != b_type:
+            raise TypeError('operator `#` expects lists of the same type, but got `{}` and `{}`', a_type, b_type)
+        return a_type
+
 
 class ApplicationExpression(BinaryOperatorExpression):
     def _evaluated(self):
@@ -503,15 +753,16 @@ class ApplicationExpression(BinaryOperatorExpression):
         f = self.arg1.pass_context(self)
         function_type = f.normalized_type()
         if not isinstance(function_type, ForAll):
-            raise TypeError('couldnt apply non-function `{}`'.format(f.to_dhall()))
+            raise TypeError('couldnt apply non-function `{}`', f)
 
         arg = self.arg2.pass_context(self)
         parameter_type = arg.type()
         if not exact(parameter_type, function_type.parameter_type):
-            raise TypeError('Function expects argument of type {}, but got {}.'.format(
+            raise TypeError(
+                'Function expects argument of type {}, but got {}.',
                 function_type.parameter_type,
                 parameter_type,
-            ))
+            )
 
         return function_type.expression.bind_value(
             function_type.parameter_name,
@@ -536,45 +787,50 @@ class MergeExpression(Expression):
         handlers = self.handlers.pass_context(self)
         handlers_type = handlers.normalized_type()
         if not isinstance(handlers_type, RecordType):
-            raise TypeError("expected record as a first argument to `merge` but `{}` has type `{}`".format(
-                handlers.to_dhall(), handlers_type.to_dhall(),
-            ))
+            raise TypeError(
+                "expected record as a first argument to `merge` but `{}` has type `{}`",
+                handlers,
+                handlers_type,
+            )
 
         union = self.union.pass_context(self)
         union_type = union.normalized_type()
         if not isinstance(union_type, UnionType):
-            raise TypeError("expected union as a second argument to `merge` but `{}` has type `{}`".format(
-                union.to_dhall(), union_type.to_dhall(),
-            ))
-
-        handlers_type_fields = sorted(handlers_type.fields)
-        union_type_alternatives = sorted(union_type.alternatives)
+            raise TypeError(
+                "expected union as a second argument to `merge` but `{}` has type `{}`",
+                union,
+                union_type,
+            )
 
-        if [f[0] for f in handlers_type_fields] != [f[0] for f in union_type_alternatives]:
+        if handlers_type.fields.keys() != union_type.alternatives.keys():
             raise TypeError("union and handlers must have exactly same field names set")
 
+        # types of handlers and alternatives are already normalized, so they are compared directly
         output_type = None
         if self.result_type is not None:
-            output_type = self.result_type.pass_context(self)
-        for (name, handler_type), (_, input_type) in zip(handlers_type_fields, union_type_alternatives):
+            output_type = self.result_type.pass_context(self).evaluated().normalized()
+        for name, handler_type in handlers_type.fields.items():
+            input_type = union_type.alternatives[name]
             if not isinstance(handler_type, ForAll):
-                raise TypeError("handler for field `{}` is not a function, but `{}`".format(
+                raise TypeError(
+                    "handler for field `{}` is not a function, but `{}`",
                     name,
-                    handler_type.to_dhall(),
-                ))
-            if not exact(handler_type.parameter_type, input_type):
-                raise TypeError("handler for field `{}` expects `{}` as input, but union contains `{}`".format(
+                    handler_type,
+                )
+            if handler_type.parameter_type != input_type:
+                raise TypeError(
+                    "handler for field `{}` expects `{}` as input, but union contains `{}`",
                     name,
-                    handler_type.parameter_type.format(),
-                    input_type.format(),
-                ))
+                    handler_type.parameter_type,
+                    input_type,
+                )
             new_output_type = handler_type.expression
-            if output_type is not None:
-                if output_type.evaluated().normalized() != new_output_type.evaluated().normalized():
-                    raise TypeError('handlers output types do not match: `{}` and `{}`'.format(
-                        output_type.to_dhall(),
-                        new_output_type.to_dhall(),
-                    ))
+            if output_type is not None and output_type != new_output_type:
+                raise TypeError(
+                    'handlers output types do not match: `{}` and `{}`',
+                    output_type,
+                    new_output_type,
+                )
             output_type = new_output_type
 
         if output_type is None:
@@ -582,6 +838,51 @@ class MergeExpression(Expression):
         else:
             return output_type
 
+    def _evaluated(self):
+        union = self.union.pass_context(self).evaluated()
+        handlers = self.handlers.pass_context(self)
+        if isinstance(union, Union) and isinstance(handlers, RecordLiteral):
+            # only the handler that is going to be used gets evaluated
+            handler = handlers.fields[union.label].pass_context(handlers).evaluated()
+            return self.apply_handler(handler, union.value)
+        return self.merge_evaluated(handlers.evaluated(), union)
+
+    @staticmethod
+    def apply_handler(handler, value):
+        if handler.can_apply_to(value):
+            return handler.apply(value)
+        return ApplicationExpression(handler, value)
+
+    def merge_evaluated(self, handlers, union):
+        """Merge evaluated union with evaluated handlers. Handler is looked
+        up in the label index of handlers record, so the cost doesn't depend
+        on the number of alternatives."""
+        if isinstance(handlers, RecordLiteral) and isinstance(union, Union):
+            return self.apply_handler(handlers.fields[union.label], union.value)
+        return MergeExpression(
+            handlers,
+            union,
+            None if self.result_type is None else self.result_type.pass_context(self).evaluated(),
+        )
+
+    def merge_all(self, unions):
+        """Evaluate this merge for each of `unions` in place of `self.union`.
+        Handlers record is evaluated (and indexed) once for the whole batch."""
+        handlers = self.handlers.pass_context(self).evaluated()
+        return [
+            self.merge_evaluated(handlers, union.pass_context(self).evaluated())
+            for union in unions
+        ]
+
+    def to_dhall(self):
+        if self.result_type is None:
+            return 'merge {} {}'.format(self.handlers.to_dhall(), self.union.to_dhall())
+        return 'merge {} {} : {}'.format(
+            self.handlers.to_dhall(),
+            self.union.to_dhall(),
+            self.result_type.to_dhall(),
+        )
+
 
 class NaturalMathExpression(BinaryOperatorExpression):
     def _evaluated(self):
@@ -593,6 +894,19 @@ class NaturalMathExpression(BinaryOperatorExpression):
         else:
             return new
 
+    def _type(self):
+        for arg in (self.arg1, self.arg2):
+            arg = arg.pass_context(self)
+            typ = arg.normalized_type()
+            if typ != NaturalBuiltin():
+                raise TypeError(
+                    'operator `{}` expects `Natural`s, but `{}` has type `{}`',
+                    self.dhall_operator_string,
+                    arg,
+                    typ,
+                )
+        return NaturalBuiltin()
+
 
 class Plus(NaturalMathExpression):
     dhall_operator_string = '+'
@@ -608,60 +922,209 @@ class Times(NaturalMathExpression):
         return a * b
 
 
-class Or(BinaryOperatorExpression):
-    dhall_operator_string = '||'
+class BooleanOperatorExpression(BinaryOperatorExpression):
+    """`||` and `&&`. The right operand is evaluated only when the left one
+    doesn't already decide the result."""
+    absorbing_value = None  # operand value that decides the result alone
 
     def _evaluated(self):
-        new = super()._evaluated()
-        a = new.arg1
-        b = new.arg2
+        a = self.arg1.pass_context(self).evaluated()
         if isinstance(a, BooleanLiteral):
-            if a.value:
-                return BooleanLiteral(True)
+            if a.value == self.absorbing_value:
+                return BooleanLiteral(self.absorbing_value)
             else:
-                return b
-        elif isinstance(b, BooleanLiteral):
-            if b.value:
-                return BooleanLiteral(True)
+                return self.arg2.pass_context(self).evaluated()
+        b = self.arg2.pass_context(self).evaluated()
+        if isinstance(b, BooleanLiteral):
+            if b.value == self.absorbing_value:
+                return BooleanLiteral(self.absorbing_value)
             else:
                 return a
         elif a.normalized() == b.normalized():
             return a
         else:
-            return new
+            return self.__class__(a, b)
 
+    def _type(self):
+        for arg in (self.arg1, self.arg2):
+            arg = arg.pass_context(self)
+            typ = arg.normalized_type()
+            if typ != BoolBuiltin():
+                raise TypeError(
+                    'operator `{}` expects `Bool`s, but `{}` has type `{}`',
+                    self.dhall_operator_string,
+                    arg,
+                    typ,
+                )
+        return BoolBuiltin()
 
-class And(BinaryOperatorExpression):
+
+class Or(BooleanOperatorExpression):
+    dhall_operator_string = '||'
+    absorbing_value = True
+
+
+class And(BooleanOperatorExpression):
     dhall_operator_string = '&&'
+    absorbing_value = False
+
+
+def combine_records(a, b, record_class, operator_class):
+    """Recursively merge two evaluated records. Nested records under the same
+    label are merged too, anything else stays as an unevaluated operator."""
+    if isinstance(a, record_class) and not a.fields:
+        return b
+    if isinstance(b, record_class) and not b.fields:
+        return a
+    if isinstance(a, record_class) and isinstance(b, record_class):
+        return record_class(a.fields.merge(
+            b.fields,
+            lambda _, x, y: combine_records(x, y, record_class, operator_class),
+        ))
+    return operator_class(a, b)
+
+
+def combine_record_types(a, b):
+    """Field types of record `a ∧ b`, given types of `a` and `b`"""
+    def resolve(name, x, y):
+        if not isinstance(x, RecordType) or not isinstance(y, RecordType):
+            raise TypeError('duplicate field `{}` in records to combine', name)
+        return RecordType(combine_record_types(x.fields, y.fields))
+    return a.merge(b, resolve)
+
+
+def record_operands_types(expression):
+    a = expression.arg1.pass_context(expression)
+    b = expression.arg2.pass_context(expression)
+    a_type = a.normalized_type()
+    b_type = b.normalized_type()
+    for arg, typ in ((a, a_type), (b, b_type)):
+        if not isinstance(typ, RecordType):
+            raise TypeError(
+                'operator `{}` expects records, but `{}` has type `{}`',
+                expression.dhall_operator_string,
+                arg,
+                typ,
+            )
+    return a_type, b_type
+
+
+class CombineExpression(BinaryOperatorExpression):
+    """Recursive record merge"""
+    dhall_operator_string = '∧'
+
+    def _evaluated(self):
+        new = super()._evaluated()
+        return combine_records(new.arg1, new.arg2, RecordLiteral, CombineExpression)
+
+    def _type(self):
+        a_type, b_type = record_operands_types(self)
+        return RecordType(combine_record_types(a_type.fields, b_type.fields))
+
+
+class PreferExpression(BinaryOperatorExpression):
+    """Shallow, right-biased record merge"""
+    dhall_operator_string = '⫽'
 
     def _evaluated(self):
         new = super()._evaluated()
         a = new.arg1
         b = new.arg2
-        if isinstance(a, BooleanLiteral):
-            if not a.value:
-                return BooleanLiteral(False)
-            else:
-                return b
-        elif isinstance(b, BooleanLiteral):
-            if not b.value:
-                return BooleanLiteral(False)
-            else:
-                return a
-        elif a.normalized() == b.normalized():
+        if isinstance(a, RecordLiteral) and isinstance(b, RecordLiteral):
+            return RecordLiteral(a.fields.update(b.fields))
+        elif isinstance(a, RecordLiteral) and not a.fields:
+            return b
+        elif isinstance(b, RecordLiteral) and not b.fields:
             return a
         else:
             return new
 
+    def _type(self):
+        a_type, b_type = record_operands_types(self)
+        return RecordType(a_type.fields.update(b_type.fields))
+
+
+class CombineTypesExpression(BinaryOperatorExpression):
+    """Recursive record type merge"""
+    dhall_operator_string = '⩓'
+
+    def _evaluated(self):
+        new = super()._evaluated()
+        return combine_records(new.arg1, new.arg2, RecordType, CombineTypesExpression)
+
+    def _type(self):
+        a = self.arg1.pass_context(self)
+        b = self.arg2.pass_context(self)
+        a.type()  # both operands typecheck on their own
+        b.type()
+        a = a.evaluated()
+        b = b.evaluated()
+        for arg in (a, b):
+            if not isinstance(arg, RecordType):
+                raise TypeError(
+                    'operator `⩓` expects record types, but got `{}`',
+                    arg,
+                )
+        return RecordType(combine_record_types(a.fields, b.fields)).type()
+
+
+# import locations
+
+@attr.s(frozen=True, auto_attribs=True)
+class LocalImport:
+    path: str
+
+    def __str__(self):
+        return self.path
+
+
+@attr.s(frozen=True, auto_attribs=True)
+class RemoteImport:
+    url: str
+    headers: Optional[str] = None  # source of `using` expression, not supported yet
+
+    def __str__(self):
+        if self.headers is None:
+            return self.url
+        return '{} using {}'.format(self.url, self.headers)
+
+
+@attr.s(frozen=True, auto_attribs=True)
+class EnvImport:
+    name: str
+
+    def __str__(self):
+        return 'env:{}'.format(self.name)
+
+
+@attr.s(frozen=True, auto_attribs=True)
+class MissingImport:
+    def __str__(self):
+        return 'missing'
+
 
 @attr.s(frozen=True, auto_attribs=True)
 class ImportExpression(Expression):
-    source: Any
+    """Unresolved import. See `dhall.imports` for resolution."""
+    location: Any  # one of *Import classes above
+    hash: Optional[str] = None  # 'sha256:...'
+    as_text: bool = False
     context: ShadowDict = CTX_EMPTY
     context = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
     types: ShadowDict = CTX_EMPTY
     types = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
 
+    def _type(self):
+        raise TypeError('import `{}` is not resolved', self)
+
+    def to_dhall(self):
+        parts = [str(self.location)]
+        if self.hash is not None:
+            parts.append(self.hash)
+        if self.as_text:
+            parts.append('as Text')
+        return ' '.join(parts)
+
 
 @attr.s(frozen=True, auto_attribs=True)
 class SelectExpression(Expression):
@@ -673,24 +1136,41 @@ class SelectExpression(Expression):
     types: ShadowDict = CTX_EMPTY
     types = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
 
+    def _evaluated(self):
+        expression = self.expression.pass_context(self)
+        if isinstance(expression, RecordLiteral):
+            # other fields are not needed
+            return expression.fields[self.label].pass_context(expression).evaluated()
+        expression = expression.evaluated()
+        if isinstance(expression, RecordLiteral):
+            return expression.fields[self.label]
+        return SelectExpression(expression, self.label)
+
     def _type(self):
-        expression = self.expression.pass_context(self).evaluated()
+        expression = self.expression.pass_context(self)
+        expression_type = expression.normalized_type()
 
+        if isinstance(expression_type, RecordType):
+            # select from a record yields record field value
+            if self.label not in expression_type.fields:
+                raise TypeError('record has no field `{}`', self.label)
+            return expression_type.fields[self.label]
+
+        expression = expression.evaluated()
         if isinstance(expression, UnionType):
             # select from union type yields an union constructor
-            expression.type()
+            if self.label not in expression.alternatives:
+                raise TypeError('union type has no alternative `{}`', self.label)
             return ForAll(
                 DEFAULT_VARIABLE_NAME,
-                expression.alternatives_dict[self.label],
+                expression.alternatives[self.label],
                 expression,
             )
 
-        if isinstance(expression, RecordLiteral):
-            # select from a record yields record field value
-            expression.type()
-            return expression.fields_dict[self.label].type()
+        raise TypeError('Can\'t select from {}', self.expression)
 
-        raise TypeError('Can\'t select from {}'.format(self.expression))
+    def to_dhall(self):
+        return '{}.{}'.format(self.expression.to_dhall(), self.label)
 
 
 @attr.s(frozen=True, auto_attribs=True)
@@ -703,14 +1183,27 @@ class ProjectionExpression(Expression):
     types: ShadowDict = CTX_EMPTY
     types = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
 
+    def _evaluated(self):
+        if not self.labels:
+            return RecordLiteral({})
+        expression = self.expression.pass_context(self).evaluated()
+        if isinstance(expression, RecordLiteral):
+            return RecordLiteral(expression.fields.select(self.labels))
+        return ProjectionExpression(expression, self.labels)
+
     def _type(self):
-        expression_type = self.expression.pass_context(self).type()
+        expression_type = self.expression.pass_context(self).normalized_type()
         if not isinstance(expression_type, RecordType):
             raise TypeError('expresion to select fields from must be a record')
-        return RecordType([
-            (l, expression_type.fields_dict[self.label])
-            for l in self.labels
-        ])
+        if not unique(self.labels):
+            raise TypeError('projected labels must be unique')
+        for label in self.labels:
+            if label not in expression_type.fields:
+                raise TypeError('record has no field `{}`', label)
+        return RecordType(expression_type.fields.select(self.labels))
+
+    def to_dhall(self):
+        return '{}.{{ {} }}'.format(self.expression.to_dhall(), ', '.join(self.labels))
 
 
 # literals
@@ -732,6 +1225,54 @@ class ListLiteral(Expression):
             element_type=None if self.element_type is None else f(self.element_type),
         )
 
+    # lists at least that long report type-checking progress (see `Progress`)
+    progress_threshold = 10000
+
+    def _type(self):
+        progress = None
+        if len(self.items) >= self.progress_threshold and Progress.wanted():
+            progress = Progress('type-checking list elements')
+        return ListType(self.checked_element_type(progress))
+
+    def checked_element_type(self, progress=None):
+        """Check that all elements have the same type and return it.
+
+        The expected type comes from the annotation or from the first element
+        and is normalized once. Element types are first looked up among
+        already accepted ones by their structural hash, which is enough for
+        homogeneous lists, and normalized only on a miss."""
+        items = [item.pass_context(self) for item in self.items]
+        first_type = None
+        if self.element_type is not None:
+            expected = self.element_type.pass_context(self)
+        elif items:
+            expected = first_type = items[0].type()
+        else:
+            raise TypeError('empty list literal needs a type annotation')
+        if expected.normalized_type() != TypeBuiltin():
+            raise TypeError('list elements must be terms, but their type is `{}`', expected)
+        normalized_expected = expected.evaluated().normalized()
+
+        accepted = {}  # structural hash -> accepted types with it
+        for i, item in enumerate(items):
+            typ = first_type if i == 0 and first_type is not None else item.type()
+            key = structural_hash(typ)
+            if key is None or typ not in accepted.get(key, ()):
+                if typ is not first_type and typ.evaluated().normalized() != normalized_expected:
+                    raise TypeError(
+                        'list element {} has type `{}`, but `{}` was expected',
+                        i,
+                        typ,
+                        expected,
+                    )
+                if key is not None:
+                    accepted.setdefault(key, []).append(typ)
+            if progress is not None:
+                progress.advance()
+        if progress is not None:
+            progress.finish()
+        return expected
+
     def to_dhall(self):
         if self.items:
             return '[{}]'.format(', '.join([expr.to_dhall() for expr in self.items]))
@@ -741,7 +1282,8 @@ class ListLiteral(Expression):
 
 @attr.s(frozen=True, auto_attribs=True)
 class RecordLiteral(Expression):
-    fields: [(str, Expression)]
+    fields: SortedDict  # label -> value
+    fields = attr.ib(converter=SortedDict.from_pairs)
     context: ShadowDict = CTX_EMPTY
     context = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
     types: ShadowDict = CTX_EMPTY
@@ -750,28 +1292,35 @@ class RecordLiteral(Expression):
     def map(self, f):
         return attr.evolve(
             self,
-            fields=[
-                (k, f(v))
-                for k, v in self.fields
-            ],
+            fields=self.fields.map(f),
         )
 
     def _type(self):
-        return RecordType([
-            (l, val.pass_context(self).type())
-            for l, val in self.fields
-        ])
+        if self.fields.duplicates:
+            raise TypeError('duplicate record fields: {}', ', '.join(self.fields.duplicates))
+        return RecordType(self.fields.map(
+            lambda val: val.pass_context(self).type(),
+        ))
 
     @property
     def fields_dict(self):
-        return dict(self.fields)
+        return self.fields
+
+    def to_dhall(self):
+        if not self.fields:
+            return '{=}'
+        return '{{ {} }}'.format(', '.join(
+            '{} = {}'.format(name, value.to_dhall())
+            for name, value in self.fields.items()
+        ))
 
 
 @attr.s(frozen=True, auto_attribs=True)
 class Union(Expression):
     label: str
     value: Expression
-    alternatives: [(str, Expression)]
+    alternatives: SortedDict  # label -> type, for all other alternatives
+    alternatives = attr.ib(converter=SortedDict.from_pairs)
     context: ShadowDict = CTX_EMPTY
     context = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
     types: ShadowDict = CTX_EMPTY
@@ -781,35 +1330,51 @@ class Union(Expression):
         return attr.evolve(
             self,
             value=f(self.value),
-            alternatives=[
-                (k, f(v))
-                for k, v in self.alternatives
-            ],
+            alternatives=self.alternatives.map(f),
         )
 
     def _type(self):
-        if not unique([self.label] + [a[0] for a in self.alternatives]):
+        if self.alternatives.duplicates or self.label in self.alternatives:
             raise TypeError('nonunique union labels')
         # TODO verify that all expressions are types
         return UnionType(
-            [(
+            self.alternatives.map(
+                lambda typ: typ.pass_context(self),
+            ).set(
                 self.label,
                 self.value.pass_context(self).type(),
-            )] + [
-                (name, typ.pass_context(self))
-                for name, typ in self.alternatives
-            ]
+            )
         )
 
+    def to_dhall(self):
+        return '< {} >'.format(' | '.join(
+            ['{} = {}'.format(self.label, self.value.to_dhall())] + [
+                '{} : {}'.format(name, typ.to_dhall())
+                for name, typ in self.alternatives.items()
+            ]
+        ))
+
 
 @attr.s(frozen=True, auto_attribs=True)
 class OptionalLiteral(Expression):
     wrapped: Optional[Expression] = None
+    wrapped_type: Optional[Expression] = None  # needed for empty optionals
     context: ShadowDict = CTX_EMPTY
     context = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
     types: ShadowDict = CTX_EMPTY
     types = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
 
+    def _type(self):
+        if self.wrapped is None:
+            if self.wrapped_type is None:
+                raise TypeError('type of an empty optional must be annotated')
+            typ = OptionalType(self.wrapped_type.pass_context(self))
+            typ.type()
+            return typ
+        wrapped_type = self.wrapped.pass_context(self).normalized_type()
+        OptionalType(wrapped_type).type()
+        return OptionalType(wrapped_type)
+
 
 @attr.s(frozen=True, auto_attribs=True)
 class DoubleLiteral(Expression):
@@ -819,6 +1384,12 @@ class DoubleLiteral(Expression):
     types: ShadowDict = CTX_EMPTY
     types = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
 
+    def _type(self):
+        return DoubleBuiltin()
+
+    def to_dhall(self):
+        return str(self.value)
+
 
 @attr.s(frozen=True, auto_attribs=True)
 class NaturalLiteral(Expression):
@@ -828,15 +1399,61 @@ class NaturalLiteral(Expression):
     types: ShadowDict = CTX_EMPTY
     types = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
 
+    def _type(self):
+        return NaturalBuiltin()
+
+    def to_dhall(self):
+        return str(self.value)
+
 
 @attr.s(frozen=True, auto_attribs=True)
 class TextLiteral(Expression):
-    chunks: [str]
+    chunks: [str]  # plain text or interpolated expressions
     context: ShadowDict = CTX_EMPTY
     context = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
     types: ShadowDict = CTX_EMPTY
     types = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
 
+    def map(self, f):
+        return attr.evolve(
+            self,
+            chunks=[
+                f(chunk) if isinstance(chunk, Expression) else chunk
+                for chunk in self.chunks
+            ],
+        )
+
+    def _evaluated(self):
+        # interpolated text literals are spliced in, and plain chunks merged
+        chunks = []
+        plain = []
+        for chunk in self.chunks:
+            if isinstance(chunk, Expression):
+                chunk = chunk.pass_context(self).evaluated()
+                if isinstance(chunk, TextLiteral):
+                    for inner in chunk.chunks:
+                        if isinstance(inner, str):
+                            plain.append(inner)
+                        else:
+                            chunks.extend([''.join(plain), inner])
+                            plain = []
+                    continue
+                chunks.extend([''.join(plain), chunk])
+                plain = []
+            else:
+                plain.append(chunk)
+        chunks.append(''.join(plain))
+        return TextLiteral([chunk for chunk in chunks if chunk != ''])
+
+    def _type(self):
+        for chunk in self.chunks:
+            if isinstance(chunk, Expression):
+                chunk = chunk.pass_context(self)
+                typ = chunk.normalized_type()
+                if typ != TextBuiltin():
+                    raise TypeError('interpolated `{}` is not a `Text`, but `{}`', chunk, typ)
+        return TextBuiltin()
+
 
 @attr.s(frozen=True, auto_attribs=True)
 class BooleanLiteral(Expression):
@@ -846,6 +1463,9 @@ class BooleanLiteral(Expression):
     types: ShadowDict = CTX_EMPTY
     types = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
 
+    def _type(self):
+        return BoolBuiltin()
+
     def to_dhall(self):
         return str(self.value)
 
@@ -915,9 +1535,28 @@ class ListBuiltin(BuiltinExpression):
         return ListType(value)
 
 
+def list_fold_result_type(element_type):
+    """∀(list : Type) → ∀(cons : a → list → list) → ∀(nil : list) → list"""
+    return ForAll(
+        'list', TypeBuiltin(),
+        ForAll(
+            'cons', ForAll('_', element_type, ForAll('_', Variable('list'), Variable('list'))),
+            ForAll('nil', Variable('list'), Variable('list')),
+        ),
+    )
+
+
 class ListBuild(BuiltinExpression):
     dhall_string = 'List/build'
 
+    @property
+    def builtin_type(self):
+        """∀(a : Type) → (∀(list : Type) → …) → List a"""
+        return ForAll(
+            'a', TypeBuiltin(),
+            ForAll('_', list_fold_result_type(Variable('a')), ListType(Variable('a'))),
+        )
+
     def can_apply_to(self, value):
         return True
 
@@ -979,6 +1618,14 @@ class ListBuildTyped(Expression):
 class ListFold(BuiltinExpression):
     dhall_string = 'List/fold'
 
+    @property
+    def builtin_type(self):
+        """∀(a : Type) → List a → ∀(list : Type) → …"""
+        return ForAll(
+            'a', TypeBuiltin(),
+            ForAll('_', ListType(Variable('a')), list_fold_result_type(Variable('a'))),
+        )
+
 
 @attr.s(frozen=True, auto_attribs=True)
 class ListFoldTyped(Expression):
@@ -1042,13 +1689,20 @@ class ListType(Expression):
     types: ShadowDict = CTX_EMPTY
     types = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
 
+    def _type(self):
+        items_type = self.items_type.pass_context(self)
+        if items_type.normalized_type() != TypeBuiltin():
+            raise TypeError('list elements must be terms, not `{}`', items_type)
+        return TypeBuiltin()
+
     def to_dhall(self):
         return 'List {}'.format(self.items_type.to_dhall())
 
 
 @attr.s(frozen=True, auto_attribs=True)
 class RecordType(Expression):
-    fields: [(str, Expression)]
+    fields: SortedDict  # label -> type
+    fields = attr.ib(converter=SortedDict.from_pairs)
     context: ShadowDict = CTX_EMPTY
     context = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
     types: ShadowDict = CTX_EMPTY
@@ -1056,28 +1710,28 @@ class RecordType(Expression):
 
     @property
     def fields_dict(self):
-        return dict(self.fields)
+        return self.fields
 
     def map(self, f):
         return attr.evolve(
             self,
-            fields=[
-                (name, f(expression))
-                for name, expression in self.fields
-            ],
+            fields=self.fields.map(f),
         )
 
     def _type(self):
+        if self.fields.duplicates:
+            raise TypeError('duplicate record type fields: {}', ', '.join(self.fields.duplicates))
         if not self.fields:
             return TypeBuiltin()
         field_types = []
-        for name, expression in self.fields:
+        for name, expression in self.fields.items():
             expression = expression.pass_context(self)
             typ = expression.normalized_type()
             if typ == SortBuiltin() and not exact(expression, KindBuiltin()):
-                raise TypeError("expected `Kind` in a record type field, but got {}".format(
-                    expression.to_dhall(),
-                ))
+                raise TypeError(
+                    "expected `Kind` in a record type field, but got {}",
+                    expression,
+                )
             field_types.append(typ)
         if all(t == TypeBuiltin() for t in field_types):
             return TypeBuiltin()
@@ -1085,10 +1739,19 @@ class RecordType(Expression):
             return SortBuiltin()
         raise TypeError("all record type members must be of type Type, or all must be of type Kind or Sort")
 
+    def to_dhall(self):
+        if not self.fields:
+            return '{}'
+        return '{{ {} }}'.format(', '.join(
+            '{} : {}'.format(name, typ.to_dhall())
+            for name, typ in self.fields.items()
+        ))
+
 
 @attr.s(frozen=True, auto_attribs=True)
 class UnionType(Expression):
-    alternatives: [(str, Expression)]
+    alternatives: SortedDict  # label -> type
+    alternatives = attr.ib(converter=SortedDict.from_pairs)
     context: ShadowDict = CTX_EMPTY
     context = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
     types: ShadowDict = CTX_EMPTY
@@ -1096,38 +1759,35 @@ class UnionType(Expression):
 
     @property
     def alternatives_dict(self):
-        return dict(self.alternatives)
+        return self.alternatives
 
     def _type(self):
-        if not unique([a[0] for a in self.alternatives]):
+        if self.alternatives.duplicates:
             raise TypeError('fields of union type must be unique')
         if len(self.alternatives) == 0:
             return TypeBuiltin()
-        typ = self.alternatives[0][1].pass_context(self).normalized_type()
+        alternatives = iter(self.alternatives.values())
+        typ = next(alternatives).pass_context(self).normalized_type()
         if typ not in (TypeBuiltin(), KindBuiltin(), SortBuiltin()):
             raise TypeError('only Types, Kind and Sorts are allowed for union type alternatives')
-        for a in self.alternatives[1:]:
-            alternative_typ = a[1].pass_context(self).normalized_type()
+        for alternative in alternatives:
+            alternative_typ = alternative.pass_context(self).normalized_type()
             if typ != alternative_typ:
                 raise TypeError('all fields on union type must have the same type')
         return typ
 
-    def _normalized(self, ctx):
-        new = super()._normalized(ctx)
-        return attr.evolve(
-            new,
-            alternatives=sorted(new.alternatives),
-        )
-
     def map(self, f):
         return attr.evolve(
             self,
-            alternatives=[
-                (name, f(expr))
-                for name, expr in self.alternatives
-            ],
+            alternatives=self.alternatives.map(f),
         )
 
+    def to_dhall(self):
+        return '< {} >'.format(' | '.join(
+            '{} : {}'.format(name, typ.to_dhall())
+            for name, typ in self.alternatives.items()
+        ))
+
 
 @attr.s(frozen=True, auto_attribs=True)
 class OptionalType(Expression):
@@ -1136,3 +1796,9 @@ class OptionalType(Expression):
     context = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
     types: ShadowDict = CTX_EMPTY
     types = attr.ib(default=CTX_EMPTY, repr=False, cmp=False)
+
+    def _type(self):
+        wrapped = self.wrapped.pass_context(self)
+        if wrapped.normalized_type() != TypeBuiltin():
+            raise TypeError('optional value must be a term, not `{}`', wrapped)
+        return TypeBuiltin()
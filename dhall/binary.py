@@ -0,0 +1,713 @@
+"""Binary (CBOR) encoding of expressions, as described by the dhall standard.
+
+Expressions are encoded straight into a byte buffer and decoded straight out
+of one, without an intermediate tree of python values. The decoder reads
+`bytes`, `bytearray` or `memoryview` objects (or anything else supporting
+the buffer protocol, like `mmap`) and never copies the input - only label and
+text payloads are turned into python strings.
+
+Encodings of big subexpressions are remembered in their nodes' memo, so
+encoding a tree again, or a tree sharing subtrees with an already encoded
+one, splices remembered bytes instead of walking the nodes. Together with
+memoized normal forms this makes `Expression.semantic_hash()` cheap to
+recompute after a small change.
+
+Imports can't be encoded yet, they have to be resolved first."""
+import math
+import struct
+
+from . import ast
+
+
+# CBOR major types
+UNSIGNED = 0
+NEGATIVE = 1
+BYTES = 2
+TEXT = 3
+ARRAY = 4
+MAP = 5
+TAG = 6
+SIMPLE = 7
+
+FALSE = b'\xf4'
+TRUE = b'\xf5'
+NULL = b'\xf6'
+
+BIGNUM_TAG = 2
+SELF_DESCRIBE_TAG = 55799
+
+# labels of expression arrays
+APPLICATION = 0
+LAMBDA = 1
+FORALL = 2
+OPERATOR = 3
+LIST = 4
+OPTIONAL = 5
+MERGE = 6
+RECORD_TYPE = 7
+RECORD_LITERAL = 8
+FIELD = 9
+PROJECTION = 10
+UNION_TYPE = 11
+UNION_LITERAL = 12
+CONDITIONAL = 14
+NATURAL = 15
+TEXT_LITERAL = 18
+LET = 25
+ANNOTATION = 26
+
+operators = {
+    ast.Or: 0,
+    ast.And: 1,
+    ast.Plus: 4,
+    ast.Times: 5,
+    ast.ListAppendExpression: 7,
+    ast.CombineExpression: 8,
+    ast.PreferExpression: 9,
+    ast.CombineTypesExpression: 10,
+}
+operator_classes = {code: cls for cls, code in operators.items()}
+
+
+def dumps(expression):
+    """Encode an expression into bytes."""
+    out = bytearray()
+    encode(expression, out)
+    return bytes(out)
+
+
+def encoded(expression):
+    """Encode an expression into bytes, reusing the encoding remembered in
+    the node, if it has one (decoded snapshot entries do)."""
+    try:
+        return expression.memo['cbor']
+    except KeyError:
+        return dumps(expression)
+
+
+def dump(expression, fp):
+    """Write encoded expression into a binary file."""
+    fp.write(dumps(expression))
+
+
+def loads(data):
+    """Decode an expression from a bytes-like object."""
+    decoder = Decoder(data)
+    expression = decoder.expression()
+    if decoder.position != len(decoder.data):
+        raise ValueError('trailing data after encoded expression at byte {}'.format(decoder.position))
+    return expression
+
+
+def load(fp):
+    """Read an encoded expression from a binary file."""
+    return loads(fp.read())
+
+
+# encoding
+
+_encoders = {}
+
+
+def encodes(*classes):
+    def register(f):
+        for cls in classes:
+            _encoders[cls] = f
+        return f
+    return register
+
+
+def encode(expression, out):
+    data = expression.memo.get('cbor')
+    if data is not None:
+        out += data
+        return
+    for cls in type(expression).__mro__:
+        if cls in _encoders:
+            break
+    else:
+        raise NotImplementedError('{} cannot be encoded'.format(expression.__class__))
+    _encoders[cls](expression, out)
+
+
+def head(major, value, out):
+    if value < 24:
+        out.append(major << 5 | value)
+    elif value < 1 << 8:
+        out.append(major << 5 | 24)
+        out.append(value)
+    elif value < 1 << 16:
+        out.append(major << 5 | 25)
+        out += value.to_bytes(2, 'big')
+    elif value < 1 << 32:
+        out.append(major << 5 | 26)
+        out += value.to_bytes(4, 'big')
+    else:
+        out.append(major << 5 | 27)
+        out += value.to_bytes(8, 'big')
+
+
+def unsigned(value, out):
+    if value < 1 << 64:
+        head(UNSIGNED, value, out)
+    else:
+        head(TAG, BIGNUM_TAG, out)
+        payload = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+        head(BYTES, len(payload), out)
+        out += payload
+
+
+def string(value, out):
+    payload = value.encode('utf8')
+    head(TEXT, len(payload), out)
+    out += payload
+
+
+def double(value, out):
+    """Encode a float in the smallest width that represents it exactly"""
+    if math.isnan(value):
+        out += b'\xf9\x7e\x00'
+        return
+    for width, fmt in ((25, '>e'), (26, '>f')):
+        try:
+            packed = struct.pack(fmt, value)
+        except OverflowError:
+            continue
+        if struct.unpack(fmt, packed)[0] == value:
+            out.append(SIMPLE << 5 | width)
+            out += packed
+            return
+    out.append(SIMPLE << 5 | 27)
+    out += struct.pack('>d', value)
+
+
+def labelled_map(mapping, out):
+    """Encode a map of labels into expressions (or nulls)"""
+    head(MAP, len(mapping), out)
+    for label, value in mapping.items():
+        string(label, out)
+        if value is None:
+            out += NULL
+        else:
+            encode(value, out)
+
+
+@encodes(ast.Variable)
+def encode_variable(expression, out):
+    if expression.name == ast.DEFAULT_VARIABLE_NAME:
+        unsigned(expression.scope, out)
+    else:
+        head(ARRAY, 2, out)
+        string(expression.name, out)
+        unsigned(expression.scope, out)
+
+
+@encodes(ast.BuiltinExpression)
+def encode_builtin(expression, out):
+    string(expression.dhall_string, out)
+
+
+@encodes(ast.BooleanLiteral)
+def encode_boolean(expression, out):
+    out += TRUE if expression.value else FALSE
+
+
+@encodes(ast.DoubleLiteral)
+def encode_double(expression, out):
+    double(expression.value, out)
+
+
+@encodes(ast.NaturalLiteral)
+def encode_natural(expression, out):
+    head(ARRAY, 2, out)
+    unsigned(NATURAL, out)
+    unsigned(expression.value, out)
+
+
+@encodes(ast.TextLiteral)
+def encode_text(expression, out):
+    # plain chunks are merged, so that there is always text between
+    # interpolations, and at both ends
+    parts = []
+    plain = []
+    for chunk in expression.chunks:
+        if isinstance(chunk, ast.Expression):
+            parts.append(''.join(plain))
+            parts.append(chunk)
+            plain = []
+        else:
+            plain.append(chunk)
+    parts.append(''.join(plain))
+    head(ARRAY, 1 + len(parts), out)
+    unsigned(TEXT_LITERAL, out)
+    for part in parts:
+        if isinstance(part, str):
+            string(part, out)
+        else:
+            encode(part, out)
+
+
+@encodes(ast.ApplicationExpression)
+def encode_application(expression, out):
+    arguments = []
+    while isinstance(expression, ast.ApplicationExpression):
+        arguments.append(expression.arg2)
+        expression = expression.arg1
+    head(ARRAY, 2 + len(arguments), out)
+    unsigned(APPLICATION, out)
+    encode(expression, out)
+    for argument in reversed(arguments):
+        encode(argument, out)
+
+
+@encodes(ast.ListBuildTyped, ast.ListFoldTyped)
+def encode_typed_builtin(expression, out):
+    builtin = ast.ListBuild() if isinstance(expression, ast.ListBuildTyped) else ast.ListFold()
+    encode_application(ast.ApplicationExpression(builtin, expression.element_type), out)
+
+
+def binder(label, expression, out):
+    """Encode a lambda or a forall"""
+    if expression.parameter_name == ast.DEFAULT_VARIABLE_NAME:
+        head(ARRAY, 3, out)
+        unsigned(label, out)
+    else:
+        head(ARRAY, 4, out)
+        unsigned(label, out)
+        string(expression.parameter_name, out)
+    encode(expression.parameter_type, out)
+    encode(expression.expression, out)
+
+
+encodes(ast.Lambda)(lambda expression, out: binder(LAMBDA, expression, out))
+encodes(ast.ForAll)(lambda expression, out: binder(FORALL, expression, out))
+
+
+@encodes(*operators)
+def encode_operator(expression, out):
+    head(ARRAY, 4, out)
+    unsigned(OPERATOR, out)
+    unsigned(operators[type(expression)], out)
+    encode(expression.arg1, out)
+    encode(expression.arg2, out)
+
+
+@encodes(ast.ListLiteral)
+def encode_list(expression, out):
+    if not expression.items:
+        if expression.element_type is None:
+            raise ValueError('type of an empty list must be known to encode it')
+        head(ARRAY, 2, out)
+        unsigned(LIST, out)
+        encode(expression.element_type, out)
+        return
+    head(ARRAY, 2 + len(expression.items), out)
+    unsigned(LIST, out)
+    out += NULL
+    for item in expression.items:
+        encode(item, out)
+
+
+@encodes(ast.OptionalLiteral)
+def encode_optional(expression, out):
+    if expression.wrapped is None:
+        if expression.wrapped_type is None:
+            raise ValueError('type of an empty optional must be known to encode it')
+        head(ARRAY, 2, out)
+        unsigned(OPTIONAL, out)
+        encode(expression.wrapped_type, out)
+        return
+    head(ARRAY, 3, out)
+    unsigned(OPTIONAL, out)
+    out += NULL
+    encode(expression.wrapped, out)
+
+
+@encodes(ast.TypeAnnotation)
+def encode_annotation(expression, out):
+    value = expression.expression
+    typ = expression.expression_type
+    if isinstance(value, ast.ListLiteral) and not value.items and isinstance(typ, ast.ListType):
+        # `[] : List T`
+        head(ARRAY, 2, out)
+        unsigned(LIST, out)
+        encode(typ.items_type, out)
+    elif isinstance(value, ast.OptionalLiteral) and isinstance(typ, ast.OptionalType):
+        # `[] : Optional T` or `[x] : Optional T`
+        head(ARRAY, 2 if value.wrapped is None else 3, out)
+        unsigned(OPTIONAL, out)
+        encode(typ.wrapped, out)
+        if value.wrapped is not None:
+            encode(value.wrapped, out)
+    else:
+        head(ARRAY, 3, out)
+        unsigned(ANNOTATION, out)
+        encode(value, out)
+        encode(typ, out)
+
+
+@encodes(ast.MergeExpression)
+def encode_merge(expression, out):
+    head(ARRAY, 3 if expression.result_type is None else 4, out)
+    unsigned(MERGE, out)
+    encode(expression.handlers, out)
+    encode(expression.union, out)
+    if expression.result_type is not None:
+        encode(expression.result_type, out)
+
+
+@encodes(ast.RecordType)
+def encode_record_type(expression, out):
+    head(ARRAY, 2, out)
+    unsigned(RECORD_TYPE, out)
+    labelled_map(expression.fields, out)
+
+
+@encodes(ast.RecordLiteral)
+def encode_record_literal(expression, out):
+    head(ARRAY, 2, out)
+    unsigned(RECORD_LITERAL, out)
+    labelled_map(expression.fields, out)
+
+
+@encodes(ast.SelectExpression)
+def encode_field(expression, out):
+    head(ARRAY, 3, out)
+    unsigned(FIELD, out)
+    encode(expression.expression, out)
+    string(expression.label, out)
+
+
+@encodes(ast.ProjectionExpression)
+def encode_projection(expression, out):
+    head(ARRAY, 2 + len(expression.labels), out)
+    unsigned(PROJECTION, out)
+    encode(expression.expression, out)
+    for label in expression.labels:
+        string(label, out)
+
+
+@encodes(ast.UnionType)
+def encode_union_type(expression, out):
+    head(ARRAY, 2, out)
+    unsigned(UNION_TYPE, out)
+    labelled_map(expression.alternatives, out)
+
+
+@encodes(ast.Union)
+def encode_union_literal(expression, out):
+    head(ARRAY, 4, out)
+    unsigned(UNION_LITERAL, out)
+    string(expression.label, out)
+    encode(expression.value, out)
+    labelled_map(expression.alternatives, out)
+
+
+@encodes(ast.Conditional)
+def encode_conditional(expression, out):
+    head(ARRAY, 4, out)
+    unsigned(CONDITIONAL, out)
+    encode(expression.condition, out)
+    encode(expression.if_true, out)
+    encode(expression.if_false, out)
+
+
+@encodes(ast.LetIn)
+def encode_let(expression, out):
+    # nested lets are encoded as a single one
+    parameters = []
+    while isinstance(expression, ast.LetIn):
+        parameters.extend(expression.parameters)
+        expression = expression.expression
+    head(ARRAY, 2 + 3 * len(parameters), out)
+    unsigned(LET, out)
+    for name, value, typ in parameters:
+        string(name, out)
+        if typ is None:
+            out += NULL
+        else:
+            encode(typ, out)
+        encode(value, out)
+    encode(expression, out)
+
+
+@encodes(ast.ListType)
+def encode_list_type(expression, out):
+    encode_application(ast.ApplicationExpression(ast.ListBuiltin(), expression.items_type), out)
+
+
+@encodes(ast.OptionalType)
+def encode_optional_type(expression, out):
+    head(ARRAY, 3, out)
+    unsigned(APPLICATION, out)
+    string('Optional', out)
+    encode(expression.wrapped, out)
+
+
+# decoding
+
+class Decoder:
+    """Reads CBOR items from a buffer, keeping track of the position"""
+    def __init__(self, data, position=0):
+        self.data = memoryview(data)
+        self.position = position
+
+    def byte(self):
+        try:
+            b = self.data[self.position]
+        except IndexError:
+            raise ValueError('unexpected end of data')
+        self.position += 1
+        return b
+
+    def take(self, length):
+        start = self.position
+        self.position += length
+        if self.position > len(self.data):
+            raise ValueError('unexpected end of data')
+        return self.data[start:self.position]
+
+    def head(self):
+        """Read initial bytes of an item and return its major type and
+        argument. Simple values are decoded right away."""
+        initial = self.byte()
+        major = initial >> 5
+        info = initial & 31
+        if major == SIMPLE:
+            if info == 20:
+                return major, False
+            if info == 21:
+                return major, True
+            if info == 22:
+                return major, None
+            if info == 25:
+                return major, struct.unpack('>e', self.take(2))[0]
+            if info == 26:
+                return major, struct.unpack('>f', self.take(4))[0]
+            if info == 27:
+                return major, struct.unpack('>d', self.take(8))[0]
+            raise ValueError('unsupported simple value {}'.format(info))
+        if info < 24:
+            value = info
+        elif info < 28:
+            value = int.from_bytes(self.take(1 << (info - 24)), 'big')
+        else:
+            raise ValueError('unsupported length {} at byte {}'.format(info, self.position - 1))
+        if major == TAG:
+            if value == SELF_DESCRIBE_TAG:
+                return self.head()
+            if value == BIGNUM_TAG:
+                major, length = self.head()
+                if major != BYTES:
+                    raise ValueError('bignum must be a byte string')
+                return UNSIGNED, int.from_bytes(self.take(length), 'big')
+            raise ValueError('unsupported tag {}'.format(value))
+        return major, value
+
+    def string(self):
+        major, length = self.head()
+        if major != TEXT:
+            raise ValueError('expected a string at byte {}'.format(self.position))
+        return str(self.take(length), 'utf8')
+
+    def unsigned(self):
+        major, value = self.head()
+        if major != UNSIGNED:
+            raise ValueError('expected an unsigned integer at byte {}'.format(self.position))
+        return value
+
+    def is_null(self):
+        """Skip a null, if it's next"""
+        if self.data[self.position] == NULL[0]:
+            self.position += 1
+            return True
+        return False
+
+    def skip(self):
+        """Move past the next item without decoding it"""
+        major, value = self.head()
+        if major in (BYTES, TEXT):
+            self.take(value)
+        elif major == ARRAY:
+            for _ in range(value):
+                self.skip()
+        elif major == MAP:
+            for _ in range(2 * value):
+                self.skip()
+
+    def optional_expression(self):
+        if self.is_null():
+            return None
+        return self.expression()
+
+    def labelled_map(self):
+        major, length = self.head()
+        if major != MAP:
+            raise ValueError('expected a map at byte {}'.format(self.position))
+        return [(self.string(), self.optional_expression()) for _ in range(length)]
+
+    def expression(self):
+        major, value = self.head()
+        if major == UNSIGNED:
+            return ast.Variable(ast.DEFAULT_VARIABLE_NAME, value)
+        if major == TEXT:
+            name = str(self.take(value), 'utf8')
+            builtin = ast._builtins.get(name)
+            if builtin is None or isinstance(builtin, ast.BooleanLiteral):
+                raise ValueError('unknown builtin {}'.format(name))
+            return builtin
+        if major == SIMPLE:
+            if isinstance(value, bool):
+                return ast.BooleanLiteral(value)
+            if isinstance(value, float):
+                return ast.DoubleLiteral(value)
+            raise ValueError('unexpected null at byte {}'.format(self.position - 1))
+        if major != ARRAY or value == 0:
+            raise ValueError('expected an expression at byte {}'.format(self.position - 1))
+        length = value
+        major, value = self.head()
+        if major == TEXT:
+            # `x@n`
+            if length != 2:
+                raise ValueError('malformed variable at byte {}'.format(self.position))
+            return ast.Variable(str(self.take(value), 'utf8'), self.unsigned())
+        if major != UNSIGNED or value not in _decoders:
+            raise ValueError('unknown expression label at byte {}'.format(self.position))
+        return _decoders[value](self, length - 1)
+
+
+_decoders = {}
+
+
+def decodes(label):
+    def register(f):
+        _decoders[label] = f
+        return f
+    return register
+
+
+@decodes(APPLICATION)
+def decode_application(decoder, length):
+    start = decoder.position
+    major, value = decoder.head()
+    if major == TEXT and length == 2 and decoder.take(value) == b'Optional':
+        # there is no standalone `Optional` builtin, only the applied type
+        return ast.OptionalType(decoder.expression())
+    decoder.position = start
+    expression = decoder.expression()
+    for _ in range(length - 1):
+        argument = decoder.expression()
+        if isinstance(expression, ast.ListBuiltin):
+            expression = ast.ListType(argument)
+        else:
+            expression = ast.ApplicationExpression(expression, argument)
+    return expression
+
+
+def decode_binder(cls, decoder, length):
+    name = decoder.string() if length == 3 else ast.DEFAULT_VARIABLE_NAME
+    parameter_type = decoder.expression()
+    return cls(name, parameter_type, decoder.expression())
+
+
+decodes(LAMBDA)(lambda decoder, length: decode_binder(ast.Lambda, decoder, length))
+decodes(FORALL)(lambda decoder, length: decode_binder(ast.ForAll, decoder, length))
+
+
+@decodes(OPERATOR)
+def decode_operator(decoder, length):
+    code = decoder.unsigned()
+    if code not in operator_classes:
+        raise NotImplementedError('operator {} is not supported'.format(code))
+    arg1 = decoder.expression()
+    return operator_classes[code](arg1, decoder.expression())
+
+
+@decodes(LIST)
+def decode_list(decoder, length):
+    element_type = decoder.optional_expression()
+    if element_type is not None:
+        if length != 1:
+            raise ValueError('non-empty list literal must not have a type')
+        return ast.TypeAnnotation(ast.ListLiteral([]), ast.ListType(element_type))
+    return ast.ListLiteral([decoder.expression() for _ in range(length - 1)])
+
+
+@decodes(OPTIONAL)
+def decode_optional(decoder, length):
+    wrapped_type = decoder.optional_expression()
+    wrapped = decoder.expression() if length == 2 else None
+    if wrapped_type is None:
+        return ast.OptionalLiteral(wrapped)
+    return ast.TypeAnnotation(ast.OptionalLiteral(wrapped), ast.OptionalType(wrapped_type))
+
+
+@decodes(MERGE)
+def decode_merge(decoder, length):
+    handlers = decoder.expression()
+    union = decoder.expression()
+    result_type = decoder.expression() if length == 3 else None
+    return ast.MergeExpression(handlers, union, result_type)
+
+
+decodes(RECORD_TYPE)(lambda decoder, length: ast.RecordType(decoder.labelled_map()))
+decodes(RECORD_LITERAL)(lambda decoder, length: ast.RecordLiteral(decoder.labelled_map()))
+decodes(UNION_TYPE)(lambda decoder, length: ast.UnionType(decoder.labelled_map()))
+
+
+@decodes(FIELD)
+def decode_field(decoder, length):
+    expression = decoder.expression()
+    return ast.SelectExpression(expression, decoder.string())
+
+
+@decodes(PROJECTION)
+def decode_projection(decoder, length):
+    expression = decoder.expression()
+    return ast.ProjectionExpression(expression, [decoder.string() for _ in range(length - 1)])
+
+
+@decodes(UNION_LITERAL)
+def decode_union_literal(decoder, length):
+    label = decoder.string()
+    value = decoder.expression()
+    return ast.Union(label, value, decoder.labelled_map())
+
+
+@decodes(CONDITIONAL)
+def decode_conditional(decoder, length):
+    condition = decoder.expression()
+    if_true = decoder.expression()
+    return ast.Conditional(condition, if_true, decoder.expression())
+
+
+decodes(NATURAL)(lambda decoder, length: ast.NaturalLiteral(decoder.unsigned()))
+
+
+@decodes(TEXT_LITERAL)
+def decode_text(decoder, length):
+    chunks = []
+    for i in range(length):
+        if i % 2:
+            chunks.append(decoder.expression())
+        else:
+            chunk = decoder.string()
+            if chunk:
+                chunks.append(chunk)
+    return ast.TextLiteral(chunks)
+
+
+@decodes(LET)
+def decode_let(decoder, length):
+    parameters = []
+    for _ in range(length // 3):
+        name = decoder.string()
+        typ = decoder.optional_expression()
+        parameters.append((name, decoder.expression(), typ))
+    return ast.LetIn(parameters, decoder.expression())
+
+
+@decodes(ANNOTATION)
+def decode_annotation(decoder, length):
+    expression = decoder.expression()
+    return ast.TypeAnnotation(expression, decoder.expression())
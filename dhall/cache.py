@@ -0,0 +1,122 @@
+"""Content-addressed cache of imported expressions, kept on disk.
+
+Expressions imported with a `sha256:` hash are stored in binary form of their
+alpha-beta-normal form, in `$XDG_CACHE_HOME/dhall` (or `~/.cache/dhall`),
+under names made of the hash in multihash notation (`1220` followed by hex
+digest), as other dhall implementations do. The semantic hash is the digest
+of exactly these bytes, so an entry is verified by hashing the file, without
+decoding or normalizing anything.
+
+Entries are written to temporary files and atomically renamed, so
+concurrent writers (threads or processes) never expose partial entries.
+When the cache grows above `max_size` bytes, least recently used entries are
+removed. Problems with the cache directory are ignored - the cache is then
+simply not used."""
+import hashlib
+import os
+import tempfile
+import threading
+
+from . import binary
+
+
+DEFAULT_MAX_SIZE = 1 << 30
+MULTIHASH_PREFIX = '1220'  # sha256, 32 bytes
+TEMPORARY_PREFIX = '.tmp-'
+
+
+def default_directory():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'dhall')
+
+
+class Cache:
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = default_directory() if directory is None else directory
+        self.max_size = max_size
+        self._size = None  # total size of entries, computed on first write
+        self._lock = threading.Lock()
+
+    def path(self, hash):
+        algorithm, digest = hash.split(':', 1)
+        if algorithm != 'sha256':
+            raise ValueError('unsupported hash algorithm {}'.format(algorithm))
+        return os.path.join(self.directory, MULTIHASH_PREFIX + digest)
+
+    def get(self, hash):
+        """Expression with given semantic hash, or None if it's not cached
+        (or the entry is corrupted)."""
+        path = self.path(hash)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if hashlib.sha256(data).hexdigest() != hash.split(':', 1)[1]:
+            self.remove(path)
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return binary.loads(data)
+
+    def put(self, hash, expression):
+        """Store an expression under its semantic hash."""
+        data = binary.encoded(expression.evaluated().normalized())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temporary = tempfile.mkstemp(dir=self.directory, prefix=TEMPORARY_PREFIX)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(temporary, self.path(hash))
+            except BaseException:
+                self.remove(temporary)
+                raise
+        except OSError:
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self.entries())
+            else:
+                self._size += len(data)
+            if self._size > self.max_size:
+                self.evict()
+
+    def entries(self):
+        """(path, size, last use) of every entry"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        entries = []
+        for name in names:
+            if not name.startswith(MULTIHASH_PREFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries, until the cache fits in the
+        size limit."""
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        size = sum(size for _, size, _ in entries)
+        for path, entry_size, _ in entries:
+            if size <= self.max_size:
+                break
+            self.remove(path)
+            size -= entry_size
+        self._size = size
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
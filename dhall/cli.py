@@ -0,0 +1,181 @@
+"""Command line interface - `dhall-python`.
+
+Every command reads files (or stdin) and prints a result for each. Files
+are processed in one process, sharing a `Session`, or in a pool of `-j`
+worker processes, each with a session of its own. With `--json`, a JSON
+object with the result (or error) and the time it took is printed per file.
+
+When given a socket of a running `dhall-python serve` (with `--socket` or
+the `DHALL_PYTHON_SOCKET` environment variable), commands are sent to that
+server, which has everything warm already; if nothing listens there, they
+run here."""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+
+from . import daemon
+from .imports import read_file
+from .json import dumps as to_json
+from .session import Session
+from .snapshot import Snapshot
+
+
+def parse_command(session, expression, filename):
+    return repr(expression)
+
+
+def type_command(session, expression, filename):
+    expression = session.shared(session.resolve(expression, filename))
+    return expression.normalized_type().to_dhall()
+
+
+def normalize_command(session, expression, filename):
+    return session.evaluate(expression, filename).normalized().to_dhall()
+
+
+def hash_command(session, expression, filename):
+    return session.evaluate(expression, filename).semantic_hash()
+
+
+def json_command(session, expression, filename):
+    return to_json(session.evaluate(expression, filename))
+
+
+commands = {
+    'parse': parse_command,
+    'type': type_command,
+    'normalize': normalize_command,
+    'hash': hash_command,
+    'json': json_command,
+}
+
+
+def run(session, command, path=None, source=None):
+    """Run a command on a file, or on source text (coming from a file at
+    `path`, if it's given)"""
+    if source is None:
+        source = read_file(path)
+    return command(session, session.parse(source), path)
+
+
+def timed(path, f, *args):
+    """Machine-readable outcome of a command run on a file: its result or
+    error, and how long it took"""
+    start = time.perf_counter()
+    try:
+        outcome = {'path': path, 'result': f(*args)}
+    except daemon.RemoteError as e:
+        outcome = {'path': path, 'error': e.message, 'kind': e.kind}
+    except Exception as e:
+        outcome = {'path': path, 'error': str(e), 'kind': e.__class__.__name__}
+    outcome['seconds'] = time.perf_counter() - start
+    return outcome
+
+
+# session of a worker process
+_worker_session = None
+
+
+def init_worker(snapshot):
+    global _worker_session
+    _worker_session = make_session(snapshot)
+
+
+def run_in_worker(command, path):
+    return timed(path, run, _worker_session, commands[command], path)
+
+
+def make_session(snapshot):
+    return Session(snapshot=None if snapshot is None else Snapshot.load(snapshot))
+
+
+def server_available(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+def outcomes(args, source):
+    """Outcomes of the command for all files, in order"""
+    if args.socket is not None and server_available(args.socket):
+        if source is not None:
+            return [timed(None, daemon.request, args.socket, args.command, None, source)]
+        with ThreadPoolExecutor(args.jobs) as executor:
+            return list(executor.map(
+                lambda path: timed(path, daemon.request, args.socket, args.command, path),
+                args.paths,
+            ))
+    if args.jobs == 1 or len(args.paths) <= 1:
+        session = make_session(args.snapshot)
+        if source is not None:
+            return [timed(None, run, session, commands[args.command], None, source)]
+        return [timed(path, run, session, commands[args.command], path) for path in args.paths]
+    with ProcessPoolExecutor(args.jobs, initializer=init_worker, initargs=(args.snapshot,)) as executor:
+        return list(executor.map(run_in_worker, [args.command] * len(args.paths), args.paths))
+
+
+def argument_parser():
+    parser = argparse.ArgumentParser(prog='dhall-python')
+    parser.add_argument(
+        '--socket', default=os.environ.get('DHALL_PYTHON_SOCKET'),
+        help='Unix socket of a dhall-python server',
+    )
+    parser.add_argument('--snapshot', help='snapshot of imports to use')
+    files = argparse.ArgumentParser(add_help=False)
+    files.add_argument('paths', nargs='*', metavar='path', help='files to read, stdin if none are given')
+    files.add_argument('-j', '--jobs', type=int, default=1, help='number of parallel workers')
+    files.add_argument(
+        '--json', action='store_true',
+        help='print a JSON object with result or error and time taken, per line and file',
+    )
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.required = True
+    for name in commands:
+        subparsers.add_parser(name, parents=[files])
+    subparsers.add_parser('serve', help='answer commands sent to --socket')
+    return parser
+
+
+def main(argv=None):
+    parser = argument_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        if args.socket is None:
+            parser.error('serve needs --socket')
+        try:
+            daemon.serve(args.socket, make_session(args.snapshot))
+        except FileExistsError as e:
+            print('dhall-python: {}'.format(e), file=sys.stderr)
+            return 1
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.jobs < 1:
+        parser.error('--jobs must be positive')
+    source = sys.stdin.read() if not args.paths else None
+    failed = False
+    results = outcomes(args, source)
+    for outcome in results:
+        failed = failed or 'error' in outcome
+        if args.json:
+            print(json.dumps(outcome))
+            continue
+        if len(results) > 1:
+            print('==> {} <=='.format(outcome['path']))
+        if 'error' in outcome:
+            prefix = '' if outcome['path'] is None else outcome['path'] + ': '
+            print('{}{}: {}'.format(prefix, outcome['kind'], outcome['error']), file=sys.stderr)
+        else:
+            print(outcome['result'])
+    return 1 if failed else 0
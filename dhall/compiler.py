@@ -0,0 +1,326 @@
+"""Compilation of dhall expressions into python closures.
+
+A compiled expression works on python's native values instead of AST nodes:
+Naturals are ints, Doubles are floats, Text is str, Bools are bools, lists are
+lists, records are dicts, union values are `(label, value)` pairs, optionals
+are either `None` or the wrapped value, and functions are python callables.
+Types are erased - they compile to `None` - so functions taking types still
+take (and ignore) an argument.
+
+Every node is compiled once into a closure taking a runtime environment (a
+linked list of `(value, parent)` tuples), so applying a compiled function
+costs about as much as calling a python function."""
+from . import ast
+
+
+_compilers = {}
+
+
+def compiles(*classes):
+    def register(f):
+        for cls in classes:
+            _compilers[cls] = f
+        return f
+    return register
+
+
+class Scope:
+    """Compile-time view of the runtime environment. Besides names of the
+    frames, it keeps contexts of values and types of bound variables, as the
+    type checker sees them, so that types of subexpressions can be inferred
+    (that's needed to tell union constructors from field access)."""
+    def __init__(self, name=None, parent=None, values=ast.CTX_EMPTY, types=ast.CTX_EMPTY):
+        self.name = name
+        self.parent = parent
+        self.values = values
+        self.types = types
+
+    def push(self, name, value=None, type=None):
+        """Frame of a variable bound by let to `value`, or by lambda to an
+        argument of `type` (both written in this scope)"""
+        if value is not None:
+            value = self.bound(value)
+        if type is not None:
+            type = self.bound(type)
+        return Scope(
+            name,
+            self,
+            self.values.shadow_single(name, value),
+            self.types.shadow_single(name, type),
+        )
+
+    def bound(self, expression):
+        """Expression with variables of this scope bound, ready for type
+        inference"""
+        return expression.bind_values(self.values).bind_types(self.types)
+
+    def lookup(self, name, index):
+        """Return how many frames to skip to reach `name@index`, and the frame."""
+        depth = 0
+        scope = self
+        while scope.parent is not None:
+            if scope.name == name:
+                if index == 0:
+                    return depth, scope
+                index -= 1
+            depth += 1
+            scope = scope.parent
+        raise ast.TypeError('unbound variable {}@{}', name, index)
+
+
+def compile(expression):
+    """Typecheck a closed expression and compile it into a python value."""
+    expression.type()
+    return compile_expression(expression, Scope())(None)
+
+
+def compile_expression(expression, scope):
+    """Compile an expression into a closure taking the runtime environment."""
+    for cls in type(expression).__mro__:
+        if cls in _compilers:
+            return _compilers[cls](expression, scope)
+    raise NotImplementedError('{} cannot be compiled'.format(expression.__class__))
+
+
+def constant(value):
+    return lambda env: value
+
+
+# types are erased
+
+@compiles(
+    ast.ForAll, ast.ListType, ast.OptionalType, ast.RecordType, ast.UnionType,
+    ast.CombineTypesExpression,
+    ast.SortBuiltin, ast.KindBuiltin, ast.TypeBuiltin,
+    ast.BoolBuiltin, ast.NaturalBuiltin, ast.DoubleBuiltin, ast.TextBuiltin,
+)
+def compile_type(expression, scope):
+    return constant(None)
+
+
+@compiles(ast.ListBuiltin)
+def compile_list_builtin(expression, scope):
+    return constant(lambda _: None)
+
+
+# literals
+
+@compiles(ast.NaturalLiteral, ast.DoubleLiteral, ast.BooleanLiteral)
+def compile_literal(expression, scope):
+    return constant(expression.value)
+
+
+@compiles(ast.TextLiteral)
+def compile_text(expression, scope):
+    chunks = [
+        compile_expression(chunk, scope) if isinstance(chunk, ast.Expression) else constant(chunk)
+        for chunk in expression.chunks
+    ]
+    if all(isinstance(chunk, str) for chunk in expression.chunks):
+        return constant(''.join(expression.chunks))
+    return lambda env: ''.join([chunk(env) for chunk in chunks])
+
+
+@compiles(ast.ListLiteral)
+def compile_list(expression, scope):
+    items = [compile_expression(item, scope) for item in expression.items]
+    return lambda env: [item(env) for item in items]
+
+
+@compiles(ast.OptionalLiteral)
+def compile_optional(expression, scope):
+    if expression.wrapped is None:
+        return constant(None)
+    return compile_expression(expression.wrapped, scope)
+
+
+@compiles(ast.RecordLiteral)
+def compile_record(expression, scope):
+    fields = [
+        (name, compile_expression(value, scope))
+        for name, value in expression.fields.items()
+    ]
+    return lambda env: {name: value(env) for name, value in fields}
+
+
+@compiles(ast.Union)
+def compile_union(expression, scope):
+    label = expression.label
+    value = compile_expression(expression.value, scope)
+    return lambda env: (label, value(env))
+
+
+# variables and functions
+
+@compiles(ast.Variable)
+def compile_variable(expression, scope):
+    depth, _ = scope.lookup(expression.name, expression.scope)
+    if depth == 0:
+        return lambda env: env[0]
+
+    def variable(env):
+        for _ in range(depth):
+            env = env[1]
+        return env[0]
+    return variable
+
+
+@compiles(ast.Lambda)
+def compile_lambda(expression, scope):
+    body = compile_expression(
+        expression.expression,
+        scope.push(expression.parameter_name, type=expression.parameter_type),
+    )
+    return lambda env: lambda arg: body((arg, env))
+
+
+@compiles(ast.ApplicationExpression)
+def compile_application(expression, scope):
+    f = compile_expression(expression.arg1, scope)
+    arg = compile_expression(expression.arg2, scope)
+    return lambda env: f(env)(arg(env))
+
+
+@compiles(ast.LetIn)
+def compile_let(expression, scope):
+    values = []
+    for name, value, _ in expression.parameters:
+        values.append(compile_expression(value, scope))
+        scope = scope.push(name, value=value)
+    body = compile_expression(expression.expression, scope)
+
+    def let(env):
+        for value in values:
+            env = (value(env), env)
+        return body(env)
+    return let
+
+
+@compiles(ast.TypeAnnotation)
+def compile_annotation(expression, scope):
+    return compile_expression(expression.expression, scope)
+
+
+# control flow and operators
+
+@compiles(ast.Conditional)
+def compile_conditional(expression, scope):
+    condition = compile_expression(expression.condition, scope)
+    if_true = compile_expression(expression.if_true, scope)
+    if_false = compile_expression(expression.if_false, scope)
+    return lambda env: if_true(env) if condition(env) else if_false(env)
+
+
+def binary_operator(operator):
+    def compile_operator(expression, scope):
+        a = compile_expression(expression.arg1, scope)
+        b = compile_expression(expression.arg2, scope)
+        return lambda env: operator(a(env), b(env))
+    return compile_operator
+
+
+compiles(ast.Plus, ast.ListAppendExpression)(binary_operator(lambda a, b: a + b))
+compiles(ast.Times)(binary_operator(lambda a, b: a * b))
+compiles(ast.PreferExpression)(binary_operator(lambda a, b: dict(a, **b)))
+
+
+@compiles(ast.Or)
+def compile_or(expression, scope):
+    a = compile_expression(expression.arg1, scope)
+    b = compile_expression(expression.arg2, scope)
+    return lambda env: a(env) or b(env)
+
+
+@compiles(ast.And)
+def compile_and(expression, scope):
+    a = compile_expression(expression.arg1, scope)
+    b = compile_expression(expression.arg2, scope)
+    return lambda env: a(env) and b(env)
+
+
+def combine(a, b):
+    combined = dict(a)
+    for name, value in b.items():
+        if name in combined:
+            value = combine(combined[name], value)
+        combined[name] = value
+    return combined
+
+
+compiles(ast.CombineExpression)(binary_operator(combine))
+
+
+@compiles(ast.MergeExpression)
+def compile_merge(expression, scope):
+    handlers = compile_expression(expression.handlers, scope)
+    union = compile_expression(expression.union, scope)
+
+    def merge(env):
+        label, value = union(env)
+        return handlers(env)[label](value)
+    return merge
+
+
+def is_type(expression, scope):
+    """True if the expression is a type, not a value - told by its inferred
+    type, like the type checker does"""
+    return not isinstance(scope.bound(expression).normalized_type(), ast.RecordType)
+
+
+@compiles(ast.SelectExpression)
+def compile_select(expression, scope):
+    label = expression.label
+    if is_type(expression.expression, scope):
+        # union constructor
+        return constant(lambda value: (label, value))
+    record = compile_expression(expression.expression, scope)
+    return lambda env: record(env)[label]
+
+
+@compiles(ast.ProjectionExpression)
+def compile_projection(expression, scope):
+    labels = expression.labels
+    record = compile_expression(expression.expression, scope)
+
+    def projection(env):
+        value = record(env)
+        return {label: value[label] for label in labels}
+    return projection
+
+
+# builtin functions
+
+@compiles(ast.DoubleShowBuiltin)
+def compile_double_show(expression, scope):
+    return constant(lambda value: str(value))
+
+
+def list_build(_):
+    def build(g):
+        return g(None)(lambda a: lambda as_: [a] + as_)([])
+    return build
+
+
+@compiles(ast.ListBuild)
+def compile_list_build(expression, scope):
+    return constant(list_build)
+
+
+def list_fold(_):
+    def fold(items):
+        def typed(_):
+            def with_cons(cons):
+                def with_nil(nil):
+                    result = nil
+                    for item in reversed(items):
+                        result = cons(item)(result)
+                    return result
+                return with_nil
+            return with_cons
+        return typed
+    return fold
+
+
+@compiles(ast.ListFold)
+def compile_list_fold(expression, scope):
+    return constant(list_fold)
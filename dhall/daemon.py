@@ -0,0 +1,166 @@
+"""Long-running server keeping parsers, caches and snapshots warm.
+
+`serve` listens on a Unix socket and answers requests with a `Session`
+shared by all of them, so repeated requests cost little more than the work
+that's really new. `request` is the client side - `dhall-python` uses it,
+when given a socket, instead of doing the work itself.
+
+Protocol: both requests and responses are frames of a 4 byte big-endian
+length followed by that many bytes of a JSON object. Requests are
+
+    {"command": <name>, "path": <absolute path>}
+    {"command": <name>, "source": <text>, "path": <path or null>}
+
+where the command is one of `dhall.cli.commands`; `path` is the file to
+read, or, with `source`, the file imports are relative to (`request` sends
+a `<stdin>` file in the client's current directory for that). Responses are
+`{"result": <text>}` or `{"error": <message>, "kind": <exception name>}`.
+A connection can carry any number of requests, answered in order.
+
+Imports are resolved by the server, so environment variable imports
+(`env:NAME`) read the server's environment, not the client's."""
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+
+from .session import Session
+
+
+LENGTH = struct.Struct('>I')
+MAX_FRAME_LENGTH = 1 << 30
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def send_frame(sock, message):
+    data = json.dumps(message).encode('utf8')
+    sock.sendall(LENGTH.pack(len(data)) + data)
+
+
+def receive_frame(sock):
+    """Next message from a socket, or None if it was closed between
+    frames"""
+    header = receive_exactly(sock, LENGTH.size)
+    if header is None:
+        return None
+    length, = LENGTH.unpack(header)
+    if length > MAX_FRAME_LENGTH:
+        raise ProtocolError('frame of {} bytes is too long'.format(length))
+    data = receive_exactly(sock, length)
+    if data is None:
+        raise ProtocolError('connection closed inside a frame')
+    return json.loads(data.decode('utf8'))
+
+
+def receive_exactly(sock, length):
+    chunks = []
+    while length:
+        chunk = sock.recv(min(length, 1 << 16))
+        if not chunk:
+            if chunks:
+                raise ProtocolError('connection closed inside a frame')
+            return None
+        chunks.append(chunk)
+        length -= len(chunk)
+    return b''.join(chunks)
+
+
+def handle(session, message):
+    """Response to a request"""
+    from .cli import commands, run
+    try:
+        command = commands[message['command']]
+        return {'result': run(session, command, message.get('path'), message.get('source'))}
+    except Exception as e:
+        return {'error': str(e), 'kind': e.__class__.__name__}
+
+
+class RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                message = receive_frame(self.request)
+            except (ProtocolError, ValueError):
+                return
+            if message is None:
+                return
+            send_frame(self.request, handle(self.server.session, message))
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, session=None):
+        self.session = Session() if session is None else session
+        super().__init__(path, RequestHandler)
+
+
+def serve(path, session=None):
+    """Answer requests on a Unix socket at `path`, until interrupted"""
+    remove_stale_socket(path)
+    server = Server(path, session)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
+def remove_stale_socket(path):
+    """Remove a socket left at `path` by a server that's gone. Raise
+    `FileExistsError` if there's something else there - a file, or a socket
+    a server still listens on."""
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError('{} exists and is not a socket'.format(path))
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except ConnectionRefusedError:
+        os.remove(path)
+        return
+    finally:
+        sock.close()
+    raise FileExistsError('a server is already listening on {}'.format(path))
+
+
+def request(path, command, file=None, source=None):
+    """Make a request to the server at `path`. Return the result text, or
+    raise `RemoteError`."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        if file is None:
+            # imports of source text are relative to the client's directory
+            file = '<stdin>'
+        message = {'command': command, 'path': os.path.abspath(file)}
+        if source is not None:
+            message['source'] = source
+        send_frame(sock, message)
+        response = receive_frame(sock)
+    finally:
+        sock.close()
+    if response is None:
+        raise ProtocolError('server closed the connection')
+    if 'error' in response:
+        raise RemoteError(response['kind'], response['error'])
+    return response['result']
+
+
+class RemoteError(Exception):
+    """Error raised while handling a request by the server"""
+    def __init__(self, kind, message):
+        super().__init__(kind, message)
+        self.kind = kind
+        self.message = message
+
+    def __str__(self):
+        return '{}: {}'.format(self.kind, self.message)
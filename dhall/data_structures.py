@@ -1,7 +1,8 @@
+from collections.abc import Mapping
 from typing import Generic, TypeVar, Dict, Sequence, Tuple
 
 import attr
-from pyrsistent import pvector
+from pyrsistent import PMap, pmap, pvector
 
 KT = TypeVar('KT')
 VT = TypeVar('VT')
@@ -40,6 +41,10 @@ class ShadowDict(Generic[KT, VT]):
             entries[k] = old_vs + vs
         return ShadowDict(entries, self.generation)
 
+    @property
+    def empty(self) -> bool:
+        return not any(self.entries.values())
+
     def has(self, name: KT, scope: int = 0) -> bool:
         return len(self.entries.get(name, [])) > scope
 
@@ -69,3 +74,98 @@ class ShadowDict(Generic[KT, VT]):
 
     def __str__(self):
         return self.pretty_string(str)
+
+
+class SortedDict(Mapping):
+    """An immutable mapping iterated in sorted key order - the canonical order
+    of record fields and union alternatives. Lookups go through a persistent
+    hash map, so they are effectively O(1), and mappings derived with `set`,
+    `update` or `merge` share structure with the mapping they came from.
+
+    Keys that were given more than once at construction time are remembered
+    in `duplicates`, so that typechecking can reject them later."""
+    __slots__ = ('_map', '_keys', '_hash', 'duplicates')
+
+    def __init__(self, entries=pmap(), duplicates=(), keys=None):
+        self._map = entries if isinstance(entries, PMap) else pmap(entries)
+        self._keys = keys
+        self._hash = None
+        self.duplicates = tuple(duplicates)
+
+    @classmethod
+    def from_pairs(cls, pairs) -> 'SortedDict':
+        """Make a mapping out of another mapping or a sequence of pairs."""
+        if isinstance(pairs, SortedDict):
+            return pairs
+        if isinstance(pairs, Mapping):
+            return cls(pairs)
+        evolver = pmap().evolver()
+        duplicates = set()
+        for k, v in pairs:
+            if k in evolver:
+                duplicates.add(k)
+            evolver[k] = v
+        return cls(evolver.persistent(), sorted(duplicates))
+
+    def __getitem__(self, key: KT) -> VT:
+        return self._map[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._map
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+    def __iter__(self):
+        return iter(self.sorted_keys)
+
+    @property
+    def sorted_keys(self) -> Tuple[KT, ...]:
+        if self._keys is None:
+            self._keys = tuple(sorted(self._map.keys()))
+        return self._keys
+
+    def set(self, key: KT, value: VT) -> 'SortedDict[KT, VT]':
+        return SortedDict(self._map.set(key, value), self.duplicates)
+
+    def update(self, other: Mapping) -> 'SortedDict[KT, VT]':
+        """Right-biased union of two mappings (values from `other` win)."""
+        if not other:
+            return self
+        if not self:
+            return SortedDict.from_pairs(other)
+        return SortedDict(self._map.update(other), self.duplicates)
+
+    def merge(self, other: Mapping, resolve) -> 'SortedDict[KT, VT]':
+        """Union of two mappings, where values under a key present in both
+        are replaced with `resolve(key, self_value, other_value)`."""
+        evolver = self._map.evolver()
+        for k, v in other.items():
+            if k in evolver:
+                v = resolve(k, evolver[k], v)
+            evolver[k] = v
+        return SortedDict(evolver.persistent(), self.duplicates)
+
+    def select(self, keys) -> 'SortedDict[KT, VT]':
+        """Submapping containing only given keys."""
+        return SortedDict({k: self._map[k] for k in keys})
+
+    def map(self, f) -> 'SortedDict':
+        return SortedDict(
+            {k: f(v) for k, v in self._map.items()},
+            self.duplicates,
+            self._keys,
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, SortedDict):
+            return NotImplemented
+        return self._map == other._map and self.duplicates == other.duplicates
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((self._map, self.duplicates))
+        return self._hash
+
+    def __repr__(self):
+        return 'SortedDict({!r})'.format(list(self.items()))
@@ -0,0 +1,141 @@
+"""Conversion of normalized dhall values into python objects.
+
+Decoders are made out of dhall types: a decoder for a type knows up front
+what every part of a value of that type looks like, so decoding a value
+doesn't need to inspect its nodes. Decoders are cached per type, so loading
+many values of the same schema builds them only once.
+
+Values map to python the same way `dhall.compile` represents them: Naturals
+are ints, Doubles are floats, Text is str, lists are lists, union values are
+`(label, value)` pairs, optionals are either `None` or the wrapped value, and
+functions become compiled python callables. Records become dicts by default;
+tuples (fields in sorted order), attrs classes and dataclasses can be used
+instead."""
+import builtins
+
+import attr
+
+from . import ast
+from .compiler import compile
+
+try:
+    import dataclasses
+except ImportError:  # python < 3.7
+    dataclasses = None
+
+
+_decoders = {}
+
+
+def decoder(typ, record=dict):
+    """Return a function converting normalized values of type `typ`.
+
+    `record` is what records are made into: `dict`, `tuple`, or an attrs or
+    dataclass class. Fields of such class, that are annotated with another
+    attrs or dataclass class, are decoded into that class too."""
+    key = (typ, record)
+    try:
+        return _decoders[key]
+    except KeyError:
+        pass
+    except builtins.TypeError:  # unhashable type, don't cache
+        return make_decoder(typ, record)
+    d = _decoders[key] = make_decoder(typ, record)
+    return d
+
+
+def make_decoder(typ, record=dict):
+    if typ in (ast.NaturalBuiltin(), ast.DoubleBuiltin(), ast.BoolBuiltin()):
+        return literal_value
+    if typ == ast.TextBuiltin():
+        return text_value
+    if isinstance(typ, ast.ListType):
+        return list_decoder(typ.items_type, record)
+    if isinstance(typ, ast.OptionalType):
+        return optional_decoder(typ.wrapped, record)
+    if isinstance(typ, ast.RecordType):
+        return record_decoder(typ, record)
+    if isinstance(typ, ast.UnionType):
+        return union_decoder(typ, record)
+    if isinstance(typ, ast.ForAll):
+        return compile
+    if typ in (ast.TypeBuiltin(), ast.KindBuiltin(), ast.SortBuiltin()):
+        # types are left as they are
+        return identity
+    raise NotImplementedError('values of type `{}` cannot be decoded'.format(typ.to_dhall()))
+
+
+def identity(value):
+    return value
+
+
+def literal_value(value):
+    return value.value
+
+
+def text_value(value):
+    return ''.join(value.chunks)
+
+
+def list_decoder(items_type, record):
+    item_decoder = decoder(items_type, record)
+    if item_decoder is literal_value:
+        return lambda value: [item.value for item in value.items]
+    return lambda value: [item_decoder(item) for item in value.items]
+
+
+def optional_decoder(wrapped_type, record):
+    wrapped_decoder = decoder(wrapped_type, record)
+
+    def decode_optional(value):
+        if value.wrapped is None:
+            return None
+        return wrapped_decoder(value.wrapped)
+    return decode_optional
+
+
+def union_decoder(typ, record):
+    alternative_decoders = {
+        label: decoder(alternative_type, record)
+        for label, alternative_type in typ.alternatives.items()
+    }
+
+    def decode_union(value):
+        return (value.label, alternative_decoders[value.label](value.value))
+    return decode_union
+
+
+def record_classes(record):
+    """Map field names of a record class to record classes of the fields"""
+    if attr.has(record):
+        fields = [(f.name, f.type) for f in attr.fields(record)]
+    elif dataclasses is not None and dataclasses.is_dataclass(record):
+        fields = [(f.name, f.type) for f in dataclasses.fields(record)]
+    else:
+        return {}
+    return {
+        name: typ
+        for name, typ in fields
+        if isinstance(typ, type) and (
+            attr.has(typ) or
+            dataclasses is not None and dataclasses.is_dataclass(typ)
+        )
+    }
+
+
+def record_decoder(typ, record):
+    if record in (dict, tuple):
+        nested_records = {}
+        default_nested_record = record
+    else:
+        nested_records = record_classes(record)
+        default_nested_record = dict
+    field_decoders = [
+        (name, decoder(field_type, nested_records.get(name, default_nested_record)))
+        for name, field_type in typ.fields.items()
+    ]
+    if record is tuple:
+        return lambda value: tuple([d(value.fields[name]) for name, d in field_decoders])
+    if record is dict:
+        return lambda value: {name: d(value.fields[name]) for name, d in field_decoders}
+    return lambda value: record(**{name: d(value.fields[name]) for name, d in field_decoders})
@@ -0,0 +1,220 @@
+"""Conversion of python objects into dhall values - the reverse of
+`dhall.decoding`.
+
+Dicts (and attrs or dataclass instances) become records, lists and tuples
+become lists, ints are Naturals, floats are Doubles, str is Text. With a
+target type, the shape of every value is known up front: encoders are made
+out of the type (and cached per type, like decoders), no per-element type
+inference is done, and lists of primitives are converted in a single
+comprehension (into ordinary list literals - there's no more compact node
+for them). Without a type, the type is guessed from the python value -
+then `None` and empty lists can't be converted, as their dhall type can't be
+told.
+
+Small literal nodes are shared between all values that contain them: AST
+nodes are immutable, so there is no need for copies."""
+import builtins
+from collections.abc import Mapping
+from functools import lru_cache
+import sys
+
+import attr
+
+from . import ast
+
+try:
+    import dataclasses
+except ImportError:  # python < 3.7
+    dataclasses = None
+
+
+TRUE = ast.BooleanLiteral(True)
+FALSE = ast.BooleanLiteral(False)
+
+
+@lru_cache(maxsize=1 << 12)
+def natural_literal(value):
+    return ast.NaturalLiteral(value)
+
+
+@lru_cache(maxsize=1 << 12)
+def text_literal(value):
+    return ast.TextLiteral([value] if value else [])
+
+
+def from_python(obj, type=None):
+    """Convert a python object into a dhall value, optionally of given type."""
+    if type is None:
+        return guess(obj)
+    return encoder(type.evaluated())(obj)
+
+
+# conversion without a type
+
+def guess(obj):
+    if isinstance(obj, ast.Expression):
+        return obj
+    if isinstance(obj, bool):
+        return TRUE if obj else FALSE
+    if isinstance(obj, int):
+        return natural(obj)
+    if isinstance(obj, float):
+        return ast.DoubleLiteral(obj)
+    if isinstance(obj, str):
+        return text_literal(obj)
+    if isinstance(obj, Mapping):
+        return ast.RecordLiteral([(sys.intern(k), guess(v)) for k, v in obj.items()])
+    if isinstance(obj, (list, tuple)):
+        if not obj:
+            raise ValueError('type of an empty list must be given')
+        t = builtins.type(obj[0])
+        if t in _primitive_encoders and all(builtins.type(item) is t for item in obj):
+            f = _primitive_encoders[t]
+            return ast.ListLiteral([f(item) for item in obj])
+        return ast.ListLiteral([guess(item) for item in obj])
+    fields = instance_fields(obj)
+    if fields is not None:
+        return ast.RecordLiteral([(name, guess(getattr(obj, name))) for name in fields])
+    raise ValueError('type of `{!r}` must be given'.format(obj))
+
+
+def instance_fields(obj):
+    """Names of fields of an attrs or dataclass instance, None for other objects"""
+    if attr.has(builtins.type(obj)):
+        return [f.name for f in attr.fields(builtins.type(obj))]
+    if dataclasses is not None and dataclasses.is_dataclass(obj):
+        return [f.name for f in dataclasses.fields(obj)]
+    return None
+
+
+# conversion with a type
+
+_encoders = {}
+
+
+def encoder(typ):
+    """Return a function converting python objects into values of type `typ`."""
+    try:
+        return _encoders[typ]
+    except KeyError:
+        pass
+    except builtins.TypeError:  # unhashable type, don't cache
+        return make_encoder(typ)
+    e = _encoders[typ] = make_encoder(typ)
+    return e
+
+
+def make_encoder(typ):
+    if typ == ast.NaturalBuiltin():
+        return natural
+    if typ == ast.DoubleBuiltin():
+        return double
+    if typ == ast.BoolBuiltin():
+        return boolean
+    if typ == ast.TextBuiltin():
+        return text
+    if isinstance(typ, ast.ListType):
+        return list_encoder(typ.items_type)
+    if isinstance(typ, ast.OptionalType):
+        return optional_encoder(typ)
+    if isinstance(typ, ast.RecordType):
+        return record_encoder(typ)
+    if isinstance(typ, ast.UnionType):
+        return union_encoder(typ)
+    raise NotImplementedError('values of type `{}` cannot be encoded'.format(typ.to_dhall()))
+
+
+def natural(obj):
+    if builtins.type(obj) is not int or obj < 0:
+        raise ast.TypeError('`{}` is not a `Natural`', repr(obj))
+    return natural_literal(obj)
+
+
+def double(obj):
+    if builtins.type(obj) not in (float, int):
+        raise ast.TypeError('`{}` is not a `Double`', repr(obj))
+    return ast.DoubleLiteral(float(obj))
+
+
+def boolean(obj):
+    if builtins.type(obj) is not bool:
+        raise ast.TypeError('`{}` is not a `Bool`', repr(obj))
+    return TRUE if obj else FALSE
+
+
+def text(obj):
+    if not isinstance(obj, str):
+        raise ast.TypeError('`{}` is not a `Text`', repr(obj))
+    return text_literal(obj)
+
+
+_primitive_encoders = {
+    bool: boolean,
+    int: natural,
+    float: double,
+    str: text,
+}
+
+
+def list_encoder(items_type):
+    item_encoder = encoder(items_type)
+
+    def encode_list(obj):
+        if not isinstance(obj, (list, tuple)):
+            raise ast.TypeError('`{}` is not a `List`', repr(obj))
+        if not obj:
+            return ast.ListLiteral([], items_type)
+        return ast.ListLiteral([item_encoder(item) for item in obj])
+    return encode_list
+
+
+def optional_encoder(typ):
+    wrapped_encoder = encoder(typ.wrapped)
+
+    def encode_optional(obj):
+        if obj is None:
+            return ast.TypeAnnotation(ast.OptionalLiteral(), typ)
+        return ast.TypeAnnotation(ast.OptionalLiteral(wrapped_encoder(obj)), typ)
+    return encode_optional
+
+
+def record_encoder(typ):
+    field_encoders = [
+        (name, encoder(field_type))
+        for name, field_type in typ.fields.items()
+    ]
+
+    def encode_record(obj):
+        if isinstance(obj, Mapping):
+            values = [obj[name] for name, _ in field_encoders]
+        elif isinstance(obj, tuple):
+            values = obj
+        elif instance_fields(obj) is not None:
+            values = [getattr(obj, name) for name, _ in field_encoders]
+        else:
+            raise ast.TypeError('`{}` is not a record', repr(obj))
+        if len(values) != len(field_encoders):
+            raise ast.TypeError('`{}` doesn\'t have fields {}', repr(obj), list(typ.fields))
+        return ast.RecordLiteral([
+            (name, e(value))
+            for (name, e), value in zip(field_encoders, values)
+        ])
+    return encode_record
+
+
+def union_encoder(typ):
+    alternative_encoders = {
+        label: (encoder(alternative_type), typ.alternatives.select([
+            other for other in typ.alternatives if other != label
+        ]))
+        for label, alternative_type in typ.alternatives.items()
+    }
+
+    def encode_union(obj):
+        label, value = obj
+        try:
+            e, alternatives = alternative_encoders[label]
+        except KeyError:
+            raise ast.TypeError('`{}` is not an alternative of `{}`', label, typ)
+        return ast.Union(label, e(value), alternatives)
+    return encode_union
@@ -0,0 +1,312 @@
+"""Import resolution.
+
+A `Resolver` walks the import graph, fetching independent imports
+concurrently with asyncio. Every location is fetched at most once per
+resolver, no matter how many times it's imported, and at most
+`max_concurrency` fetches run at the same time. Imported expressions are
+resolved recursively, typechecked and evaluated before they're substituted
+for the imports. Cycles in the import graph are detected, also when they
+span imports that are in flight concurrently.
+
+Relative imports are resolved against the location of the importing
+expression. Remote expressions can import only other remote expressions.
+
+Imports found in a `dhall.snapshot.Snapshot` given to the resolver are
+served from it, without reading anything. Imports protected with a hash are
+served from a `dhall.cache.Cache`, if the resolver has one, and stored in it
+once resolved. Remote imports are fetched
+with a `dhall.remote.HTTPClient`."""
+import asyncio
+import os
+import posixpath
+import re
+from urllib.parse import urljoin
+
+from . import ast
+from .cache import Cache
+from .remote import default_client
+
+
+DEFAULT_MAX_CONCURRENCY = 16
+
+
+class ImportError(Exception):
+    pass
+
+
+# parsing
+
+import_re = re.compile(
+    r'^(?P<location>.*?)'
+    r'(?:\s+(?P<hash>sha256:[0-9a-fA-F]{64}))?'
+    r'(?P<as_text>\s+as\s+Text)?$',
+    re.DOTALL,
+)
+using_re = re.compile(r'\s+using\s+', re.DOTALL)
+
+
+def parse_import(text):
+    """Make an `ImportExpression` out of its source text"""
+    text = text.strip()
+    match = import_re.match(text)
+    location = match.group('location')
+    return ast.ImportExpression(
+        parse_location(location),
+        None if match.group('hash') is None else match.group('hash').lower(),
+        match.group('as_text') is not None,
+    )
+
+
+def parse_location(text):
+    if text == 'missing':
+        return ast.MissingImport()
+    if text.startswith('env:'):
+        name = text[len('env:'):]
+        if name.startswith('"'):
+            name = name[1:-1]
+        return ast.EnvImport(name)
+    if text.startswith(('http://', 'https://')):
+        url, *headers = using_re.split(text, 1)
+        return ast.RemoteImport(url, headers[0] if headers else None)
+    # quoted path components lose their quotes
+    return ast.LocalImport(re.sub(r'/"([^"]*)"', r'/\1', text))
+
+
+def relative_location(importer, location):
+    """Location of an import, given location of the importing expression
+    (None for an expression that doesn't come from anywhere)."""
+    if isinstance(location, ast.LocalImport):
+        path = location.path
+        if isinstance(importer, ast.RemoteImport):
+            if not path.startswith(('./', '../')):
+                raise ImportError('remote import {} cannot import {}'.format(importer, location))
+            return ast.RemoteImport(urljoin(importer.url, path), importer.headers)
+        if path.startswith('~'):
+            return ast.LocalImport(os.path.expanduser(path))
+        if os.path.isabs(path):
+            return ast.LocalImport(posixpath.normpath(path))
+        if isinstance(importer, ast.LocalImport):
+            directory = os.path.dirname(importer.path)
+        else:  # no importer, or an environment variable
+            directory = os.getcwd()
+        return ast.LocalImport(os.path.normpath(os.path.join(directory, path)))
+    if isinstance(location, ast.EnvImport) and isinstance(importer, ast.RemoteImport):
+        raise ImportError('remote import {} cannot import {}'.format(importer, location))
+    return location
+
+
+def find_imports(expression):
+    """All import nodes of an expression"""
+    imports = []
+    pending = [expression]
+    while pending:
+        expression = pending.pop()
+        if isinstance(expression, ast.ImportExpression):
+            imports.append(expression)
+        else:
+            pending.extend(expression.children())
+    return imports
+
+
+def substituted(expression, resolved):
+    """Replace imports with their resolved expressions"""
+    if isinstance(expression, ast.ImportExpression):
+        return resolved[expression]
+    return expression.map(lambda e: substituted(e, resolved))
+
+
+# resolution
+
+def read_file(path):
+    with open(path, 'rt') as f:
+        return f.read()
+
+
+class Resolver:
+    """Resolves imports, remembering everything it fetched. Use one resolver
+    per resolution (or per set of resolutions that should see the same
+    imported files). Unless given another one, resolvers share the default
+    HTTP client, with its connections and response cache."""
+    def __init__(
+        self,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        cache=None,
+        http_client=None,
+        snapshot=None,
+        executor=None,
+    ):
+        """Parsing, typechecking and evaluation of imported expressions run in
+        `executor`, if given, and otherwise right in the event loop."""
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.snapshot = snapshot
+        self.executor = executor
+        self.http_client = default_client() if http_client is None else http_client
+        self._semaphore = None
+        self._texts = {}  # location -> future of text
+        self._expressions = {}  # location -> future of resolved expression
+        self._waiters = {}  # future -> number of calls waiting for it
+        self._waiting = {}  # location -> locations it waits for (with repetitions)
+
+    async def resolve(self, expression, importer=None):
+        """Resolve all imports in an expression coming from `importer`"""
+        imports = list(set(find_imports(expression)))
+        if not imports:
+            return expression
+        values = await asyncio.gather(*[
+            self.resolve_import(importer, i)
+            for i in imports
+        ])
+        return substituted(expression, dict(zip(imports, values)))
+
+    async def resolve_import(self, importer, expression):
+        location = relative_location(importer, expression.location)
+        if self.snapshot is not None and not expression.as_text:
+            value = self.snapshot.lookup(location, expression.hash)
+            if value is not None:
+                return value
+        cached = expression.hash is not None and self.cache is not None
+        if cached:
+            value = await self.in_executor(self.cache.get, expression.hash)
+            if value is not None:
+                # entries hold only the normal form, so it's typechecked
+                # once here, like freshly loaded imports
+                return await self.compute(closed_value, value)
+        if expression.as_text:
+            value = ast.TextLiteral([await self.fetch(location)])
+        else:
+            value = await self.load(importer, location)
+        if expression.hash is not None and value.semantic_hash() != expression.hash:
+            raise ImportError('{} has hash {}, but {} was expected'.format(
+                location, value.semantic_hash(), expression.hash,
+            ))
+        if cached:
+            await self.in_executor(self.cache.put, expression.hash, value)
+        return value
+
+    @staticmethod
+    async def in_executor(f, *args):
+        return await asyncio.get_event_loop().run_in_executor(None, f, *args)
+
+    async def compute(self, f, *args):
+        """Run a CPU-bound function in the resolver's executor"""
+        if self.executor is None:
+            return f(*args)
+        return await asyncio.get_event_loop().run_in_executor(self.executor, f, *args)
+
+    async def load(self, importer, location):
+        """Fetch, parse and resolve an expression, once per location"""
+        if self.reaches(location, importer):
+            raise ImportError('import cycle: {} imports {}'.format(importer, location))
+        waiting = self._waiting.setdefault(importer, [])
+        waiting.append(location)
+        try:
+            return await self.shared(self._expressions, location, self._load)
+        finally:
+            waiting.remove(location)
+
+    async def shared(self, futures, location, start):
+        """Result of `start(location)`, run once for all concurrent callers -
+        its future is kept in `futures`. If the only caller waiting for the
+        future is cancelled, the future is cancelled too and forgotten, so
+        that later calls start it again."""
+        future = futures.get(location)
+        if future is None or future.cancelled():
+            future = futures[location] = asyncio.ensure_future(start(location))
+        self._waiters[future] = self._waiters.get(future, 0) + 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if self._waiters[future] == 1 and not future.done():
+                future.cancel()
+                if futures.get(location) is future:
+                    del futures[location]
+            raise
+        finally:
+            self._waiters[future] -= 1
+            if not self._waiters[future]:
+                del self._waiters[future]
+
+    async def _load(self, location):
+        expression = await self.compute(self.parse, await self.fetch(location))
+        expression = await self.resolve(expression, location)
+        return await self.compute(closed_value, expression)
+
+    def parse(self, text):
+        from .parser import parse
+        return parse(text)
+
+    def reaches(self, source, target):
+        """Is `source` (transitively) waiting for `target`?"""
+        seen = set()
+        pending = [source]
+        while pending:
+            location = pending.pop()
+            if location == target:
+                return True
+            if location not in seen:
+                seen.add(location)
+                pending.extend(self._waiting.get(location, ()))
+        return False
+
+    async def fetch(self, location):
+        """Text at a location, fetched once"""
+        return await self.shared(self._texts, location, self._fetch)
+
+    async def _fetch(self, location):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await self.read(location)
+
+    async def read(self, location):
+        try:
+            if isinstance(location, ast.LocalImport):
+                return await self.in_executor(read_file, location.path)
+            if isinstance(location, ast.RemoteImport):
+                if location.headers is not None:
+                    raise ImportError('cannot import {}: custom headers are not supported'.format(location))
+                return await self.in_executor(self.http_client.get, location.url)
+        except OSError as e:
+            raise ImportError('cannot read {}: {}'.format(location, e))
+        if isinstance(location, ast.EnvImport):
+            try:
+                return os.environ[location.name]
+            except KeyError:
+                raise ImportError('environment variable {} is not set'.format(location.name))
+        raise ImportError('cannot import {}'.format(location))
+
+
+def closed_value(expression):
+    """Typecheck and evaluate an expression, and mark its value closed"""
+    type = expression.type()
+    return expression.evaluated().mark_closed(type)
+
+
+def resolve(
+    expression,
+    filename=None,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    cache=True,
+    snapshot=None,
+):
+    """Resolve imports of an expression coming from a file (or from the
+    current directory, if no filename is given). `cache` is a `Cache`, True
+    for the default one, or False for none. Imports found in `snapshot` are
+    taken from it."""
+    importer = None if filename is None else ast.LocalImport(os.path.abspath(filename))
+    if cache is True:
+        cache = Cache()
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(
+            Resolver(max_concurrency, cache or None, snapshot=snapshot).resolve(expression, importer),
+        )
+    finally:
+        loop.close()
+
+
+def load(filename, max_concurrency=DEFAULT_MAX_CONCURRENCY, cache=True, snapshot=None):
+    """Parse a file and resolve its imports"""
+    from .parser import parse
+    return resolve(parse(read_file(filename)), filename, max_concurrency, cache, snapshot)
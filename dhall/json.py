@@ -0,0 +1,147 @@
+"""Conversion between dhall values and JSON.
+
+`dump` writes a value the way `dhall-to-json` does: records are objects,
+lists are arrays, optionals are either `null` or the wrapped value, and union
+values are their wrapped value. Output is produced incrementally and written
+in large chunks, so neither the whole JSON text nor an intermediate python
+object is ever built. Records and lists are evaluated node by node while
+they are written, so a document doesn't need to be normalized up front.
+
+`load`, `loads` and `load_stream` go the other way, building dhall AST
+directly out of JSON (see `dhall.encoding` for how values are mapped).
+`load_stream` reads a sequence of documents (for example JSON lines)
+incrementally, yielding one value at a time. It streams documents, not
+their contents: each document is decoded by the `json` module into python
+objects, which are then converted, so memory needed for one document is
+like that of `json.load` plus the resulting AST."""
+import codecs
+import math
+from json import JSONDecoder, JSONDecodeError
+from json.encoder import encode_basestring
+
+from . import ast
+from .encoding import encoder, guess
+from .lazy import head_evaluated
+
+
+BUFFER_SIZE = 1 << 16
+
+
+def dump(expression, fp, buffer_size=BUFFER_SIZE):
+    """Write an expression as JSON into a binary file."""
+    buffer = []
+    size = 0
+    for chunk in json_chunks(expression):
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= buffer_size:
+            fp.write(''.join(buffer).encode('utf8'))
+            buffer = []
+            size = 0
+    fp.write(''.join(buffer).encode('utf8'))
+
+
+def dumps(expression):
+    return ''.join(json_chunks(expression))
+
+
+def json_chunks(expression):
+    """Generate pieces of JSON text for an expression."""
+    expression = head_evaluated(expression)
+
+    if isinstance(expression, ast.RecordLiteral):
+        separator = '{'
+        for label, value in expression.fields.items():
+            yield separator + encode_basestring(label) + ':'
+            separator = ','
+            yield from json_chunks(value.pass_context(expression))
+        yield '}' if separator == ',' else '{}'
+
+    elif isinstance(expression, ast.ListLiteral):
+        yield '['
+        first = True
+        for item in expression.items:
+            if not first:
+                yield ','
+            first = False
+            yield from json_chunks(item.pass_context(expression))
+        yield ']'
+
+    elif isinstance(expression, ast.TextLiteral):
+        if not all(isinstance(chunk, str) for chunk in expression.chunks):
+            raise ValueError('text with unresolved interpolation cannot be converted into JSON')
+        yield encode_basestring(''.join(expression.chunks))
+
+    elif isinstance(expression, ast.BooleanLiteral):
+        yield 'true' if expression.value else 'false'
+
+    elif isinstance(expression, ast.NaturalLiteral):
+        yield int.__repr__(expression.value)
+
+    elif isinstance(expression, ast.DoubleLiteral):
+        if math.isnan(expression.value) or math.isinf(expression.value):
+            raise ValueError('{} cannot be represented in JSON'.format(expression.value))
+        yield float.__repr__(expression.value)
+
+    elif isinstance(expression, ast.OptionalLiteral):
+        if expression.wrapped is None:
+            yield 'null'
+        else:
+            yield from json_chunks(expression.wrapped.pass_context(expression))
+
+    elif isinstance(expression, ast.Union):
+        yield from json_chunks(expression.value.pass_context(expression))
+
+    else:
+        raise ValueError('{} cannot be converted into JSON'.format(expression.__class__.__name__))
+
+
+def converter(type):
+    if type is None:
+        return guess
+    return encoder(type.evaluated())
+
+
+def loads(string, type=None):
+    """Convert JSON text into a dhall value, optionally of given type."""
+    return converter(type)(JSONDecoder().decode(string))
+
+
+def load(fp, type=None):
+    """Read a JSON document from a file into a dhall value."""
+    return loads(fp.read(), type)
+
+
+def load_stream(fp, type=None, chunk_size=BUFFER_SIZE):
+    """Read whitespace separated JSON documents from a text or binary file
+    and generate dhall values out of them. Only one document at a time is
+    kept in memory, but it's kept whole (see the module docstring)."""
+    convert = converter(type)
+    decoder = JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf8')()
+    buffer = ''
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if buffer:
+            try:
+                obj, end = decoder.raw_decode(buffer)
+            except JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # a document that ends the buffer may be cut in half (think
+                # of numbers), unless the file ended
+                if end < len(buffer) or eof:
+                    buffer = buffer[end:]
+                    yield convert(obj)
+                    continue
+        elif eof:
+            return
+        # buffer grows geometrically, so big documents are decoded in
+        # amortized linear time
+        chunk = fp.read(max(chunk_size, len(buffer)))
+        if isinstance(chunk, bytes):
+            chunk = text_decoder.decode(chunk, final=not chunk)
+        eof = not chunk
+        buffer += chunk
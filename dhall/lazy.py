@@ -0,0 +1,252 @@
+"""Demand-driven evaluation of dhall expressions.
+
+`load` typechecks and evaluates only the part of a document at a given path
+of record labels. Selection is pushed down through let bindings,
+projections and record operators, so other fields are never looked at.
+
+`load_lazy` converts a document into python objects lazily. Records and
+lists are represented with read-only Mapping and Sequence proxies over the
+AST. A field or an element is evaluated and converted only when it's
+accessed, and the result is remembered. Everything else is converted with
+`Expression.to_python()` when reached, after checking it against type
+annotations on the way to it."""
+from collections.abc import Mapping, Sequence
+
+from . import ast
+from . import imports
+
+
+def head_evaluated(expression, annotations=None, labels=()):
+    """Evaluate the expression only as far as needed to know its outermost
+    node. Fields of a record literal and items of a list literal are left
+    unevaluated (but they keep the context they need). Record operators and
+    projections of record literals are resolved field-wise, without
+    evaluating the fields.
+
+    Type annotations skipped on the way are appended to `annotations`, if
+    it's given, as pairs of the annotation and the labels selecting the
+    returned node out of the annotated expression (`labels` are prepended
+    to them) - see `check_annotation`."""
+    while True:
+        if isinstance(expression, (ast.RecordLiteral, ast.ListLiteral)):
+            return expression
+
+        elif isinstance(expression, ast.LetIn):
+            context = ast.CTX_EMPTY
+            for name, value, typ in expression.parameters:
+                value = value.pass_context(expression).bind_values(context)
+                if typ is not None:
+                    # reported as an annotation (below) when the variable is reached
+                    value = ast.TypeAnnotation(value, typ.pass_context(expression).bind_values(context))
+                context = context.shadow_single(name, value)
+            expression = expression.expression.pass_context(expression).bind_values(context)
+
+        elif isinstance(expression, ast.TypeAnnotation):
+            if annotations is not None:
+                annotations.append((expression.expression_type.pass_context(expression), labels))
+            expression = expression.expression.pass_context(expression)
+
+        elif isinstance(expression, ast.Variable) and expression.context.has(expression.name, expression.scope):
+            value = expression.context.get(expression.name, expression.scope)
+            if value is None:
+                return expression.evaluated()
+            expression = value
+
+        elif isinstance(expression, ast.SelectExpression):
+            record = head_evaluated(
+                expression.expression.pass_context(expression),
+                annotations,
+                (expression.label,) + labels,
+            )
+            if not isinstance(record, ast.RecordLiteral):
+                return ast.SelectExpression(record.evaluated(), expression.label).evaluated()
+            expression = record.fields[expression.label].pass_context(record)
+
+        elif isinstance(expression, ast.ProjectionExpression):
+            record = head_evaluated(expression.expression.pass_context(expression), annotations, labels)
+            if not isinstance(record, ast.RecordLiteral):
+                return ast.ProjectionExpression(record.evaluated(), expression.labels).evaluated()
+            return ast.RecordLiteral(closed_fields(record, expression.labels))
+
+        elif isinstance(expression, (ast.PreferExpression, ast.CombineExpression)):
+            operand_annotations = None if annotations is None else []
+            a = head_evaluated(expression.arg1.pass_context(expression), operand_annotations)
+            b = head_evaluated(expression.arg2.pass_context(expression), operand_annotations)
+            if operand_annotations:
+                # fields may come from either operand - check it all
+                annotations.append((expression, None))
+            if not isinstance(a, ast.RecordLiteral) or not isinstance(b, ast.RecordLiteral):
+                return expression.evaluated()
+            if isinstance(expression, ast.PreferExpression):
+                fields = closed_fields(a).update(closed_fields(b))
+            else:
+                fields = closed_fields(a).merge(closed_fields(b), lambda _, x, y: ast.CombineExpression(x, y))
+            return ast.RecordLiteral(fields)
+
+        elif isinstance(expression, ast.Conditional):
+            condition = expression.condition.pass_context(expression).evaluated()
+            if not isinstance(condition, ast.BooleanLiteral):
+                return expression.evaluated()
+            branch = expression.if_true if condition.value else expression.if_false
+            expression = branch.pass_context(expression)
+
+        else:
+            return expression.evaluated()
+
+
+def closed_fields(record, labels=None):
+    """Fields of a record literal, each carrying the record's context"""
+    fields = record.fields
+    if labels is not None:
+        fields = fields.select(labels)
+    return fields.map(lambda value: value.pass_context(record))
+
+
+def selected(expression, path, annotations=None):
+    """Part of the expression at `path` of record labels, not evaluated yet.
+    Type annotations met on the way are appended to `annotations` (see
+    `head_evaluated`)."""
+    for i, label in enumerate(path):
+        record = head_evaluated(expression, annotations, tuple(path[i:]))
+        if not isinstance(record, ast.RecordLiteral):
+            expression = ast.SelectExpression(record, label)
+        elif label not in record.fields:
+            raise ast.TypeError('record has no field `{}`', label)
+        else:
+            expression = record.fields[label].pass_context(record)
+    return expression
+
+
+def load(filename, select=()):
+    """Parse a file and resolve its imports, then typecheck and evaluate the
+    expression in it - or only the part of it at `select` path of record
+    labels."""
+    return evaluated_selection(imports.load(filename), select)
+
+
+def evaluated_selection(expression, path):
+    """Typecheck and evaluate the part of an expression at `path` of record
+    labels, checking it against type annotations met on the way"""
+    annotations = []
+    expression = selected(expression, path, annotations)
+    typ = expression.type()
+    for annotation, labels in annotations:
+        check_annotation(annotation, labels, typ)
+    return expression.evaluated()
+
+
+def check_annotation(annotation, labels, typ):
+    """Check that a value of type `typ`, selected with `labels` (record
+    labels, or list indices) out of an expression annotated with
+    `annotation`, agrees with the annotation. If `labels` is None,
+    `annotation` is an expression to typecheck as a whole instead."""
+    annotation.type()
+    if labels is None:
+        return
+    expected = annotation
+    for label in labels:
+        expected = expected.evaluated()
+        if isinstance(label, int):
+            if not isinstance(expected, ast.ListType):
+                raise ast.TypeError('annotation `{}` is not a list type', annotation)
+            expected = expected.items_type
+        elif not isinstance(expected, ast.RecordType) or label not in expected.fields:
+            raise ast.TypeError('annotation `{}` has no field `{}`', annotation, label)
+        else:
+            expected = expected.fields[label]
+    if not ast.exact(expected, typ):
+        raise ast.TypeError(
+            'annotation\n\t`{}` doesn\'t match expression type\n\t`{}`',
+            expected,
+            typ,
+        )
+
+
+def lazy_python(expression, annotations=()):
+    """Python representation of an expression, where records and lists are
+    converted lazily. Type annotations on the way to a converted value
+    (`annotations` met before the expression, as `head_evaluated` reports
+    them, and ones met in it) are checked against the value's type."""
+    found = []
+    expression = head_evaluated(expression, found)
+    annotations = list(annotations) + found
+    if isinstance(expression, ast.RecordLiteral):
+        return LazyRecord(expression, annotations)
+    if isinstance(expression, ast.ListLiteral):
+        return LazyList(expression, annotations)
+    if annotations:
+        typ = expression.type()
+        for annotation, labels in annotations:
+            check_annotation(annotation, labels, typ)
+    return expression.to_python()
+
+
+def inner_annotations(annotations, label):
+    """Annotations of an expression, as seen from its field or element"""
+    return [
+        (annotation, labels if labels is None else labels + (label,))
+        for annotation, labels in annotations
+    ]
+
+
+def load_lazy(filename):
+    """Parse a file, resolve its imports and return its lazy python
+    representation. Nothing else is typechecked or evaluated up front."""
+    return lazy_python(imports.load(filename))
+
+
+class LazyRecord(Mapping):
+    def __init__(self, record, annotations=()):
+        self._record = record
+        self._annotations = annotations
+        self._values = {}
+
+    def __getitem__(self, label):
+        try:
+            return self._values[label]
+        except KeyError:
+            pass
+        value = self._values[label] = lazy_python(
+            self._record.fields[label].pass_context(self._record),
+            inner_annotations(self._annotations, label),
+        )
+        return value
+
+    def __iter__(self):
+        return iter(self._record.fields)
+
+    def __len__(self):
+        return len(self._record.fields)
+
+    def __repr__(self):
+        return 'LazyRecord({})'.format(list(self._record.fields))
+
+
+class LazyList(Sequence):
+    def __init__(self, items, annotations=()):
+        self._list = items
+        self._annotations = annotations
+        self._values = {}
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('list index out of range')
+        try:
+            return self._values[index]
+        except KeyError:
+            pass
+        value = self._values[index] = lazy_python(
+            self._list.items[index].pass_context(self._list),
+            inner_annotations(self._annotations, index),
+        )
+        return value
+
+    def __len__(self):
+        return len(self._list.items)
+
+    def __repr__(self):
+        return 'LazyList(<{} items>)'.format(len(self))
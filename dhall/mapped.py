@@ -0,0 +1,231 @@
+"""Memory-mapped binary files of evaluated expressions.
+
+A mapped file holds the standard CBOR encoding of an evaluated expression,
+followed by an offset index of its big record and list literals. The file is
+opened with `mmap` and nodes are decoded only as they're reached: records and
+lists are represented with read-only Mapping and Sequence proxies (as in
+`dhall.load_lazy`), fields are found by binary search over their sorted
+labels and list items are reached in constant time. Other values are decoded
+and converted to python when accessed. Pages of the file are shared between
+all processes that map it.
+
+Layout (integers are little-endian uint64):
+
+    magic | index offset | index length | CBOR data | tables | index
+
+An index entry is a triple of (container offset, table offset, count). A
+table lists offsets of record labels or list items of one container."""
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+import mmap
+import struct
+
+from . import ast
+from .binary import (
+    ARRAY, LIST, MAP, NULL, RECORD_LITERAL, UNSIGNED,
+    Decoder, encode, head, string, unsigned,
+)
+from .lazy import lazy_python
+
+
+MAGIC = b'DHALLMAP'
+HEADER = struct.Struct('<8sQQ')
+OFFSET = struct.Struct('<Q')
+INDEX_ENTRY = struct.Struct('<QQQ')
+
+# containers with fewer elements are scanned instead of indexed
+INDEX_THRESHOLD = 16
+
+
+def dump_mapped(expression, fp):
+    """Typecheck and evaluate an expression, and write it into a binary file
+    suitable for `load_mmap`."""
+    expression.type()
+    out = bytearray(HEADER.size)
+    index = []
+    encode_indexed(expression.evaluated(), out, index)
+
+    entries = []
+    for container, offsets in sorted(index):
+        entries.append((container, len(out), len(offsets)))
+        for offset in offsets:
+            out += OFFSET.pack(offset)
+    index_offset = len(out)
+    for entry in entries:
+        out += INDEX_ENTRY.pack(*entry)
+    out[:HEADER.size] = HEADER.pack(MAGIC, index_offset, len(entries))
+    fp.write(out)
+
+
+def encode_indexed(expression, out, index):
+    """Encode an expression like `binary.encode` does, remembering offsets of
+    labels and items of big record and list literals in `index`."""
+    start = len(out)
+    if isinstance(expression, ast.RecordLiteral):
+        head(ARRAY, 2, out)
+        unsigned(RECORD_LITERAL, out)
+        head(MAP, len(expression.fields), out)
+        offsets = []
+        for label, value in expression.fields.items():
+            offsets.append(len(out))
+            string(label, out)
+            encode_indexed(value, out, index)
+    elif isinstance(expression, ast.ListLiteral) and expression.items:
+        head(ARRAY, 2 + len(expression.items), out)
+        unsigned(LIST, out)
+        out += NULL
+        offsets = []
+        for item in expression.items:
+            offsets.append(len(out))
+            encode_indexed(item, out, index)
+    else:
+        encode(expression, out)
+        return
+    if len(offsets) >= INDEX_THRESHOLD:
+        index.append((start, offsets))
+
+
+def load_mmap(filename):
+    """Map a file written by `dump_mapped` and return its lazy python
+    representation."""
+    with open(filename, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return MappedFile(data).root()
+
+
+class MappedFile:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        magic, self.index_offset, self.index_length = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError('not a mapped dhall file')
+
+    def root(self):
+        return self.value(HEADER.size)
+
+    def index_entry(self, offset):
+        """Table offset and count for a container, or None if not indexed"""
+        low, high = 0, self.index_length
+        while low < high:
+            middle = (low + high) // 2
+            container, table, count = INDEX_ENTRY.unpack_from(
+                self.data, self.index_offset + middle * INDEX_ENTRY.size,
+            )
+            if container == offset:
+                return table, count
+            if container < offset:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def offsets(self, offset, first, count, stride=1):
+        """Offsets of elements of a container, starting at `first`. Elements
+        are `stride` items long."""
+        entry = self.index_entry(offset)
+        if entry is not None:
+            return OffsetTable(self.data, *entry)
+        decoder = Decoder(self.data, first)
+        offsets = []
+        for _ in range(count):
+            offsets.append(decoder.position)
+            for _ in range(stride):
+                decoder.skip()
+        return offsets
+
+    def value(self, offset):
+        decoder = Decoder(self.data, offset)
+        major, length = decoder.head()
+        if major == ARRAY and length >= 2:
+            major, label = decoder.head()
+            if major == UNSIGNED and label == RECORD_LITERAL:
+                major, count = decoder.head()
+                return MappedRecord(self, self.offsets(offset, decoder.position, count, 2))
+            if major == UNSIGNED and label == LIST and decoder.is_null():
+                return MappedList(self, self.offsets(offset, decoder.position, length - 2))
+        return lazy_python(Decoder(self.data, offset).expression())
+
+
+class OffsetTable(Sequence):
+    def __init__(self, data, offset, count):
+        self._data = data
+        self._offset = offset
+        self._count = count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self._count:
+            raise IndexError('offset table index out of range')
+        return OFFSET.unpack_from(self._data, self._offset + index * OFFSET.size)[0]
+
+    def __len__(self):
+        return self._count
+
+
+class Labels(Sequence):
+    """Sorted labels of a mapped record, decoded on access"""
+    def __init__(self, file, offsets):
+        self._file = file
+        self._offsets = offsets
+
+    def __getitem__(self, index):
+        return Decoder(self._file.data, self._offsets[index]).string()
+
+    def __len__(self):
+        return len(self._offsets)
+
+
+class MappedRecord(Mapping):
+    def __init__(self, file, offsets):
+        self._file = file
+        self._offsets = offsets
+        self._labels = Labels(file, offsets)
+        self._values = {}
+
+    def __getitem__(self, label):
+        try:
+            return self._values[label]
+        except KeyError:
+            pass
+        index = bisect_left(self._labels, label)
+        if index == len(self._labels) or self._labels[index] != label:
+            raise KeyError(label)
+        decoder = Decoder(self._file.data, self._offsets[index])
+        decoder.skip()
+        value = self._values[label] = self._file.value(decoder.position)
+        return value
+
+    def __iter__(self):
+        return iter(self._labels)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __repr__(self):
+        return 'MappedRecord({})'.format(list(self))
+
+
+class MappedList(Sequence):
+    def __init__(self, file, offsets):
+        self._file = file
+        self._offsets = offsets
+        self._values = {}
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('list index out of range')
+        try:
+            return self._values[index]
+        except KeyError:
+            pass
+        value = self._values[index] = self._file.value(self._offsets[index])
+        return value
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __repr__(self):
+        return 'MappedList(<{} items>)'.format(len(self))
@@ -0,0 +1,321 @@
+"""Parallel evaluation and type checking of big expressions.
+
+`evaluated(expression, executor)` evaluates an expression just like
+`Expression.evaluated()` does, but if the expression is - under leading let
+bindings and type annotations - a record literal with many fields or a list
+literal with many items, the fields or items are evaluated in worker
+processes.
+
+`type_checked(expression, executor)` infers the type of an expression like
+`Expression.type()` does, checking many leading let bindings, and then many
+fields of a record literal under them, in worker processes. A binding
+depends on bindings before it only through their values (which are known
+without checking them), so all bindings are checked independently. Fields
+are checked once all bindings are, with types of the bindings sent along, so
+that they're not inferred again. When something doesn't typecheck, the
+expression is checked again in the calling process, which raises exactly the
+error sequential checking would - the first one in source order, with the
+source locations of the expressions involved.
+
+Subexpressions travel to workers and back in binary form. Fields and items
+are sent in chunks, together with the let bindings they're under, encoded
+once for all chunks. A worker decodes the bindings once for all chunks it
+gets, so evaluation of a binding is shared by all fields of a chunk and
+decoding of bindings by all chunks of a worker.
+
+Expressions that can't be encoded (with unresolved imports, or carrying
+contexts of bound values), ones with values that can't be encoded, and
+small literals are evaluated in the calling process."""
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import os
+
+import attr
+
+from . import ast
+from . import binary
+
+
+DEFAULT_THRESHOLD = 64  # fields or items
+CHUNKS_PER_WORKER = 4
+
+# raised by encoding expressions with imports, or values of unknown types
+UNENCODABLE = (NotImplementedError, ValueError)
+
+
+def evaluated(expression, executor=None, threshold=DEFAULT_THRESHOLD):
+    """Evaluate an expression, using worker processes for fields or items
+    of its top level record or list literal. `executor` is a
+    `concurrent.futures.Executor` running the workers - if not given, a
+    process pool is started for the call."""
+    split = None
+    if 'evaluated' not in expression.memo:
+        split = split_literal(expression, threshold)
+    if split is None:
+        return expression.evaluated()
+    bindings, literal, elements = split
+    try:
+        environment = encode_bindings(bindings)
+        items = [binary.dumps(element) for element in elements]
+    except UNENCODABLE:
+        return expression.evaluated()
+    if executor is None:
+        with ProcessPoolExecutor() as executor:
+            return evaluated(expression, executor, threshold)
+
+    values = []
+    for future in submit_chunks(executor, evaluate_chunk, environment, items):
+        for data in future.result():
+            if data is None:  # a value that can't be sent back
+                return expression.evaluated()
+            value = binary.loads(data)
+            value.memo['evaluated'] = value
+            values.append(value)
+
+    if isinstance(literal, ast.RecordLiteral):
+        result = attr.evolve(literal, fields=dict(zip(literal.fields, values)))
+    else:
+        element_type = literal.element_type
+        if element_type is not None:
+            element_type = element_type.bind_values(bound(bindings)).evaluated()
+        result = attr.evolve(literal, items=values, element_type=element_type)
+    result.memo['evaluated'] = result
+    expression.memo['evaluated'] = result
+    return result
+
+
+def split_literal(expression, threshold):
+    """Leading let bindings of an expression, the record or list literal
+    under them and its fields or items - or None if the expression isn't
+    worth evaluating in parallel"""
+    if not ast.context_free(expression):
+        return None
+    bindings = []
+    while True:
+        if isinstance(expression, ast.LetIn):
+            bindings.extend(expression.parameters)
+            expression = expression.expression
+        elif isinstance(expression, ast.TypeAnnotation):
+            expression = expression.expression
+        else:
+            break
+    if isinstance(expression, ast.RecordLiteral):
+        elements = list(expression.fields.values())
+    elif isinstance(expression, ast.ListLiteral):
+        elements = expression.items
+    else:
+        return None
+    if len(elements) < max(threshold, 1):
+        return None
+    return bindings, expression, elements
+
+
+def bound(bindings):
+    """Context of values bound by let bindings"""
+    context = ast.CTX_EMPTY
+    for name, value, typ in bindings:
+        context = context.shadow_single(name, value.bind_values(context))
+    return context
+
+
+def encode_bindings(bindings):
+    """Encode let bindings like `binary` encodes them inside a let
+    expression"""
+    out = bytearray()
+    binary.head(binary.ARRAY, 3 * len(bindings), out)
+    for name, value, typ in bindings:
+        binary.string(name, out)
+        if typ is None:
+            out += binary.NULL
+        else:
+            binary.encode(typ, out)
+        binary.encode(value, out)
+    return bytes(out)
+
+
+def decode_bindings(data):
+    decoder = binary.Decoder(data)
+    major, length = decoder.head()
+    bindings = []
+    for _ in range(length // 3):
+        name = decoder.string()
+        typ = decoder.optional_expression()
+        bindings.append((name, decoder.expression(), typ))
+    return bindings
+
+
+def submit_chunks(executor, f, environment, items):
+    """Submit a function call per chunk of items, with encoded environment
+    and its key"""
+    key = hashlib.sha256(environment).hexdigest()
+    chunk_size = -(-len(items) // ((os.cpu_count() or 1) * CHUNKS_PER_WORKER))
+    return [
+        executor.submit(f, key, environment, items[i:i + chunk_size])
+        for i in range(0, len(items), chunk_size)
+    ]
+
+
+# key and decoded form of the environment last used in a worker process
+_worker_environment = (None, None)
+
+
+def worker_environment(key, environment, decode):
+    """Environment decoded with `decode`, reused by subsequent chunks"""
+    global _worker_environment
+    cached = _worker_environment  # read once, other threads may replace it
+    if cached[0] != (key, decode):
+        cached = _worker_environment = ((key, decode), decode(environment))
+    return cached[1]
+
+
+def decode_bound(environment):
+    return bound(decode_bindings(environment))
+
+
+def evaluate_chunk(key, environment, items):
+    """Evaluate encoded expressions under encoded let bindings (in a worker
+    process). Return encoded values, or None for values that can't be
+    encoded."""
+    context = worker_environment(key, environment, decode_bound)
+    results = []
+    for item in items:
+        value = binary.loads(item).bind_values(context).evaluated()
+        try:
+            results.append(binary.dumps(value))
+        except UNENCODABLE:
+            results.append(None)
+    return results
+
+
+# type checking
+
+def type_checked(expression, executor=None, threshold=DEFAULT_THRESHOLD):
+    """Typecheck an expression and return its type, checking its leading let
+    bindings and fields of its record literal in worker processes. `executor`
+    is a `concurrent.futures.Executor` running the workers - if not given, a
+    process pool is started for the call."""
+    if 'type' in expression.memo or not ast.context_free(expression):
+        return expression.type()
+    bindings = []
+    body = expression
+    while isinstance(body, ast.LetIn):
+        bindings.extend(body.parameters)
+        body = body.expression
+    fields = body.fields if isinstance(body, ast.RecordLiteral) else {}
+    parallel_fields = len(fields) >= max(threshold, 1) and not fields.duplicates
+    if len(bindings) < max(threshold, 1) and not parallel_fields:
+        return expression.type()
+    try:
+        environment = encode_bindings(bindings)
+        if parallel_fields:
+            items = [binary.dumps(value) for value in fields.values()]
+    except UNENCODABLE:
+        return expression.type()
+    if executor is None:
+        with ProcessPoolExecutor() as executor:
+            return type_checked(expression, executor, threshold)
+
+    types = []
+    if bindings:
+        types = checked(submit_chunks(executor, check_bindings_chunk, environment, list(range(len(bindings)))))
+        if types is None:
+            return expression.type()
+
+    if parallel_fields:
+        environment = encode_bindings([
+            (name, value, typ)
+            for (name, value, _), typ in zip(bindings, types)
+        ])
+        field_types = checked(submit_chunks(executor, check_fields_chunk, environment, items))
+        if field_types is None:
+            return expression.type()
+        typ = ast.RecordType(dict(zip(fields, field_types)))
+    else:
+        values, value_types = scoped_bindings(bindings, types)[-1][0]
+        typ = body.bind_values(values).bind_types(value_types).type()
+    expression.memo['type'] = typ
+    return typ
+
+
+def checked(futures):
+    """Decoded types returned by workers, or None if anything failed to
+    typecheck"""
+    types = []
+    for future in futures:
+        for data in future.result():
+            if data is None:
+                return None
+            typ = binary.loads(data)
+            typ.memo['evaluated'] = typ
+            typ.memo['normalized'] = typ
+            types.append(typ)
+    return types
+
+
+def scoped_bindings(bindings, types=None):
+    """Values and annotations of let bindings with the contexts they're
+    typechecked in, as in `LetIn._type`, followed by the contexts of values
+    and types of all the bindings. Values are given their known `types`."""
+    values = ast.CTX_EMPTY
+    value_types = ast.CTX_EMPTY
+    scoped = []
+    for i, (name, value, typ) in enumerate(bindings):
+        value = value.bind_values(values).bind_types(value_types)
+        if types is not None and types[i] is not None:
+            value.memo['type'] = types[i]
+        if typ is not None:
+            typ = typ.bind_values(values).bind_types(value_types)
+        scoped.append((value, typ))
+        values = values.shadow_single(name, value)
+        value_types = value_types.shadow_single(name, None)
+    scoped.append(((values, value_types), None))
+    return scoped
+
+
+def decode_scoped(environment):
+    return scoped_bindings(decode_bindings(environment))
+
+
+def check_bindings_chunk(key, environment, indices):
+    """Typecheck let bindings at given indices (in a worker process). Return
+    their encoded normal types, or None for bindings that don't typecheck."""
+    scoped = worker_environment(key, environment, decode_scoped)
+    results = []
+    for i in indices:
+        value, typ = scoped[i]
+        try:
+            value_type = value.type()
+            if typ is not None:
+                typ.type()
+        except ast.TypeError:
+            results.append(None)
+            continue
+        if typ is not None and not ast.exact(typ, value_type):
+            results.append(None)
+        else:
+            results.append(binary.dumps(value_type.evaluated().normalized()))
+    return results
+
+
+def decode_typed_bindings(environment):
+    """Contexts of values and types of encoded let bindings, whose
+    annotations are their (already checked) types"""
+    bindings = decode_bindings(environment)
+    types = [typ for _, _, typ in bindings]
+    return scoped_bindings(bindings, types)[-1][0]
+
+
+def check_fields_chunk(key, environment, items):
+    """Typecheck encoded record fields under encoded let bindings (in a worker
+    process). Return their encoded normal types, or None for fields that
+    don't typecheck."""
+    values, types = worker_environment(key, environment, decode_typed_bindings)
+    results = []
+    for item in items:
+        try:
+            typ = binary.loads(item).bind_values(values).bind_types(types).type()
+        except ast.TypeError:
+            results.append(None)
+            continue
+        results.append(binary.dumps(typ.evaluated().normalized()))
+    return results
@@ -1,8 +1,11 @@
 import re
+import threading
 
+import attr
 import parglare
 
 from . import ast
+from . import imports
 from .tools import timeit
 from .parglare_adapter import to_parglare_grammar
 
@@ -121,9 +124,9 @@ for name, wrapper in {
     # 'text-append-expression': None,
     'list-append-expression': ast.ListAppendExpression,
     'and-expression': ast.And,
-    # 'combine-expression': None,
-    # 'prefer-expression': None,
-    # 'combine-types-expression': None,
+    'combine-expression': ast.CombineExpression,
+    'prefer-expression': ast.PreferExpression,
+    'combine-types-expression': ast.CombineTypesExpression,
     'times-expression': ast.Times,
     # 'equal-expression': None,
     # 'not-equal-expression': None,
@@ -143,7 +146,7 @@ actions['constructors-or-some-expression'] = [
 ]
 
 actions['import-expression'] = [
-    ast.ImportExpression,
+    lambda source: imports.parse_import(concat_all(source)),
     identity,
 ]
 
@@ -225,11 +228,19 @@ actions['builtin-or-identifier'] = [
 
 
 def _actions_wrapper(f):
-    def wrapped(name, c):
+    def wrapped(context, c):
         try:
-            return f(*c)
+            node = f(*c)
         except TypeError as e:
-            raise Exception('problem creating AST node {}'.format(name), e)
+            raise Exception('problem creating AST node {}'.format(context), e)
+        if isinstance(node, ast.Expression) and node.span is None:
+            # remember where the node comes from, for error reporting
+            node = attr.evolve(node, span=ast.Span(
+                context.input_str,
+                context.start_position,
+                context.end_position,
+            ))
+        return node
     return wrapped
 
 
@@ -276,21 +287,47 @@ with timeit('making parser'):
         },
     )
     assert _start == start_symbol
-    parser = parglare.GLRParser(
+    _table = parglare.tables.persist.table_from_serializable(parse_table, _grammar)
+
+
+def make_parser():
+    """A new parser. Parsers share the grammar and parse table, which are
+    never modified, but keep the state of the parse in progress, so a parser
+    can't be used by two threads at once."""
+    return parglare.GLRParser(
         _grammar,
         ws='',
-        table=parglare.tables.persist.table_from_serializable(parse_table, _grammar),
+        table=_table,
         actions=_actions,
     )
 
 
+# the parser of the importing thread, kept for code using it directly
+parser = make_parser()
+
+_local = threading.local()
+_local.parser = parser
+
+
+def thread_parser():
+    """Parser of the calling thread, made on first use"""
+    try:
+        return _local.parser
+    except AttributeError:
+        pass
+    p = _local.parser = make_parser()
+    return p
+
+
 class SyntaxError(Exception):
     pass
 
 
 def parse(string):
+    """Parse an expression. Safe to call from many threads at once - each
+    thread uses a parser of its own."""
     try:
-        trees = parser.parse(string)
+        trees = thread_parser().parse(string)
     except parglare.ParseError as e:
         raise SyntaxError(e)
     # GLR parser can return multiple trees when there is ambiguity
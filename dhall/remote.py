@@ -0,0 +1,196 @@
+"""HTTP client for remote imports.
+
+`HTTPClient` keeps idle keep-alive connections per host and reuses them for
+subsequent requests, so resolving many imports from one host doesn't open a
+connection per import. It's thread-safe: the import resolver calls it from
+executor threads, each request using a connection of its own.
+
+Response bodies are kept in a bounded (least recently used) in-memory cache.
+A cached body is served without any request while it's fresh according to
+`Cache-Control: max-age`, and otherwise revalidated with `If-None-Match` /
+`If-Modified-Since` - an unchanged import then costs a single `304`
+response. A client lives across resolutions, so long-running processes that
+reload their configuration benefit from it; `default_client()` is the one
+shared by resolvers that aren't given another one."""
+from collections import OrderedDict
+import http.client
+import re
+import threading
+import time
+from urllib.parse import urljoin, urlsplit
+
+import attr
+
+
+DEFAULT_CACHE_SIZE = 256  # responses
+DEFAULT_MAX_IDLE_CONNECTIONS = 8  # per host
+DEFAULT_TIMEOUT = 30
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+max_age_re = re.compile(r'(?:^|,)\s*max-age\s*=\s*(\d+)')
+
+
+class HTTPError(OSError):
+    pass
+
+
+@attr.s(frozen=True, auto_attribs=True)
+class CachedResponse:
+    body: str
+    etag: str = None
+    last_modified: str = None
+    fresh_until: float = 0
+
+
+class HTTPClient:
+    def __init__(
+        self,
+        cache_size=DEFAULT_CACHE_SIZE,
+        max_idle_connections=DEFAULT_MAX_IDLE_CONNECTIONS,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        self.cache_size = cache_size
+        self.max_idle_connections = max_idle_connections
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._idle = {}  # (scheme, host, port) -> idle connections
+        self._responses = OrderedDict()  # url -> CachedResponse
+
+    def get(self, url):
+        """Body of a resource, as text"""
+        for _ in range(MAX_REDIRECTS + 1):
+            cached = self._cached(url)
+            if cached is not None and cached.fresh_until > time.monotonic():
+                return cached.body
+            headers = {}
+            if cached is not None and cached.etag is not None:
+                headers['If-None-Match'] = cached.etag
+            if cached is not None and cached.last_modified is not None:
+                headers['If-Modified-Since'] = cached.last_modified
+            response, body = self.request(url, headers)
+
+            if response.status == 304 and cached is not None:
+                self._store(url, attr.evolve(cached, fresh_until=fresh_until(response)))
+                return cached.body
+            if response.status in REDIRECT_STATUSES and response.getheader('Location'):
+                url = urljoin(url, response.getheader('Location'))
+                continue
+            if response.status != 200:
+                raise HTTPError('{} responded with {} {}'.format(url, response.status, response.reason))
+
+            text = body.decode('utf8')
+            if 'no-store' not in (response.getheader('Cache-Control') or ''):
+                self._store(url, CachedResponse(
+                    text,
+                    response.getheader('ETag'),
+                    response.getheader('Last-Modified'),
+                    fresh_until(response),
+                ))
+            return text
+        raise HTTPError('too many redirects from {}'.format(url))
+
+    def request(self, url, headers):
+        """Make a GET request over a pooled connection. Return the response
+        and its body."""
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        connection = self._acquire(key)
+        reused = connection is not None
+        while True:
+            if connection is None:
+                connection = self._connect(key)
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                if reused:
+                    # the server might have closed an idle connection, retry
+                    # once with a new one
+                    connection = None
+                    reused = False
+                    continue
+                if isinstance(e, OSError):
+                    raise
+                raise HTTPError('request to {} failed: {}'.format(url, e))
+            break
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(key, connection)
+        return response, body
+
+    def _connect(self, key):
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        if scheme == 'http':
+            return http.client.HTTPConnection(host, port, timeout=self.timeout)
+        raise HTTPError('unsupported scheme {}'.format(scheme))
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        return None
+
+    def _release(self, key, connection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_connections:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def _cached(self, url):
+        with self._lock:
+            cached = self._responses.get(url)
+            if cached is not None:
+                self._responses.move_to_end(url)
+            return cached
+
+    def _store(self, url, response):
+        with self._lock:
+            self._responses[url] = response
+            self._responses.move_to_end(url)
+            while len(self._responses) > self.cache_size:
+                self._responses.popitem(last=False)
+
+    def close(self):
+        """Close idle connections"""
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+def fresh_until(response):
+    """Until when (on monotonic clock) a response may be used without
+    revalidation"""
+    cache_control = response.getheader('Cache-Control') or ''
+    if 'no-cache' in cache_control:
+        return 0
+    match = max_age_re.search(cache_control)
+    if match is None:
+        return 0
+    return time.monotonic() + int(match.group(1))
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def default_client():
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HTTPClient()
+        return _default_client
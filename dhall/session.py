@@ -0,0 +1,279 @@
+"""Sessions, sharing work between many documents.
+
+A `Session` is meant for rendering many documents that have a lot in
+common - imports of the same libraries, or the same leading let bindings.
+It keeps, across documents:
+
+ * parsed expressions, by their source text,
+ * resolved, typechecked and evaluated imports, by their location - an
+   import is served while none of the files, URLs and environment
+   variables it was loaded from (transitively) changed: local files are
+   compared by modification time and size, other sources by their text.
+   Remote ones are fetched for every document using them, which costs
+   little thanks to revalidation done by the HTTP client (see
+   `dhall.remote`),
+ * typechecked and evaluated leading let bindings of documents, by the
+   bindings (and all bindings before them).
+
+Cached values are closed (see `Expression.mark_closed`), so neither their
+types nor their normal forms are computed again when they're used by
+another document. Both caches are least recently used caches with a size
+limit in bytes (of source text, or of the binary encoding of values), and
+count their hits, misses and evictions - see `Session.stats()`.
+
+Hashed imports are served from and stored in a `dhall.cache.Cache`, and
+imports found in a `dhall.snapshot.Snapshot` are taken from it, if the
+session has them."""
+from collections import OrderedDict
+import asyncio
+import hashlib
+import os
+import threading
+
+import attr
+
+from . import ast
+from . import binary
+from . import imports
+from . import parallel
+from .cache import Cache
+
+
+DEFAULT_PARSE_CACHE_SIZE = 64 << 20  # bytes of source text
+DEFAULT_VALUE_CACHE_SIZE = 256 << 20  # bytes of binary encoding
+
+
+@attr.s(auto_attribs=True)
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    size: int = 0
+
+
+class LRUCache:
+    """Thread-safe mapping with a limit on total size of its values. Sizes
+    are given when values are stored."""
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size)
+
+    def get(self, key):
+        """Value stored under a key, or None"""
+        with self._lock:
+            try:
+                value, _ = self._entries[key]
+            except KeyError:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def put(self, key, value, size):
+        if size > self.max_size:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.stats.size -= previous[1]
+            self._entries[key] = (value, size)
+            self.stats.size += size
+            while self.stats.size > self.max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.stats.size -= evicted_size
+                self.stats.evictions += 1
+            self.stats.entries = len(self._entries)
+
+    def current_stats(self):
+        with self._lock:
+            return attr.evolve(self.stats)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.stats.entries = 0
+            self.stats.size = 0
+
+
+class Session:
+    def __init__(
+        self,
+        parse_cache_size=DEFAULT_PARSE_CACHE_SIZE,
+        value_cache_size=DEFAULT_VALUE_CACHE_SIZE,
+        cache=True,
+        snapshot=None,
+        max_concurrency=imports.DEFAULT_MAX_CONCURRENCY,
+        executor=None,
+        parallel_threshold=parallel.DEFAULT_THRESHOLD,
+        http_client=None,
+    ):
+        """`cache` is a `dhall.cache.Cache` for hashed imports, True for the
+        default one, or False for none. If an `executor` running worker
+        processes is given, big documents are typechecked and evaluated in parallel (see
+        `dhall.parallel`). Remote imports are fetched with `http_client`, or
+        the default `dhall.remote.HTTPClient`."""
+        self.parsed = LRUCache(parse_cache_size)
+        self.values = LRUCache(value_cache_size)
+        self.cache = Cache() if cache is True else cache or None
+        self.snapshot = snapshot
+        self.max_concurrency = max_concurrency
+        self.executor = executor
+        self.parallel_threshold = parallel_threshold
+        self.http_client = http_client
+
+    def load(self, filename):
+        """Parse a file, resolve its imports, then typecheck and evaluate it"""
+        return self.evaluate(self.parse(imports.read_file(filename)), filename)
+
+    def evaluate(self, expression, filename=None):
+        """Resolve imports of an expression coming from a file (or from the
+        current directory), then typecheck and evaluate it"""
+        expression = self.shared(self.resolve(expression, filename))
+        if self.executor is not None:
+            parallel.type_checked(expression, self.executor, self.parallel_threshold)
+            return parallel.evaluated(expression, self.executor, self.parallel_threshold)
+        expression.type()
+        return expression.evaluated()
+
+    def parse(self, text):
+        expression = self.parsed.get(text)
+        if expression is None:
+            expression = self._parse(text)
+            self.parsed.put(text, expression, len(text))
+        return expression
+
+    def _parse(self, text):
+        from .parser import parse
+        return parse(text)
+
+    def resolve(self, expression, filename=None):
+        importer = None if filename is None else ast.LocalImport(os.path.abspath(filename))
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(SessionResolver(self).resolve(expression, importer))
+        finally:
+            loop.close()
+
+    def shared(self, expression):
+        """Replace leading let bindings of a (resolved) expression with
+        closed values, computed once per session"""
+        parameters = []
+        while isinstance(expression, ast.LetIn) and ast.context_free(expression):
+            parameters.extend(expression.parameters)
+            expression = expression.expression
+        if not parameters:
+            return expression
+
+        digest = hashlib.sha256()
+        shared_parameters = []
+        for name, value, typ in parameters:
+            out = bytearray()
+            binary.head(binary.ARRAY, 3, out)
+            binary.string(name, out)
+            for e in (value, typ):
+                if e is None:
+                    out += binary.NULL
+                elif e.memo.get('closed'):
+                    binary.string(e.semantic_hash(), out)
+                else:
+                    binary.encode(e, out)
+            digest.update(out)
+            key = ('let', digest.hexdigest())
+            shared = self.values.get(key)
+            if shared is None:
+                binding = ast.LetIn(shared_parameters + [(name, value, typ)], ast.Variable(name))
+                type = binding.type()
+                shared = binding.evaluated().mark_closed(type)
+                self.values.put(key, shared, len(binary.dumps(shared)))
+            shared_parameters.append((name, shared, None))
+        return ast.LetIn(shared_parameters, expression)
+
+    def stats(self):
+        """Statistics of parse and value caches"""
+        return {
+            'parsed': self.parsed.current_stats(),
+            'values': self.values.current_stats(),
+        }
+
+    def clear(self):
+        """Forget everything cached in the session"""
+        self.parsed.clear()
+        self.values.clear()
+
+
+class SessionResolver(imports.Resolver):
+    """Resolver keeping loaded imports in a session. Each of them is kept
+    with versions of everything it was loaded from - itself and imports it
+    made, transitively - and is served only while none of them changed."""
+    def __init__(self, session):
+        super().__init__(
+            session.max_concurrency,
+            session.cache,
+            http_client=session.http_client,
+            snapshot=session.snapshot,
+        )
+        self.session = session
+        self._versions = {}  # loaded location -> versions of its sources, or None
+        self._sources = {}  # importer -> versions of sources of its imports
+
+    def parse(self, text):
+        return self.session.parse(text)
+
+    async def resolve_import(self, importer, expression):
+        location = imports.relative_location(importer, expression.location)
+        if expression.as_text and expression.hash is None:
+            version = await self.version(location)  # before it's read
+        value = await super().resolve_import(importer, expression)
+        if expression.hash is None:  # hashed imports never change
+            if expression.as_text:
+                versions = None if version is None else {location: version}
+            else:
+                # nothing is loaded for imports found in the snapshot
+                versions = self._versions.get(location, {})
+            self._sources.setdefault(importer, []).append(versions)
+        return value
+
+    async def _load(self, location):
+        key = ('import', location)
+        entry = self.session.values.get(key)
+        if entry is not None:
+            value, versions = entry
+            if await self.unchanged(versions):
+                self._versions[location] = versions
+                return value
+        version = await self.version(location)  # before it's read
+        value = await super()._load(location)
+        versions = None if version is None else {location: version}
+        for sources in self._sources.get(location, ()):
+            if versions is None or sources is None:
+                versions = None
+                break
+            versions.update(sources)
+        self._versions[location] = versions
+        if versions is not None:
+            self.session.values.put(key, (value, versions), len(binary.dumps(value)))
+        return value
+
+    async def version(self, location):
+        """Version of an import source: modification time and size of local
+        files, digest of other texts (remote ones are fetched, once per
+        resolver). None if it can't be read."""
+        if isinstance(location, ast.LocalImport):
+            try:
+                stat = os.stat(location.path)
+            except OSError:
+                return None
+            return (stat.st_mtime_ns, stat.st_size)
+        try:
+            text = await self.fetch(location)
+        except imports.ImportError:
+            return None
+        return hashlib.sha256(text.encode('utf8')).hexdigest()
+
+    async def unchanged(self, versions):
+        current = await asyncio.gather(*[self.version(location) for location in versions])
+        return current == list(versions.values())
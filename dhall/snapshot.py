@@ -0,0 +1,158 @@
+"""Snapshots of resolved, typechecked and normalized expressions.
+
+A snapshot holds expressions imported by many configurations - a prelude or
+an in-house library - keyed by their import locations. It's built once,
+with `build`, and written to a file in binary form, together with the types
+and semantic hashes of its expressions. Loading a snapshot only reads the
+file and finds where the entries are; an entry is decoded when it's first
+used, with its memo already filled: it's marked as evaluated, normalized and
+closed, and knows its type and hash. Its type and normal form are thus never
+computed again, also when it's substituted deep inside other expressions.
+
+Give a snapshot to an import resolver (`dhall.imports.Resolver`, or the
+`snapshot` argument of `resolve` and `load`), and imports of its locations,
+or imports with hashes of its entries, are served from it.
+
+The file is a CBOR array of a format name and an array of entries. Entries
+are arrays of location, hash, normal form and (normalized) type."""
+from collections.abc import Mapping
+import asyncio
+import threading
+
+from . import binary
+from .binary import ARRAY, Decoder, head, string
+from .cache import Cache
+from .imports import DEFAULT_MAX_CONCURRENCY, Resolver, parse_import, parse_location, relative_location
+
+
+FORMAT = 'dhall-python snapshot 1'
+
+
+class Snapshot(Mapping):
+    """Read-only mapping of import locations to closed normal forms"""
+    def __init__(self, entries=()):
+        """`entries` are pairs of location and (resolved) expression. The
+        expressions are typechecked and normalized."""
+        self._data = None
+        self._lock = threading.Lock()  # held while decoding entries
+        self._offsets = {}  # location -> (hash, value offset) of undecoded entries
+        self._values = {}  # location -> decoded expression
+        self._hashes = {}  # hash -> location
+        for location, expression in entries:
+            type = expression.normalized_type()
+            value = expression.evaluated().normalized()
+            self._add(location, value, type)
+
+    def _add(self, location, value, type):
+        value.memo['evaluated'] = value
+        value.memo['normalized'] = value
+        value.mark_closed(type)
+        self._values[location] = value
+        self._hashes[value.semantic_hash()] = location
+
+    def __getitem__(self, location):
+        try:
+            return self._values[location]
+        except KeyError:
+            pass
+        with self._lock:
+            if location in self._values:  # decoded by another thread meanwhile
+                return self._values[location]
+            return self._decode(location)
+
+    def _decode(self, location):
+        hash, offset = self._offsets[location]
+        decoder = Decoder(self._data, offset)
+        value = decoder.expression()
+        value.memo['cbor'] = bytes(self._data[offset:decoder.position])
+        value.memo['semantic_hash'] = hash
+        type = decoder.expression()
+        type.memo['evaluated'] = type
+        type.memo['normalized'] = type
+        self._add(location, value, type)
+        del self._offsets[location]
+        return value
+
+    def __iter__(self):
+        with self._lock:
+            locations = list(self._values) + list(self._offsets)
+        return iter(locations)
+
+    def __len__(self):
+        return len(self._values) + len(self._offsets)
+
+    def lookup(self, location, hash=None):
+        """Expression for an import of `location` protected with `hash`, or
+        None if the snapshot doesn't have it"""
+        if hash is not None:
+            location = self._hashes.get(hash)
+            return None if location is None else self[location]
+        try:
+            return self[location]
+        except KeyError:
+            return None
+
+    def dump(self, fp):
+        """Write the snapshot into a binary file"""
+        out = bytearray()
+        head(ARRAY, 2, out)
+        string(FORMAT, out)
+        head(ARRAY, len(self), out)
+        for location in self:
+            value = self[location]
+            head(ARRAY, 4, out)
+            string(str(location), out)
+            string(value.semantic_hash(), out)
+            out += binary.encoded(value)
+            binary.encode(value.type(), out)
+        fp.write(out)
+
+    @classmethod
+    def loads(cls, data):
+        """Read a snapshot from a bytes-like object. Entries are decoded when
+        they're used."""
+        snapshot = cls()
+        snapshot._data = memoryview(data)
+        decoder = Decoder(data)
+        if decoder.head() != (ARRAY, 2) or decoder.string() != FORMAT:
+            raise ValueError('not a dhall snapshot')
+        major, length = decoder.head()
+        for _ in range(length):
+            decoder.head()
+            location = parse_location(decoder.string())
+            hash = decoder.string()
+            snapshot._offsets[location] = (hash, decoder.position)
+            snapshot._hashes[hash] = location
+            decoder.skip()
+            decoder.skip()
+        return snapshot
+
+    @classmethod
+    def load(cls, filename):
+        """Read a snapshot file"""
+        with open(filename, 'rb') as f:
+            return cls.loads(f.read())
+
+
+def build(imports, max_concurrency=DEFAULT_MAX_CONCURRENCY, cache=True, resolver=None):
+    """Resolve imports (given by their source, like `./lib/package.dhall`)
+    and make a snapshot of them. Relative imports are resolved against the
+    current directory."""
+    imports = [parse_import(i) for i in imports]
+    if resolver is None:
+        if cache is True:
+            cache = Cache()
+        resolver = Resolver(max_concurrency, cache or None)
+
+    async def resolve_all():
+        return await asyncio.gather(*[resolver.resolve_import(None, i) for i in imports])
+
+    loop = asyncio.new_event_loop()
+    try:
+        values = loop.run_until_complete(resolve_all())
+    finally:
+        loop.close()
+    return Snapshot(
+        (relative_location(None, i.location), value)
+        for i, value in zip(imports, values)
+    )
@@ -14,3 +14,34 @@ def timeit(title):
     yield
     end = time()
     print('{} took {:.1f}ms'.format(title, (end - start) * 1000), file=sys.stderr)
+
+
+class Progress:
+    """Periodically logs how many elements were processed and how fast, at
+    INFO level to the `dhall.tools` logger - so nothing is reported unless
+    logging is configured to show it."""
+    @staticmethod
+    def wanted():
+        """True if reports would be shown anywhere"""
+        return logger.isEnabledFor(logging.INFO)
+
+    def __init__(self, title, interval=1.0):
+        self.title = title
+        self.interval = interval
+        self.count = 0
+        self.start = self.last_report = time()
+
+    def advance(self, count=1):
+        self.count += count
+        now = time()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report(now)
+
+    def finish(self):
+        self.report(time())
+
+    def report(self, now):
+        elapsed = now - self.start
+        rate = self.count / elapsed if elapsed > 0 else float('inf')
+        logger.info('%s: %d checked (%.0f/s)', self.title, self.count, rate)
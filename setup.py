@@ -54,7 +54,9 @@ setup(
     keywords='dhall',
     py_modules=['dhall'],
     scripts=[
+        'bin/dhall-python',
         'bin/dhall-python-parse',
+        'bin/dhall-python-to-json',
     ],
     setup_requires=[
         'parglare',
@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+import asyncio
+
+from dhall import ast
+from dhall.aio import aevaluate, aload
+
+from .test_imports import FakeResolver, local
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class AsyncTestCase(TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(2)
+        self.addCleanup(self.executor.shutdown)
+        self.files = {
+            '/a.dhall': ast.Plus(ast.NaturalLiteral(1), ast.NaturalLiteral(2)),
+            'main': ast.ListLiteral([local('/a.dhall'), ast.NaturalLiteral(0)]),
+        }
+
+    def test_load(self):
+        f = NamedTemporaryFile('w', suffix='.dhall')
+        self.addCleanup(f.close)
+        f.write('main')
+        f.flush()
+        resolver = FakeResolver(self.files, executor=self.executor)
+        self.assertEqual(
+            run(aload(f.name, resolver=resolver)),
+            ast.ListLiteral([ast.NaturalLiteral(3), ast.NaturalLiteral(0)]),
+        )
+
+    def test_timeout(self):
+        resolver = FakeResolver(self.files, executor=self.executor)
+        value = ast.ListLiteral([ast.NaturalLiteral(3), ast.NaturalLiteral(0)])
+
+        async def retry():
+            with self.assertRaises(asyncio.TimeoutError):
+                await aevaluate(self.files['main'], timeout=0.001, resolver=resolver)
+            self.assertEqual(resolver._texts, {})  # the fetch was cancelled
+            return await aevaluate(self.files['main'], resolver=resolver)
+
+        self.assertEqual(run(retry()), value)
+
+    def test_timeout_of_concurrent_call(self):
+        resolver = FakeResolver(self.files, executor=self.executor)
+
+        async def both():
+            return await asyncio.gather(
+                aevaluate(self.files['main'], resolver=resolver),
+                aevaluate(self.files['main'], timeout=0.001, resolver=resolver),
+                return_exceptions=True,
+            )
+
+        value, error = run(both())
+        self.assertEqual(value, ast.ListLiteral([ast.NaturalLiteral(3), ast.NaturalLiteral(0)]))
+        self.assertIsInstance(error, asyncio.TimeoutError)
+        self.assertEqual(resolver.reads, ['/a.dhall'])
@@ -0,0 +1,118 @@
+from unittest import TestCase
+import hashlib
+
+import attr
+
+from dhall import ast
+from dhall.binary import dumps, loads
+
+
+class BinaryTestCase(TestCase):
+    def assertRoundTrip(self, expression, encoded=None):
+        data = dumps(expression)
+        if encoded is not None:
+            self.assertEqual(data.hex(), encoded)
+        self.assertEqual(loads(data), expression)
+        self.assertEqual(loads(memoryview(bytearray(data))), expression)
+
+    def test_literals(self):
+        self.assertRoundTrip(ast.NaturalLiteral(1), '820f01')
+        self.assertRoundTrip(ast.NaturalLiteral(1 << 70), '820fc249400000000000000000')
+        self.assertRoundTrip(ast.BooleanLiteral(True), 'f5')
+        self.assertRoundTrip(ast.TextLiteral(['ab']), '82126261 62'.replace(' ', ''))
+
+    def test_doubles(self):
+        self.assertRoundTrip(ast.DoubleLiteral(1.0), 'f93c00')
+        self.assertRoundTrip(ast.DoubleLiteral(100000.0), 'fa47c35000')
+        self.assertRoundTrip(ast.DoubleLiteral(1.1), 'fb3ff199999999999a')
+        self.assertRoundTrip(ast.DoubleLiteral(float('inf')), 'f97c00')
+        self.assertEqual(dumps(ast.DoubleLiteral(float('nan'))).hex(), 'f97e00')
+
+    def test_variables(self):
+        self.assertRoundTrip(ast.Variable('_', 1), '01')
+        self.assertRoundTrip(ast.Variable('x'), '82617800')
+
+    def test_functions(self):
+        self.assertRoundTrip(ast.Lambda(
+            'x', ast.NaturalBuiltin(),
+            ast.ApplicationExpression(
+                ast.ApplicationExpression(ast.Variable('f'), ast.Variable('x')),
+                ast.Variable('_'),
+            ),
+        ))
+        self.assertRoundTrip(ast.ForAll('_', ast.TypeBuiltin(), ast.ListType(ast.Variable('_'))))
+
+    def test_records_and_unions(self):
+        self.assertRoundTrip(ast.ProjectionExpression(
+            ast.PreferExpression(
+                ast.RecordLiteral({'b': ast.NaturalLiteral(1), 'a': ast.TextLiteral([])}),
+                ast.RecordLiteral({}),
+            ),
+            ['a'],
+        ))
+        union_type = ast.UnionType({'A': ast.BoolBuiltin(), 'B': ast.OptionalType(ast.TextBuiltin())})
+        self.assertRoundTrip(ast.MergeExpression(
+            ast.SelectExpression(ast.Variable('handlers'), 'h'),
+            ast.Union('A', ast.BooleanLiteral(False), {'B': ast.OptionalType(ast.TextBuiltin())}),
+            union_type,
+        ))
+
+    def test_let_and_text(self):
+        self.assertRoundTrip(ast.LetIn(
+            [('x', ast.NaturalLiteral(1), None), ('y', ast.Variable('x'), ast.NaturalBuiltin())],
+            ast.TextLiteral(['a', ast.Variable('y'), 'b']),
+        ))
+
+    def test_empty_collections(self):
+        self.assertRoundTrip(ast.TypeAnnotation(ast.ListLiteral([]), ast.ListType(ast.BoolBuiltin())), '820464426f6f6c')
+        self.assertRoundTrip(ast.TypeAnnotation(
+            ast.OptionalLiteral(ast.NaturalLiteral(1)),
+            ast.OptionalType(ast.NaturalBuiltin()),
+        ))
+
+    def test_malformed(self):
+        for data in [b'', b'\x82\x0f', b'\x83\x63', b'\xf6', b'\x82\x0f\x01\x00']:
+            with self.assertRaises(ValueError):
+                loads(data)
+
+
+class SemanticHashTestCase(TestCase):
+    def test_normal_form(self):
+        expected = 'sha256:' + hashlib.sha256(dumps(ast.NaturalLiteral(2))).hexdigest()
+        self.assertEqual(ast.Plus(ast.NaturalLiteral(1), ast.NaturalLiteral(1)).semantic_hash(), expected)
+        self.assertEqual(
+            ast.Lambda('x', ast.BoolBuiltin(), ast.Variable('x')).semantic_hash(),
+            ast.Lambda('y', ast.BoolBuiltin(), ast.Variable('y')).semantic_hash(),
+        )
+
+    def test_small_change(self):
+        big = ast.ListLiteral([ast.NaturalLiteral(i) for i in range(1000)])
+        record = ast.RecordLiteral({'big': big, 'small': ast.NaturalLiteral(1)})
+        record.semantic_hash()
+        normal_big = record.evaluated().normalized().fields['big']
+        # only the digest is remembered, not encodings
+        self.assertNotIn('cbor', normal_big.memo)
+        self.assertNotIn('cbor', record.evaluated().normalized().memo)
+        changed = attr.evolve(record, fields=record.fields.set('small', ast.NaturalLiteral(2)))
+        self.assertNotEqual(changed.semantic_hash(), record.semantic_hash())
+        # the unchanged field isn't evaluated again
+        self.assertIs(changed.evaluated().normalized().fields['big'], normal_big)
+        self.assertEqual(
+            changed.semantic_hash(),
+            'sha256:' + hashlib.sha256(dumps(changed)).hexdigest(),
+        )
+
+    def test_empty_optional(self):
+        def empty(typ):
+            return ast.TypeAnnotation(ast.OptionalLiteral(), ast.OptionalType(typ))
+
+        record = ast.RecordLiteral({'a': empty(ast.NaturalBuiltin())})
+        self.assertEqual(record.evaluated().fields['a'], ast.OptionalLiteral(None, ast.NaturalBuiltin()))
+        self.assertEqual(
+            record.semantic_hash(),
+            'sha256:' + hashlib.sha256(dumps(record)).hexdigest(),
+        )
+        self.assertNotEqual(
+            record.semantic_hash(),
+            ast.RecordLiteral({'a': empty(ast.BoolBuiltin())}).semantic_hash(),
+        )
@@ -0,0 +1,45 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import os
+
+from dhall import ast
+from dhall.binary import dumps
+from dhall.cache import Cache
+
+
+class CacheTestCase(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_round_trip(self):
+        cache = Cache(self.directory)
+        value = ast.RecordLiteral({'a': ast.NaturalLiteral(1)})
+        self.assertIsNone(cache.get(value.semantic_hash()))
+        cache.put(value.semantic_hash(), value)
+        self.assertEqual(os.listdir(self.directory), ['1220' + value.semantic_hash()[len('sha256:'):]])
+        self.assertEqual(cache.get(value.semantic_hash()), value)
+
+    def test_corrupted(self):
+        cache = Cache(self.directory)
+        value = ast.NaturalLiteral(1)
+        cache.put(value.semantic_hash(), value)
+        with open(cache.path(value.semantic_hash()), 'wb') as f:
+            f.write(b'\x82\x0f\x02')
+        self.assertIsNone(cache.get(value.semantic_hash()))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_eviction(self):
+        values = [
+            ast.ListLiteral([ast.NaturalLiteral(j) for j in range(i, i + 100)])
+            for i in range(5)
+        ]
+        size = max(len(dumps(value)) for value in values)
+        cache = Cache(self.directory, max_size=3 * size)
+        for i, value in enumerate(values):
+            cache.put(value.semantic_hash(), value)
+            os.utime(cache.path(value.semantic_hash()), (i, i))
+        self.assertEqual(len(os.listdir(self.directory)), 3)
+        self.assertIsNone(cache.get(values[0].semantic_hash()))
+        self.assertEqual(cache.get(values[4].semantic_hash()), values[4])
@@ -0,0 +1,108 @@
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import TestCase, mock
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+
+from dhall import ast
+from dhall.cli import commands, main, run, timed
+from dhall.daemon import Server
+
+from .test_session import FakeSession
+
+
+SOURCES = {
+    'sum': ast.Plus(ast.NaturalLiteral(1), ast.NaturalLiteral(2)),
+    'bad': ast.Plus(ast.NaturalLiteral(1), ast.BooleanLiteral(True)),
+}
+SOURCES.update({
+    'n{}'.format(i): ast.Times(ast.NaturalLiteral(i), ast.NaturalLiteral(10))
+    for i in range(6)
+})
+
+
+def fake_session(snapshot):
+    return FakeSession(SOURCES)
+
+
+class CLITestCase(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.session = FakeSession(SOURCES)
+        self.paths = [self.write(text) for text in ['sum', 'bad']]
+
+    def write(self, text):
+        path = os.path.join(self.directory, text + '.dhall')
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_hash(self):
+        self.assertEqual(
+            run(self.session, commands['hash'], self.paths[0]),
+            ast.NaturalLiteral(3).semantic_hash(),
+        )
+
+    def test_timed(self):
+        outcome = timed(self.paths[1], run, self.session, commands['normalize'], self.paths[1])
+        self.assertEqual(outcome['kind'], 'TypeError')
+        self.assertGreaterEqual(outcome['seconds'], 0)
+
+    def test_many_files_through_server(self):
+        socket = os.path.join(self.directory, 'socket')
+        server = Server(socket, self.session)
+        thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01})
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(thread.join)
+        self.addCleanup(server.shutdown)
+
+        stdout = StringIO()
+        with redirect_stdout(stdout), redirect_stderr(StringIO()):
+            status = main(['--socket', socket, 'json', '-j', '2', '--json'] + self.paths)
+        self.assertEqual(status, 1)
+        outcomes = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([o['path'] for o in outcomes], self.paths)
+        self.assertEqual(outcomes[0]['result'], '3')
+        self.assertEqual(outcomes[1]['kind'], 'TypeError')
+
+    def test_many_files_in_worker_processes(self):
+        if multiprocessing.get_start_method() != 'fork':
+            self.skipTest('workers get the fake session by forking')
+        paths = [self.write('n{}'.format(i)) for i in range(6)]
+
+        def json_outcomes(paths):
+            stdout = StringIO()
+            with redirect_stdout(stdout), redirect_stderr(StringIO()):
+                with mock.patch('dhall.cli.make_session', fake_session):
+                    status = main(['json', '-j', '2', '--json'] + paths)
+            return status, [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+        status, outcomes = json_outcomes(paths)
+        self.assertEqual(status, 0)
+        self.assertEqual([o['path'] for o in outcomes], paths)
+        self.assertEqual([o['result'] for o in outcomes], [str(i * 10) for i in range(6)])
+
+        paths.insert(3, self.paths[1])
+        status, outcomes = json_outcomes(paths)
+        self.assertEqual(status, 1)
+        self.assertEqual([o['path'] for o in outcomes], paths)
+        self.assertEqual(outcomes[3]['kind'], 'TypeError')
+        self.assertEqual(outcomes[4]['result'], '30')
+
+
+class ImportTestCase(TestCase):
+    def test_parser_not_imported(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.check_output(
+            [sys.executable, '-c', 'import sys, dhall.cli; print("dhall.parser" in sys.modules)'],
+            cwd=root,
+        )
+        self.assertEqual(output.strip(), b'False')
@@ -0,0 +1,135 @@
+from unittest import TestCase
+
+from dhall import ast
+from dhall.compiler import compile
+
+
+increment = ast.Lambda(
+    'x', ast.NaturalBuiltin(),
+    ast.Plus(ast.Variable('x'), ast.NaturalLiteral(1)),
+)
+
+
+class CompilerTestCase(TestCase):
+    def test_literal(self):
+        self.assertEqual(
+            compile(ast.RecordLiteral({
+                'a': ast.NaturalLiteral(1),
+                'b': ast.ListLiteral([ast.BooleanLiteral(True)]),
+            })),
+            {'a': 1, 'b': [True]},
+        )
+
+    def test_function(self):
+        f = compile(increment)
+        self.assertEqual(f(41), 42)
+        self.assertEqual(
+            f(41),
+            ast.ApplicationExpression(increment, ast.NaturalLiteral(41)).evaluated().value,
+        )
+
+    def test_shadowing(self):
+        f = compile(ast.Lambda(
+            'x', ast.NaturalBuiltin(),
+            ast.Lambda(
+                'x', ast.NaturalBuiltin(),
+                ast.Times(ast.Variable('x', 1), ast.NaturalLiteral(10)),
+            ),
+        ))
+        self.assertEqual(f(2)(3), 20)
+
+    def test_let_and_conditional(self):
+        expression = ast.LetIn(
+            [
+                ('inc', increment, None),
+                ('config', ast.RecordLiteral({'enabled': ast.BooleanLiteral(False)}), None),
+            ],
+            ast.Conditional(
+                ast.SelectExpression(ast.Variable('config'), 'enabled'),
+                ast.NaturalLiteral(0),
+                ast.ApplicationExpression(ast.Variable('inc'), ast.NaturalLiteral(1)),
+            ),
+        )
+        self.assertEqual(compile(expression), expression.evaluated().value)
+
+    def test_merge(self):
+        union_type = ast.UnionType({'A': ast.NaturalBuiltin(), 'B': ast.BoolBuiltin()})
+        f = compile(ast.Lambda(
+            'u', union_type,
+            ast.MergeExpression(
+                ast.RecordLiteral({
+                    'A': ast.Lambda('n', ast.NaturalBuiltin(), ast.Variable('n')),
+                    'B': ast.Lambda('b', ast.BoolBuiltin(), ast.NaturalLiteral(0)),
+                }),
+                ast.Variable('u'),
+            ),
+        ))
+        self.assertEqual(f(('A', 5)), 5)
+        self.assertEqual(f(('B', True)), 0)
+
+    def test_records(self):
+        expression = ast.PreferExpression(
+            ast.CombineExpression(
+                ast.RecordLiteral({'a': ast.RecordLiteral({'x': ast.NaturalLiteral(1)})}),
+                ast.RecordLiteral({'a': ast.RecordLiteral({'y': ast.NaturalLiteral(2)})}),
+            ),
+            ast.RecordLiteral({'b': ast.NaturalLiteral(3)}),
+        )
+        self.assertEqual(compile(expression), {'a': {'x': 1, 'y': 2}, 'b': 3})
+
+    def test_list_fold(self):
+        natural = ast.NaturalBuiltin()
+        expression = ast.ApplicationExpression(
+            ast.ApplicationExpression(
+                ast.ApplicationExpression(
+                    ast.ApplicationExpression(
+                        ast.ApplicationExpression(
+                            ast.ListFold(),
+                            natural,
+                        ),
+                        ast.ListLiteral([ast.NaturalLiteral(i) for i in [1, 2, 3]]),
+                    ),
+                    ast.TextBuiltin(),
+                ),
+                ast.Lambda('n', natural, ast.Lambda(
+                    's', ast.TextBuiltin(),
+                    ast.TextLiteral(['<', ast.Variable('s'), '>']),
+                )),
+            ),
+            ast.TextLiteral(['.']),
+        )
+        self.assertEqual(compile(expression), '<<<.>>>')
+
+    def test_list_build(self):
+        natural = ast.NaturalBuiltin()
+        expression = ast.ApplicationExpression(
+            ast.ApplicationExpression(ast.ListBuild(), natural),
+            ast.Lambda('list', ast.TypeBuiltin(), ast.Lambda(
+                'cons', ast.ForAll('_', natural, ast.ForAll('_', ast.Variable('list'), ast.Variable('list'))),
+                ast.Lambda('nil', ast.Variable('list'), ast.ApplicationExpression(
+                    ast.ApplicationExpression(ast.Variable('cons'), ast.NaturalLiteral(1)),
+                    ast.ApplicationExpression(
+                        ast.ApplicationExpression(ast.Variable('cons'), ast.NaturalLiteral(2)),
+                        ast.Variable('nil'),
+                    ),
+                )),
+            )),
+        )
+        self.assertEqual(expression.normalized_type(), ast.ListType(natural))
+        self.assertEqual(compile(expression), [1, 2])
+
+    def test_union_constructor_in_record(self):
+        # let types = { Color = < Red : Natural > } in types.Color.Red 1
+        expression = ast.LetIn(
+            [('types', ast.RecordLiteral({'Color': ast.UnionType({'Red': ast.NaturalBuiltin()})}), None)],
+            ast.ApplicationExpression(
+                ast.SelectExpression(ast.SelectExpression(ast.Variable('types'), 'Color'), 'Red'),
+                ast.NaturalLiteral(1),
+            ),
+        )
+        self.assertEqual(compile(expression), ('Red', 1))
+        f = compile(ast.Lambda(
+            'r', ast.RecordType({'x': ast.NaturalBuiltin()}),
+            ast.SelectExpression(ast.Variable('r'), 'x'),
+        ))
+        self.assertEqual(f({'x': 5}), 5)
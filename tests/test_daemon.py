@@ -0,0 +1,81 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import os
+import socket
+import threading
+
+from dhall import ast
+from dhall.daemon import RemoteError, Server, remove_stale_socket, request
+
+from .test_session import FakeSession
+
+
+class DaemonTestCase(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.session = FakeSession({
+            'sum': ast.Plus(ast.NaturalLiteral(1), ast.NaturalLiteral(2)),
+            'bad': ast.Plus(ast.NaturalLiteral(1), ast.BooleanLiteral(True)),
+        })
+        self.socket = os.path.join(self.directory, 'socket')
+        server = Server(self.socket, self.session)
+        thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01})
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(thread.join)
+        self.addCleanup(server.shutdown)
+
+    def test_commands(self):
+        path = os.path.join(self.directory, 'sum.dhall')
+        with open(path, 'w') as f:
+            f.write('sum')
+        self.assertEqual(request(self.socket, 'normalize', path), '3')
+        self.assertEqual(request(self.socket, 'json', source='sum'), '3')
+        self.assertEqual(request(self.socket, 'type', source='sum'), 'Natural')
+        self.assertEqual(self.session.parses, 1)
+
+    def test_errors(self):
+        with self.assertRaises(RemoteError) as e:
+            request(self.socket, 'type', source='bad')
+        self.assertEqual(e.exception.kind, 'TypeError')
+        with self.assertRaises(RemoteError) as e:
+            request(self.socket, 'no such command', source='sum')
+        self.assertEqual(e.exception.kind, 'KeyError')
+
+    def test_source_relative_to_client_directory(self):
+        filenames = []
+        evaluate = self.session.evaluate
+        self.session.evaluate = lambda expression, filename=None: (
+            filenames.append(filename) or evaluate(expression, filename)
+        )
+        request(self.socket, 'normalize', source='sum')
+        self.assertEqual(filenames, [os.path.join(os.getcwd(), '<stdin>')])
+
+    def test_socket_in_use(self):
+        with self.assertRaises(FileExistsError):
+            remove_stale_socket(self.socket)
+        self.assertEqual(request(self.socket, 'json', source='sum'), '3')
+
+
+class StaleSocketTestCase(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'socket')
+
+    def test_stale_socket_removed(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        sock.close()  # nothing listens anymore
+        remove_stale_socket(self.path)
+        self.assertFalse(os.path.exists(self.path))
+        remove_stale_socket(self.path)
+
+    def test_other_files_kept(self):
+        with open(self.path, 'w') as f:
+            f.write('important')
+        with self.assertRaises(FileExistsError):
+            remove_stale_socket(self.path)
+        self.assertTrue(os.path.exists(self.path))
@@ -1,6 +1,6 @@
 from unittest import TestCase
 
-from dhall.data_structures import ShadowDict
+from dhall.data_structures import ShadowDict, SortedDict
 
 
 class ShadowDictTestCase(TestCase):
@@ -38,3 +38,46 @@ class ShadowDictTestCase(TestCase):
             ShadowDict().shadow({'k': 'v'}).shadow({}).shadow({'k': 'v2'}).age('k', 1),
             2,
         )
+
+
+class SortedDictTestCase(TestCase):
+    def test_sorted_iteration(self):
+        self.assertEqual(
+            list(SortedDict.from_pairs([('b', 1), ('a', 2)]).items()),
+            [('a', 2), ('b', 1)],
+        )
+
+    def test_order_independent_equality(self):
+        self.assertEqual(
+            SortedDict.from_pairs([('b', 1), ('a', 2)]),
+            SortedDict.from_pairs({'a': 2, 'b': 1}),
+        )
+
+    def test_duplicates(self):
+        self.assertEqual(
+            SortedDict.from_pairs([('a', 1), ('b', 1), ('a', 2)]).duplicates,
+            ('a',),
+        )
+
+    def test_update(self):
+        base = SortedDict.from_pairs({'a': 1, 'b': 2})
+        self.assertEqual(
+            dict(base.update(SortedDict.from_pairs({'b': 3, 'c': 4}))),
+            {'a': 1, 'b': 3, 'c': 4},
+        )
+        self.assertEqual(dict(base), {'a': 1, 'b': 2})
+
+    def test_merge(self):
+        self.assertEqual(
+            dict(SortedDict.from_pairs({'a': 1, 'b': 2}).merge(
+                {'b': 3, 'c': 4},
+                lambda k, x, y: x + y,
+            )),
+            {'a': 1, 'b': 5, 'c': 4},
+        )
+
+    def test_select(self):
+        self.assertEqual(
+            list(SortedDict.from_pairs({'a': 1, 'b': 2, 'c': 3}).select(['c', 'a']).items()),
+            [('a', 1), ('c', 3)],
+        )
@@ -0,0 +1,71 @@
+from unittest import TestCase
+
+import attr
+
+from dhall import ast
+from dhall.decoding import decoder
+
+
+@attr.s
+class Server:
+    host = attr.ib(type=str)
+    port = attr.ib(type=int)
+
+
+@attr.s
+class Config:
+    server = attr.ib(type=Server)
+    tags = attr.ib(type=list)
+
+
+config = ast.RecordLiteral({
+    'server': ast.RecordLiteral({
+        'host': ast.TextLiteral(['local', 'host']),
+        'port': ast.NaturalLiteral(80),
+    }),
+    'tags': ast.ListLiteral([ast.TextLiteral(['a'])]),
+})
+
+
+class DecoderTestCase(TestCase):
+    def test_to_python(self):
+        self.assertEqual(
+            config.to_python(),
+            {'server': {'host': 'localhost', 'port': 80}, 'tags': ['a']},
+        )
+
+    def test_tuples(self):
+        self.assertEqual(config.to_python(tuple), (('localhost', 80), ['a']))
+
+    def test_attrs_classes(self):
+        self.assertEqual(
+            config.to_python(Config),
+            Config(Server('localhost', 80), ['a']),
+        )
+
+    def test_union_and_optional(self):
+        typ = ast.ListType(ast.UnionType({
+            'Port': ast.NaturalBuiltin(),
+            'Name': ast.OptionalType(ast.TextBuiltin()),
+        }))
+        value = ast.ListLiteral([
+            ast.Union('Port', ast.NaturalLiteral(1), {'Name': ast.OptionalType(ast.TextBuiltin())}),
+            ast.Union('Name', ast.OptionalLiteral(), {'Port': ast.NaturalBuiltin()}),
+        ])
+        self.assertEqual(decoder(typ)(value), [('Port', 1), ('Name', None)])
+
+    def test_interpolated_text(self):
+        self.assertEqual(ast.TextLiteral(['a', ast.TextLiteral(['b']), 'c']).to_python(), 'abc')
+        expression = ast.LetIn(
+            [('x', ast.TextLiteral(['b']), None)],
+            ast.TextLiteral(['a', ast.Variable('x')]),
+        )
+        self.assertEqual(expression.to_python(), 'ab')
+
+    def test_cached(self):
+        typ = ast.RecordType({'a': ast.NaturalBuiltin()})
+        self.assertIs(decoder(typ), decoder(ast.RecordType({'a': ast.NaturalBuiltin()})))
+
+    def test_function(self):
+        f = ast.Lambda('x', ast.NaturalBuiltin(), ast.Plus(ast.Variable('x'), ast.Variable('x')))
+        self.assertEqual(f.to_python()(2), 4)
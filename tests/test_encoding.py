@@ -0,0 +1,45 @@
+from unittest import TestCase
+
+import attr
+
+from dhall import ast
+from dhall.encoding import from_python
+
+
+@attr.s
+class Point:
+    x = attr.ib()
+    y = attr.ib()
+
+
+class FromPythonTestCase(TestCase):
+    def test_guessed(self):
+        value = from_python({'points': [Point(1, 2)], 'name': 'a', 'ok': False})
+        self.assertEqual(value.normalized_type(), ast.RecordType({
+            'points': ast.ListType(ast.RecordType({
+                'x': ast.NaturalBuiltin(),
+                'y': ast.NaturalBuiltin(),
+            })),
+            'name': ast.TextBuiltin(),
+            'ok': ast.BoolBuiltin(),
+        }))
+
+    def test_needs_type(self):
+        for obj in [None, [], {'a': []}]:
+            with self.assertRaises(ValueError):
+                from_python(obj)
+
+    def test_union(self):
+        typ = ast.UnionType({'A': ast.NaturalBuiltin(), 'B': ast.TextBuiltin()})
+        value = from_python(('B', 'x'), typ)
+        self.assertEqual(value, ast.Union('B', ast.TextLiteral(['x']), {'A': ast.NaturalBuiltin()}))
+        self.assertEqual(value.normalized_type(), typ)
+
+    def test_record_round_trip(self):
+        typ = ast.RecordType({'x': ast.NaturalBuiltin(), 'y': ast.DoubleBuiltin()})
+        value = from_python(Point(1, 2), typ)
+        self.assertEqual(value.to_python(Point), Point(1, 2.0))
+
+    def test_shared_literals(self):
+        value = from_python([7, 7])
+        self.assertIs(value.items[0], value.items[1])
@@ -0,0 +1,117 @@
+from unittest import TestCase
+
+from dhall import ast
+
+
+def union(label, value):
+    alternatives = {
+        'Number': ast.NaturalBuiltin(),
+        'Flag': ast.BoolBuiltin(),
+    }
+    del alternatives[label]
+    return ast.Union(label, value, alternatives)
+
+
+handlers = ast.RecordLiteral({
+    'Number': ast.Lambda('n', ast.NaturalBuiltin(), ast.Variable('n')),
+    'Flag': ast.Lambda('b', ast.BoolBuiltin(), ast.NaturalLiteral(0)),
+})
+
+
+class MergeTestCase(TestCase):
+    def test_evaluate(self):
+        self.assertEqual(
+            ast.MergeExpression(handlers, union('Number', ast.NaturalLiteral(41))).evaluated(),
+            ast.NaturalLiteral(41),
+        )
+
+    def test_type(self):
+        self.assertEqual(
+            ast.MergeExpression(handlers, union('Flag', ast.BooleanLiteral(True))).normalized_type(),
+            ast.NaturalBuiltin(),
+        )
+
+    def test_type_mismatched_labels(self):
+        expression = ast.MergeExpression(
+            ast.RecordLiteral({'Number': handlers.fields['Number']}),
+            union('Flag', ast.BooleanLiteral(True)),
+        )
+        with self.assertRaises(TypeError):
+            expression.type()
+
+    def test_merge_all(self):
+        merge = ast.MergeExpression(handlers, ast.Variable('u'))
+        self.assertEqual(
+            merge.merge_all([
+                union('Number', ast.NaturalLiteral(1)),
+                union('Flag', ast.BooleanLiteral(False)),
+                union('Number', ast.NaturalLiteral(2)),
+            ]),
+            [ast.NaturalLiteral(1), ast.NaturalLiteral(0), ast.NaturalLiteral(2)],
+        )
+
+    def test_stuck(self):
+        merge = ast.MergeExpression(handlers, ast.Variable('u'))
+        self.assertEqual(merge.evaluated(), merge)
+
+
+class Unevaluable(ast.Variable):
+    """Stands for an expression that must not be evaluated"""
+    def _evaluated(self):
+        raise AssertionError('evaluated {}'.format(self.name))
+
+
+class LazyEvaluationTestCase(TestCase):
+    def test_conditional(self):
+        expression = ast.Conditional(
+            ast.And(ast.BooleanLiteral(True), ast.BooleanLiteral(False)),
+            Unevaluable('then'),
+            ast.NaturalLiteral(1),
+        )
+        self.assertEqual(expression.evaluated(), ast.NaturalLiteral(1))
+
+    def test_conditional_stuck(self):
+        expression = ast.Conditional(ast.Variable('b'), ast.BooleanLiteral(True), ast.BooleanLiteral(False))
+        self.assertEqual(expression.evaluated(), ast.Variable('b'))
+
+    def test_conditional_type(self):
+        expression = ast.Conditional(ast.BooleanLiteral(True), ast.NaturalLiteral(1), ast.BooleanLiteral(False))
+        with self.assertRaises(TypeError):
+            expression.type()
+
+    def test_or(self):
+        self.assertEqual(
+            ast.Or(ast.BooleanLiteral(True), Unevaluable('b')).evaluated(),
+            ast.BooleanLiteral(True),
+        )
+        self.assertEqual(
+            ast.Or(ast.BooleanLiteral(False), ast.Variable('b')).evaluated(),
+            ast.Variable('b'),
+        )
+
+    def test_and(self):
+        self.assertEqual(
+            ast.And(ast.BooleanLiteral(False), Unevaluable('b')).evaluated(),
+            ast.BooleanLiteral(False),
+        )
+        self.assertEqual(
+            ast.And(ast.Variable('a'), ast.BooleanLiteral(True)).evaluated(),
+            ast.Variable('a'),
+        )
+
+    def test_merge(self):
+        expression = ast.MergeExpression(
+            ast.RecordLiteral({
+                'Number': handlers.fields['Number'],
+                'Flag': Unevaluable('handler'),
+            }),
+            union('Number', ast.NaturalLiteral(3)),
+        )
+        self.assertEqual(expression.evaluated(), ast.NaturalLiteral(3))
+
+    def test_select(self):
+        expression = ast.SelectExpression(
+            ast.RecordLiteral({'a': ast.NaturalLiteral(1), 'b': Unevaluable('b')}),
+            'a',
+        )
+        self.assertEqual(expression.evaluated(), ast.NaturalLiteral(1))
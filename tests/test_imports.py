@@ -0,0 +1,133 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import asyncio
+import os
+
+from dhall import ast
+from dhall.cache import Cache
+from dhall.imports import ImportError, Resolver, parse_import, relative_location
+
+
+def local(path, **kwargs):
+    return ast.ImportExpression(ast.LocalImport(path), **kwargs)
+
+
+class FakeResolver(Resolver):
+    """Serves expressions from a dict of paths, instead of files"""
+    def __init__(self, files, **kwargs):
+        super().__init__(**kwargs)
+        self.files = files
+        self.reads = []
+        self.running = 0
+        self.max_running = 0
+
+    async def read(self, location):
+        self.reads.append(location.path)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return location.path
+
+    def parse(self, text):
+        return self.files[text]
+
+
+def resolve(resolver, expression):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(resolver.resolve(expression, ast.LocalImport('/root.dhall')))
+    finally:
+        loop.close()
+
+
+class ParseImportTestCase(TestCase):
+    def test_forms(self):
+        digest = 'sha256:' + 'ab' * 32
+        self.assertEqual(parse_import('./a/"b c".dhall ' + digest), local('./a/b c.dhall', hash=digest))
+        self.assertEqual(parse_import('env:HOME as Text'), ast.ImportExpression(ast.EnvImport('HOME'), as_text=True))
+        self.assertEqual(parse_import('https://example.com/x'), ast.ImportExpression(ast.RemoteImport('https://example.com/x')))
+        self.assertEqual(parse_import('missing'), ast.ImportExpression(ast.MissingImport()))
+
+    def test_relative_locations(self):
+        here = ast.LocalImport('/a/b.dhall')
+        self.assertEqual(relative_location(here, ast.LocalImport('../c.dhall')), ast.LocalImport('/c.dhall'))
+        self.assertEqual(
+            relative_location(ast.EnvImport('X'), ast.LocalImport('./c.dhall')),
+            ast.LocalImport(os.path.join(os.getcwd(), 'c.dhall')),
+        )
+        with self.assertRaises(ImportError):
+            relative_location(ast.RemoteImport('https://example.com/a'), ast.LocalImport('/c.dhall'))
+
+
+class ResolverTestCase(TestCase):
+    def test_shared_imports_fetched_once(self):
+        files = {
+            '/shared/{}.dhall'.format(i): ast.NaturalLiteral(i)
+            for i in range(10)
+        }
+        files.update({
+            '/module{}.dhall'.format(i): ast.ListLiteral([
+                local('./shared/{}.dhall'.format(j))
+                for j in range(10)
+            ])
+            for i in range(5)
+        })
+        resolver = FakeResolver(files, max_concurrency=4)
+        value = resolve(resolver, ast.ListLiteral([
+            local('./module{}.dhall'.format(i))
+            for i in range(5)
+        ]))
+        self.assertEqual(sorted(resolver.reads), sorted(files))
+        self.assertEqual(resolver.max_running, 4)
+        self.assertEqual(value.items[4].items[9], ast.NaturalLiteral(9))
+
+    def test_cycle(self):
+        resolver = FakeResolver({
+            '/a.dhall': local('./b.dhall'),
+            '/b.dhall': ast.RecordLiteral({'a': local('./a.dhall')}),
+        })
+        with self.assertRaises(ImportError):
+            resolve(resolver, local('./a.dhall'))
+
+    def test_cycle_between_concurrent_imports(self):
+        # both files are in flight when they import each other
+        resolver = FakeResolver({
+            '/a.dhall': local('./b.dhall'),
+            '/b.dhall': local('./a.dhall'),
+        })
+        with self.assertRaises(ImportError):
+            resolve(resolver, ast.ListLiteral([local('./a.dhall'), local('./b.dhall')]))
+
+    def test_hash_and_text(self):
+        value = ast.NaturalLiteral(1)
+        files = {'/a.dhall': value}
+        self.assertEqual(
+            resolve(FakeResolver(files), ast.ListLiteral([
+                local('./a.dhall', hash=value.semantic_hash()),
+                local('./a.dhall', as_text=True),
+            ])),
+            ast.ListLiteral([value, ast.TextLiteral(['/a.dhall'])]),
+        )
+        with self.assertRaises(ImportError):
+            resolve(FakeResolver(files), local('./a.dhall', hash='sha256:' + '00' * 32))
+
+    def test_custom_headers(self):
+        resolver = Resolver()
+        location = ast.RemoteImport('https://example.com/a', '{ headers = [] }')
+        with self.assertRaises(ImportError):
+            resolve(resolver, ast.ImportExpression(location))
+
+    def test_cached(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        value = ast.RecordLiteral({'a': ast.NaturalLiteral(1)})
+        files = {'/a.dhall': value}
+        expression = local('./a.dhall', hash=value.semantic_hash())
+        resolve(FakeResolver(files, cache=Cache(directory.name)), expression)
+        resolver = FakeResolver(files, cache=Cache(directory.name))
+        cached = resolve(resolver, expression)
+        self.assertEqual(cached, value)
+        self.assertEqual(resolver.reads, [])
+        self.assertTrue(cached.memo.get('closed'))
+        self.assertEqual(cached.memo['type'], value.type())
@@ -0,0 +1,83 @@
+from io import BytesIO
+from unittest import TestCase
+import json
+
+from dhall import ast
+from dhall.json import dump, dumps, load_stream, loads
+
+
+class DumpTestCase(TestCase):
+    def test_values(self):
+        expression = ast.RecordLiteral({
+            'b': ast.ListLiteral([ast.NaturalLiteral(1), ast.DoubleLiteral(0.5)]),
+            'a': ast.TextLiteral(['"quoted" ', 'żółw']),
+            'c': ast.OptionalLiteral(None),
+            'd': ast.OptionalLiteral(ast.BooleanLiteral(True)),
+            'e': ast.Union('x', ast.RecordLiteral({}), {'y': ast.BoolBuiltin()}),
+        })
+        self.assertEqual(
+            dumps(expression),
+            '{"a":"\\"quoted\\" żółw","b":[1,0.5],"c":null,"d":true,"e":{}}',
+        )
+
+    def test_evaluates_while_writing(self):
+        expression = ast.LetIn(
+            [('n', ast.NaturalLiteral(2), None)],
+            ast.ListLiteral([ast.Plus(ast.Variable('n'), ast.NaturalLiteral(1))]),
+        )
+        self.assertEqual(dumps(expression), '[3]')
+
+    def test_interpolated_text(self):
+        expression = ast.LetIn(
+            [('x', ast.TextLiteral(['b']), None)],
+            ast.ListLiteral([
+                ast.TextLiteral(['a', ast.Variable('x')]),
+                ast.TextLiteral(['a', ast.TextLiteral(['b', ast.Variable('x')]), 'c']),
+            ]),
+        )
+        self.assertEqual(dumps(expression), '["ab","abbc"]')
+
+    def test_buffered(self):
+        expression = ast.ListLiteral([ast.NaturalLiteral(i) for i in range(1000)])
+        fp = BytesIO()
+        dump(expression, fp, buffer_size=100)
+        self.assertEqual(json.loads(fp.getvalue().decode('utf8')), list(range(1000)))
+
+    def test_nan(self):
+        with self.assertRaises(ValueError):
+            dumps(ast.DoubleLiteral(float('nan')))
+
+
+class LoadTestCase(TestCase):
+    def test_guessed(self):
+        self.assertEqual(
+            loads('{"a": [1, 2], "b": {"c": "x", "d": [true, 0.5]}}'),
+            ast.RecordLiteral({
+                'a': ast.ListLiteral([ast.NaturalLiteral(1), ast.NaturalLiteral(2)]),
+                'b': ast.RecordLiteral({
+                    'c': ast.TextLiteral(['x']),
+                    'd': ast.ListLiteral([ast.BooleanLiteral(True), ast.DoubleLiteral(0.5)]),
+                }),
+            }),
+        )
+
+    def test_typed(self):
+        typ = ast.RecordType({
+            'a': ast.ListType(ast.DoubleBuiltin()),
+            'b': ast.OptionalType(ast.NaturalBuiltin()),
+        })
+        value = loads('{"a": [], "b": null}', typ)
+        self.assertEqual(value.normalized_type(), typ)
+        self.assertEqual(loads('{"a": [1], "b": 2}', typ).evaluated(), ast.RecordLiteral({
+            'a': ast.ListLiteral([ast.DoubleLiteral(1.0)]),
+            'b': ast.OptionalLiteral(ast.NaturalLiteral(2)),
+        }))
+        with self.assertRaises(ast.TypeError):
+            loads('{"a": ["x"], "b": null}', typ)
+
+    def test_stream(self):
+        text = ''.join('{{"n": {}}}\n'.format(i) for i in range(100)) + '12345'
+        values = list(load_stream(BytesIO(text.encode('utf8')), chunk_size=7))
+        self.assertEqual(len(values), 101)
+        self.assertEqual(values[42], ast.RecordLiteral({'n': ast.NaturalLiteral(42)}))
+        self.assertEqual(values[-1], ast.NaturalLiteral(12345))
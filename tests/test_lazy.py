@@ -0,0 +1,138 @@
+from unittest import TestCase
+
+from dhall import ast
+from dhall.lazy import evaluated_selection, lazy_python, selected
+
+
+class Unevaluable(ast.Variable):
+    """Stands for an expression that must not be evaluated"""
+    def _evaluated(self):
+        raise AssertionError('evaluated {}'.format(self.name))
+
+
+class LazyPythonTestCase(TestCase):
+    def test_record(self):
+        value = lazy_python(ast.LetIn(
+            [('n', ast.NaturalLiteral(2), None)],
+            ast.RecordLiteral({
+                'used': ast.Plus(ast.Variable('n'), ast.NaturalLiteral(1)),
+                'unused': Unevaluable('unused'),
+            }),
+        ))
+        self.assertEqual(value['used'], 3)
+        self.assertEqual(sorted(value), ['unused', 'used'])
+
+    def test_list(self):
+        value = lazy_python(ast.ListLiteral([
+            Unevaluable('first'),
+            ast.RecordLiteral({'a': ast.BooleanLiteral(True)}),
+        ]))
+        self.assertEqual(len(value), 2)
+        self.assertEqual(dict(value[-1]), {'a': True})
+        with self.assertRaises(IndexError):
+            value[2]
+
+    def test_selection(self):
+        value = lazy_python(ast.SelectExpression(
+            ast.RecordLiteral({
+                'inner': ast.RecordLiteral({'x': ast.NaturalLiteral(1)}),
+                'other': Unevaluable('other'),
+            }),
+            'inner',
+        ))
+        self.assertEqual(value['x'], 1)
+
+    def test_annotations_checked(self):
+        # let x : Natural = True in { a = x, b = [x] : List Natural }
+        value = lazy_python(ast.LetIn(
+            [('x', ast.BooleanLiteral(True), ast.NaturalBuiltin())],
+            ast.RecordLiteral({
+                'a': ast.Variable('x'),
+                'b': ast.TypeAnnotation(
+                    ast.ListLiteral([ast.BooleanLiteral(False)]),
+                    ast.ListType(ast.NaturalBuiltin()),
+                ),
+            }),
+        ))
+        with self.assertRaises(ast.TypeError):
+            value['a']
+        with self.assertRaises(ast.TypeError):
+            value['b'][0]
+        value = lazy_python(ast.TypeAnnotation(
+            ast.RecordLiteral({'a': ast.NaturalLiteral(1), 'b': Unevaluable('b')}),
+            ast.RecordType({'a': ast.NaturalBuiltin(), 'b': ast.BoolBuiltin()}),
+        ))
+        self.assertEqual(value['a'], 1)
+
+    def test_memoized(self):
+        value = lazy_python(ast.RecordLiteral({
+            'a': ast.RecordLiteral({'b': ast.NaturalLiteral(1)}),
+        }))
+        self.assertIs(value['a'], value['a'])
+
+
+class SelectedTestCase(TestCase):
+    def test_let_and_prefer(self):
+        expression = selected(ast.LetIn(
+            [('defaults', ast.RecordLiteral({
+                'replicas': ast.NaturalLiteral(1),
+                'image': Unevaluable('image'),
+            }), None)],
+            ast.RecordLiteral({
+                'api': ast.PreferExpression(
+                    ast.Variable('defaults'),
+                    ast.RecordLiteral({'replicas': ast.NaturalLiteral(3)}),
+                ),
+                'db': Unevaluable('db'),
+            }),
+        ), ['api', 'replicas'])
+        self.assertEqual(expression.type(), ast.NaturalBuiltin())
+        self.assertEqual(expression.evaluated(), ast.NaturalLiteral(3))
+
+    def test_combine_and_projection(self):
+        expression = selected(ast.ProjectionExpression(
+            ast.CombineExpression(
+                ast.RecordLiteral({'a': ast.RecordLiteral({'x': ast.NaturalLiteral(1)})}),
+                ast.RecordLiteral({
+                    'a': ast.RecordLiteral({'y': ast.BooleanLiteral(True)}),
+                    'b': Unevaluable('b'),
+                }),
+            ),
+            ['a'],
+        ), ['a'])
+        self.assertEqual(expression.evaluated(), ast.RecordLiteral({
+            'x': ast.NaturalLiteral(1),
+            'y': ast.BooleanLiteral(True),
+        }))
+
+    def test_missing_field(self):
+        with self.assertRaises(ast.TypeError):
+            selected(ast.RecordLiteral({'a': ast.NaturalLiteral(1)}), ['b'])
+
+    def test_annotations_checked(self):
+        annotation = ast.RecordType({'replicas': ast.NaturalBuiltin()})
+        # let cfg : { replicas : Natural } = { replicas = True } in cfg
+        expression = ast.LetIn(
+            [('cfg', ast.RecordLiteral({'replicas': ast.BooleanLiteral(True)}), annotation)],
+            ast.Variable('cfg'),
+        )
+        with self.assertRaises(ast.TypeError):
+            evaluated_selection(expression, ['replicas'])
+        expression = ast.SelectExpression(
+            ast.TypeAnnotation(
+                ast.RecordLiteral({'app': ast.RecordLiteral({'replicas': ast.BooleanLiteral(True)})}),
+                ast.RecordType({'app': annotation}),
+            ),
+            'app',
+        )
+        with self.assertRaises(ast.TypeError):
+            evaluated_selection(expression, ['replicas'])
+
+        expression = ast.LetIn(
+            [('cfg', ast.RecordLiteral({
+                'replicas': ast.NaturalLiteral(2),
+                'other': Unevaluable('other'),
+            }), ast.RecordType({'replicas': ast.NaturalBuiltin(), 'other': ast.BoolBuiltin()}))],
+            ast.Variable('cfg'),
+        )
+        self.assertEqual(evaluated_selection(expression, ['replicas']), ast.NaturalLiteral(2))
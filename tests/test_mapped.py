@@ -0,0 +1,48 @@
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+
+from dhall import ast
+from dhall.mapped import dump_mapped, load_mmap
+
+
+class MappedTestCase(TestCase):
+    def dump_and_load(self, expression):
+        f = NamedTemporaryFile(suffix='.dhallmap')
+        self.addCleanup(f.close)
+        dump_mapped(expression, f)
+        f.flush()
+        return load_mmap(f.name)
+
+    def test_small(self):
+        value = self.dump_and_load(ast.RecordLiteral({
+            'a': ast.ListLiteral([ast.NaturalLiteral(1), ast.Plus(ast.NaturalLiteral(1), ast.NaturalLiteral(1))]),
+            'b': ast.TextLiteral(['x']),
+            'c': ast.TypeAnnotation(ast.ListLiteral([]), ast.ListType(ast.BoolBuiltin())),
+        }))
+        self.assertEqual(list(value), ['a', 'b', 'c'])
+        self.assertEqual(list(value['a']), [1, 2])
+        self.assertEqual(value['b'], 'x')
+        self.assertEqual(list(value['c']), [])
+        with self.assertRaises(KeyError):
+            value['d']
+
+    def test_indexed(self):
+        value = self.dump_and_load(ast.ListLiteral([
+            ast.RecordLiteral({
+                'label{:03}'.format(j): ast.NaturalLiteral(i * j)
+                for j in range(50)
+            })
+            for i in range(100)
+        ]))
+        self.assertEqual(len(value), 100)
+        self.assertEqual(value[-1]['label049'], 99 * 49)
+        self.assertEqual(value[7]['label000'], 0)
+        self.assertNotIn('label050', value[7])
+        self.assertIs(value[7], value[7])
+
+    def test_not_mapped(self):
+        with NamedTemporaryFile() as f:
+            f.write(b'\x82\x0f\x01' + bytes(30))
+            f.flush()
+            with self.assertRaises(ValueError):
+                load_mmap(f.name)
@@ -0,0 +1,97 @@
+from concurrent.futures import ProcessPoolExecutor
+from unittest import TestCase
+
+from dhall import ast
+from dhall.parallel import evaluated, type_checked
+
+
+def document(size):
+    return ast.LetIn(
+        [
+            ('one', ast.NaturalLiteral(1), ast.NaturalBuiltin()),
+            ('inc', ast.Lambda('n', ast.NaturalBuiltin(), ast.Plus(ast.Variable('n'), ast.Variable('one'))), None),
+        ],
+        ast.RecordLiteral({
+            'field{}'.format(i): ast.ApplicationExpression(ast.Variable('inc'), ast.NaturalLiteral(i))
+            for i in range(size)
+        }),
+    )
+
+
+class ParallelTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.executor = ProcessPoolExecutor(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
+    def test_record(self):
+        expression = document(100)
+        self.assertEqual(evaluated(expression, self.executor, 10), document(100).evaluated())
+        self.assertIs(expression.evaluated(), evaluated(expression, self.executor, 10))
+
+    def test_list(self):
+        expression = ast.LetIn(
+            [('x', ast.NaturalLiteral(2), None)],
+            ast.ListLiteral([ast.Times(ast.Variable('x'), ast.NaturalLiteral(i)) for i in range(20)]),
+        )
+        self.assertEqual(
+            evaluated(expression, self.executor, 10),
+            ast.ListLiteral([ast.NaturalLiteral(2 * i) for i in range(20)]),
+        )
+
+    def test_unencodable_values(self):
+        # evaluates to empty optionals of unknown type
+        expression = ast.RecordLiteral({
+            'field{}'.format(i): ast.ApplicationExpression(
+                ast.Lambda('x', ast.NaturalBuiltin(), ast.OptionalLiteral()),
+                ast.NaturalLiteral(i),
+            )
+            for i in range(70)
+        })
+        self.assertEqual(evaluated(expression, self.executor), expression.evaluated())
+        typed = ast.RecordLiteral({
+            'field{}'.format(i): ast.TypeAnnotation(ast.OptionalLiteral(), ast.OptionalType(ast.NaturalBuiltin()))
+            for i in range(70)
+        })
+        self.assertEqual(evaluated(typed, self.executor), typed.evaluated())
+
+    def test_type(self):
+        many_bindings = ast.LetIn(
+            [('x{}'.format(i), ast.NaturalLiteral(i), ast.NaturalBuiltin()) for i in range(20)],
+            document(20),
+        )
+        for expression in [document(100), many_bindings]:
+            self.assertEqual(
+                type_checked(expression, self.executor, 10),
+                expression.normalized_type(),
+            )
+
+    def test_type_errors(self):
+        bad_binding = ast.LetIn(
+            [('x{}'.format(i), ast.NaturalLiteral(i), ast.NaturalBuiltin()) for i in range(20)] +
+            [('bad', ast.NaturalLiteral(1), ast.BoolBuiltin())],
+            ast.NaturalLiteral(0),
+        )
+        bad_field = ast.RecordLiteral(dict(
+            document(20).expression.fields,
+            bad=ast.Plus(ast.NaturalLiteral(1), ast.BooleanLiteral(True)),
+        ))
+        for expression in [bad_binding, bad_field]:
+            with self.assertRaises(ast.TypeError) as sequential:
+                expression.type()
+            with self.assertRaises(ast.TypeError) as parallel:
+                type_checked(expression, self.executor, 10)
+            self.assertEqual(str(parallel.exception), str(sequential.exception))
+
+    def test_sequential_fallback(self):
+        # small literals and unresolved imports stay in this process
+        class Executor:
+            def submit(self, *args):
+                raise AssertionError('nothing should be submitted')
+
+        self.assertEqual(evaluated(document(5), Executor(), 10), document(5).evaluated())
+        with_import = ast.ListLiteral([ast.ImportExpression(ast.EnvImport('X'))] * 20)
+        self.assertEqual(evaluated(with_import, Executor(), 10), with_import)
@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase
 import dhall
 
@@ -7,3 +8,9 @@ class ParsingTestCase(TestCase):
         # this can be parsed as 4 empty strings or 1 string "''''" - second option is correct
         dhall.parse("''''''''''''''''")
         dhall.parse("'''''''' ''''''''")
+
+    def test_threads(self):
+        sources = ['{{ a = {0}, b = [{0}, {0}] }}'.format(i) for i in range(32)]
+        with ThreadPoolExecutor(8) as executor:
+            parsed = list(executor.map(dhall.parse, sources))
+        self.assertEqual(parsed, [dhall.parse(source) for source in sources])
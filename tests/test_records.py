@@ -0,0 +1,92 @@
+from unittest import TestCase
+
+from dhall import ast
+
+
+def natural_record(**fields):
+    return ast.RecordLiteral({
+        name: ast.NaturalLiteral(value)
+        for name, value in fields.items()
+    })
+
+
+class RecordLiteralTestCase(TestCase):
+    def test_canonical_field_order(self):
+        self.assertEqual(
+            ast.RecordLiteral([('b', ast.NaturalLiteral(1)), ('a', ast.NaturalLiteral(2))]),
+            natural_record(a=2, b=1),
+        )
+
+    def test_duplicate_fields_dont_typecheck(self):
+        expression = ast.RecordLiteral([('a', ast.NaturalLiteral(1)), ('a', ast.NaturalLiteral(2))])
+        with self.assertRaises(TypeError):
+            expression.type()
+
+
+class RecordOperatorsTestCase(TestCase):
+    def test_combine(self):
+        expression = ast.CombineExpression(
+            ast.RecordLiteral({'x': natural_record(a=1), 'y': ast.NaturalLiteral(2)}),
+            ast.RecordLiteral({'x': natural_record(b=3)}),
+        )
+        self.assertEqual(
+            expression.evaluated(),
+            ast.RecordLiteral({'x': natural_record(a=1, b=3), 'y': ast.NaturalLiteral(2)}),
+        )
+        self.assertEqual(
+            expression.normalized_type(),
+            ast.RecordType({
+                'x': ast.RecordType({'a': ast.NaturalBuiltin(), 'b': ast.NaturalBuiltin()}),
+                'y': ast.NaturalBuiltin(),
+            }),
+        )
+
+    def test_combine_collision(self):
+        expression = ast.CombineExpression(natural_record(a=1), natural_record(a=2))
+        with self.assertRaises(TypeError):
+            expression.type()
+
+    def test_prefer(self):
+        expression = ast.PreferExpression(natural_record(a=1, b=2), natural_record(b=3, c=4))
+        self.assertEqual(expression.evaluated(), natural_record(a=1, b=3, c=4))
+        self.assertEqual(
+            expression.normalized_type(),
+            ast.RecordType({'a': ast.NaturalBuiltin(), 'b': ast.NaturalBuiltin(), 'c': ast.NaturalBuiltin()}),
+        )
+
+    def test_prefer_empty(self):
+        variable = ast.Variable('x')
+        self.assertEqual(
+            ast.PreferExpression(variable, ast.RecordLiteral({})).evaluated(),
+            variable,
+        )
+
+    def test_combine_types(self):
+        expression = ast.CombineTypesExpression(
+            ast.RecordType({'a': ast.NaturalBuiltin()}),
+            ast.RecordType({'b': ast.BoolBuiltin()}),
+        )
+        self.assertEqual(
+            expression.evaluated(),
+            ast.RecordType({'a': ast.NaturalBuiltin(), 'b': ast.BoolBuiltin()}),
+        )
+        self.assertEqual(expression.normalized_type(), ast.TypeBuiltin())
+
+
+class RecordSelectionTestCase(TestCase):
+    def test_select(self):
+        expression = ast.SelectExpression(natural_record(a=1, b=2), 'b')
+        self.assertEqual(expression.evaluated(), ast.NaturalLiteral(2))
+        self.assertEqual(expression.normalized_type(), ast.NaturalBuiltin())
+
+    def test_select_missing(self):
+        with self.assertRaises(TypeError):
+            ast.SelectExpression(natural_record(a=1), 'b').type()
+
+    def test_projection(self):
+        expression = ast.ProjectionExpression(natural_record(a=1, b=2, c=3), ['c', 'a'])
+        self.assertEqual(expression.evaluated(), natural_record(a=1, c=3))
+        self.assertEqual(
+            expression.normalized_type(),
+            ast.RecordType({'a': ast.NaturalBuiltin(), 'c': ast.NaturalBuiltin()}),
+        )
@@ -0,0 +1,93 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest import TestCase
+import threading
+
+from dhall.remote import HTTPClient, HTTPError
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    resources = {
+        '/a.dhall': ('1', {'ETag': '"a1"'}),
+        '/b.dhall': ('2', {'Last-Modified': 'Mon, 01 Jan 2018 00:00:00 GMT'}),
+        '/fresh.dhall': ('3', {'Cache-Control': 'max-age=60'}),
+        '/moved.dhall': ('', {'Location': '/a.dhall'}),
+    }
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        if self.path not in self.resources:
+            return self.respond(404, '', {})
+        body, headers = self.resources[self.path]
+        if self.path == '/moved.dhall':
+            return self.respond(301, body, headers)
+        validators = [('If-None-Match', 'ETag'), ('If-Modified-Since', 'Last-Modified')]
+        if any(
+            name in headers and self.headers.get(condition) == headers[name]
+            for condition, name in validators
+        ):
+            return self.respond(304, '', headers)
+        self.respond(200, body, headers)
+
+    def respond(self, status, body, headers):
+        body = body.encode('utf8')
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPClientTestCase(TestCase):
+    def setUp(self):
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.server.connections = 0
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.01,), daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.client = HTTPClient(cache_size=2)
+        self.addCleanup(self.client.close)
+
+    def url(self, path):
+        return 'http://127.0.0.1:{}{}'.format(self.server.server_address[1], path)
+
+    def test_revalidation(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get(self.url('/a.dhall')), '1')
+            self.assertEqual(self.client.get(self.url('/b.dhall')), '2')
+        self.assertEqual(len(self.server.requests), 6)
+        self.assertEqual(self.server.requests[2][1].get('If-None-Match'), '"a1"')
+        self.assertIn('If-Modified-Since', self.server.requests[3][1])
+        # all over a single kept-alive connection
+        self.assertEqual(self.server.connections, 1)
+
+    def test_fresh(self):
+        self.assertEqual(self.client.get(self.url('/fresh.dhall')), '3')
+        self.assertEqual(self.client.get(self.url('/fresh.dhall')), '3')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_bounded_cache(self):
+        for path in ['/a.dhall', '/b.dhall', '/fresh.dhall', '/a.dhall']:
+            self.client.get(self.url(path))
+        # `/a.dhall` was evicted, so it was fetched unconditionally
+        self.assertNotIn('If-None-Match', self.server.requests[-1][1])
+
+    def test_redirect_and_errors(self):
+        self.assertEqual(self.client.get(self.url('/moved.dhall')), '1')
+        with self.assertRaises(HTTPError):
+            self.client.get(self.url('/missing.dhall'))
@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import os
+
+from dhall import ast
+from dhall.session import LRUCache, Session
+
+
+class FakeSession(Session):
+    """Parses texts by looking them up in a dict"""
+    def __init__(self, sources, **kwargs):
+        super().__init__(cache=False, **kwargs)
+        self.sources = sources
+        self.parses = 0
+
+    def _parse(self, text):
+        self.parses += 1
+        return self.sources[text]
+
+
+def document(i):
+    return ast.LetIn(
+        [
+            ('lib', ast.ImportExpression(ast.LocalImport('./lib.dhall')), None),
+            ('two', ast.Plus(ast.SelectExpression(ast.Variable('lib'), 'one'), ast.NaturalLiteral(1)), ast.NaturalBuiltin()),
+        ],
+        ast.RecordLiteral({
+            'tenant': ast.NaturalLiteral(i),
+            'two': ast.Variable('two'),
+        }),
+    )
+
+
+class SessionTestCase(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.write('lib.dhall', 'lib')
+
+    def write(self, name, text):
+        with open(os.path.join(self.directory, name), 'w') as f:
+            f.write(text)
+
+    def test_shared_work(self):
+        sources = {'lib': ast.RecordLiteral({'one': ast.NaturalLiteral(1)})}
+        for i in range(3):
+            sources['doc{}'.format(i)] = document(i)
+            self.write('doc{}.dhall'.format(i), 'doc{}'.format(i))
+        session = FakeSession(sources)
+        for i in range(3):
+            self.assertEqual(
+                session.load(os.path.join(self.directory, 'doc{}.dhall'.format(i))),
+                ast.RecordLiteral({'tenant': ast.NaturalLiteral(i), 'two': ast.NaturalLiteral(2)}),
+            )
+        session.load(os.path.join(self.directory, 'doc0.dhall'))
+        self.assertEqual(session.parses, 4)
+        stats = session.stats()
+        self.assertEqual((stats['parsed'].hits, stats['parsed'].misses), (1, 4))
+        # the import is loaded once, both bindings are evaluated once
+        self.assertEqual(stats['values'].entries, 3)
+        self.assertEqual(stats['values'].misses, 3)
+
+    def test_changed_import(self):
+        sources = {
+            'lib': ast.RecordLiteral({'one': ast.NaturalLiteral(1)}),
+            'lib2': ast.RecordLiteral({'one': ast.NaturalLiteral(2)}),
+        }
+        session = FakeSession(sources)
+        expression = ast.SelectExpression(ast.ImportExpression(ast.LocalImport('./lib.dhall')), 'one')
+        filename = os.path.join(self.directory, 'doc.dhall')
+        self.assertEqual(session.evaluate(expression, filename), ast.NaturalLiteral(1))
+        self.write('lib.dhall', 'lib2')
+        self.assertEqual(session.evaluate(expression, filename), ast.NaturalLiteral(2))
+
+    def test_changed_nested_import(self):
+        sources = {
+            'lib': ast.ImportExpression(ast.LocalImport('./inner.dhall')),
+            'inner': ast.NaturalLiteral(1),
+            'changed inner': ast.NaturalLiteral(2),
+        }
+        self.write('inner.dhall', 'inner')
+        session = FakeSession(sources)
+        expression = ast.ImportExpression(ast.LocalImport('./lib.dhall'))
+        filename = os.path.join(self.directory, 'doc.dhall')
+        self.assertEqual(session.evaluate(expression, filename), ast.NaturalLiteral(1))
+        self.assertEqual(session.evaluate(expression, filename), ast.NaturalLiteral(1))
+        self.assertEqual(session.stats()['values'].hits, 1)
+        self.write('inner.dhall', 'changed inner')
+        self.assertEqual(session.evaluate(expression, filename), ast.NaturalLiteral(2))
+
+    def test_changed_remote_import(self):
+        class HTTPClient:
+            texts = {'https://example.com/lib.dhall': 'lib'}
+
+            def get(self, url):
+                return self.texts[url]
+
+        sources = {
+            'lib': ast.RecordLiteral({'one': ast.NaturalLiteral(1)}),
+            'lib2': ast.RecordLiteral({'one': ast.NaturalLiteral(2)}),
+        }
+        client = HTTPClient()
+        session = FakeSession(sources, http_client=client)
+        expression = ast.SelectExpression(
+            ast.ImportExpression(ast.RemoteImport('https://example.com/lib.dhall')),
+            'one',
+        )
+        self.assertEqual(session.evaluate(expression), ast.NaturalLiteral(1))
+        self.assertEqual(session.evaluate(expression), ast.NaturalLiteral(1))
+        self.assertEqual(session.stats()['values'].hits, 1)
+        client.texts['https://example.com/lib.dhall'] = 'lib2'
+        self.assertEqual(session.evaluate(expression), ast.NaturalLiteral(2))
+
+
+class LRUCacheTestCase(TestCase):
+    def test_size_limit(self):
+        cache = LRUCache(10)
+        cache.put('a', 1, 4)
+        cache.put('b', 2, 4)
+        cache.get('a')
+        cache.put('c', 3, 4)
+        cache.put('d', 4, 11)  # too big to be cached at all
+        self.assertEqual([cache.get(k) for k in 'abcd'], [1, None, 3, None])
+        self.assertEqual((cache.stats.entries, cache.stats.size, cache.stats.evictions), (2, 8, 1))
+
+
+class ThreadsTestCase(TestCase):
+    def test_concurrent_loads(self):
+        sources = {'doc{}'.format(i): document(i) for i in range(16)}
+        sources['lib'] = ast.RecordLiteral({'one': ast.NaturalLiteral(1)})
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for text in sources:
+            with open(os.path.join(directory.name, text + '.dhall'), 'w') as f:
+                f.write(text)
+        session = FakeSession(sources)
+        paths = [os.path.join(directory.name, 'doc{}.dhall'.format(i % 16)) for i in range(64)]
+        with ThreadPoolExecutor(8) as executor:
+            values = list(executor.map(session.load, paths))
+        self.assertEqual(
+            [value.fields['tenant'] for value in values],
+            [ast.NaturalLiteral(i % 16) for i in range(64)],
+        )
+        stats = session.stats()
+        self.assertEqual(stats['parsed'].entries, 17)
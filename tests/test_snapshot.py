@@ -0,0 +1,53 @@
+from io import BytesIO
+from unittest import TestCase
+
+from dhall import ast
+from dhall.snapshot import Snapshot, build
+
+from .test_imports import FakeResolver, local, resolve
+
+
+def library():
+    return ast.RecordLiteral({
+        'double': ast.Lambda('n', ast.NaturalBuiltin(), ast.Plus(ast.Variable('n'), ast.Variable('n'))),
+        'one': ast.Plus(ast.NaturalLiteral(0), ast.NaturalLiteral(1)),
+    })
+
+
+def reloaded(snapshot):
+    f = BytesIO()
+    snapshot.dump(f)
+    return Snapshot.loads(f.getvalue())
+
+
+class SnapshotTestCase(TestCase):
+    def test_round_trip(self):
+        location = ast.LocalImport('/lib.dhall')
+        snapshot = reloaded(Snapshot([(location, library())]))
+        self.assertEqual(list(snapshot), [location])
+        value = snapshot[location]
+        self.assertEqual(value, library().evaluated().normalized())
+        self.assertEqual(value.semantic_hash(), library().semantic_hash())
+        self.assertIs(value.evaluated(), value)
+        self.assertIs(value.normalized(), value)
+        self.assertEqual(value.type(), library().normalized_type())
+        # closed entries keep their memo when substituted into a context
+        scope = ast.Variable('x').bind_value('x', ast.NaturalLiteral(1))
+        self.assertIs(value.pass_context(scope), value)
+
+    def test_malformed(self):
+        with self.assertRaises(ValueError):
+            Snapshot.loads(b'\x82\x0f\x01')
+
+    def test_resolver(self):
+        snapshot = reloaded(build(['/lib.dhall'], resolver=FakeResolver({'/lib.dhall': library()})))
+        value = snapshot[ast.LocalImport('/lib.dhall')]
+        resolver = FakeResolver({}, snapshot=snapshot)
+        expression = ast.RecordLiteral({
+            'by_location': ast.SelectExpression(local('./lib.dhall'), 'one'),
+            'by_hash': local('/elsewhere.dhall', hash=value.semantic_hash()),
+        })
+        resolved = resolve(resolver, expression)
+        self.assertEqual(resolver.reads, [])
+        self.assertIs(resolved.fields['by_hash'], value)
+        self.assertEqual(resolved.evaluated().fields['by_location'], ast.NaturalLiteral(1))
@@ -1,4 +1,4 @@
-from unittest import TestCase
+from unittest import TestCase, mock
 
 from dhall import ast
 
@@ -26,3 +26,84 @@ class FunctionTypesTestCase(TestCase):
             expression.normalized_type(),
             typ,
         )
+
+
+class ListTypesTestCase(TestCase):
+    def record(self, a, b):
+        return ast.RecordLiteral({'a': ast.NaturalLiteral(a), 'b': ast.BooleanLiteral(b)})
+
+    def test_homogeneous(self):
+        expression = ast.ListLiteral([self.record(i, i % 2 == 0) for i in range(100)])
+        self.assertEqual(
+            expression.normalized_type(),
+            ast.ListType(ast.RecordType({'a': ast.NaturalBuiltin(), 'b': ast.BoolBuiltin()})),
+        )
+
+    def test_heterogeneous(self):
+        expression = ast.ListLiteral([self.record(1, True), ast.NaturalLiteral(1)])
+        with self.assertRaises(TypeError):
+            expression.type()
+
+    def test_annotated(self):
+        expression = ast.ListLiteral([ast.NaturalLiteral(1)], ast.BoolBuiltin())
+        with self.assertRaises(TypeError):
+            expression.type()
+
+    def test_empty(self):
+        expression = ast.TypeAnnotation(ast.ListLiteral([]), ast.ListType(ast.NaturalBuiltin()))
+        self.assertEqual(expression.normalized_type(), ast.ListType(ast.NaturalBuiltin()))
+
+    def test_elements_typed_once(self):
+        inferred = []
+
+        class Counted(ast.NaturalLiteral):
+            def _type(self):
+                inferred.append(self.value)
+                return super()._type()
+
+        ast.ListLiteral([Counted(i) for i in range(3)]).type()
+        self.assertEqual(inferred, [0, 1, 2])
+
+    def test_nested_lists(self):
+        item = ast.ListLiteral([ast.ListLiteral([ast.NaturalLiteral(1)])])
+        self.assertEqual(
+            ast.ListLiteral([item, item]).normalized_type(),
+            ast.ListType(ast.ListType(ast.ListType(ast.NaturalBuiltin()))),
+        )
+
+    def test_progress(self):
+        expression = ast.ListLiteral([ast.NaturalLiteral(i) for i in range(3)])
+        with mock.patch.object(ast.ListLiteral, 'progress_threshold', 2):
+            with mock.patch('dhall.tools.Progress.report') as report:
+                expression.type()  # not reported unless logging shows it
+            report.assert_not_called()
+            with self.assertLogs('dhall.tools', 'INFO') as logs:
+                ast.ListLiteral(expression.items).type()
+        self.assertIn('3 checked', logs.output[-1])
+
+
+class TypeErrorTestCase(TestCase):
+    def test_frames(self):
+        inner = ast.Variable('x')
+        outer = ast.RecordLiteral({'a': inner})
+        with self.assertRaises(ast.TypeError) as cm:
+            outer.type()
+        self.assertEqual(cm.exception.frames, [inner, outer])
+        self.assertEqual(cm.exception.expression, inner)
+        self.assertIn('unbound variable x', str(cm.exception))
+
+    def test_message_formatted_lazily(self):
+        class Unprintable(ast.Variable):
+            def to_dhall(self):
+                raise AssertionError('formatted too early')
+
+        error = ast.TypeError('bad `{}`', Unprintable('x'))
+        with self.assertRaises(AssertionError):
+            str(error)
+
+    def test_span(self):
+        text = 'let a = 1\nin b'
+        expression = ast.Variable('b', span=ast.Span(text, 13, 14))
+        with self.assertRaises(ast.TypeError) as cm:
+            expression.type()
+        self.assertIn('line 2, column 4: `b`', str(cm.exception))